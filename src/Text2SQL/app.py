@@ -1,11 +1,17 @@
 import streamlit as st 
 import os
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from dotenv import load_dotenv
 
 # Import our modules
-from sql_generator import SQLGenerator
 from chart_generator import ChartGenerator
 from db_operations import DatabaseOperations
+from config_db.db_warehouse import get_connection_pool
+from schema_catalog import get_schema_catalog
+from sql_cache import get_sql_cache
+from result_cache import get_result_cache
+from text2sql_service import get_text2sql_service
 
 # Load environment variables
 load_dotenv()
@@ -56,6 +62,14 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 def main():
+    # Requests are tracked per browser session so a new one can cancel the previous one
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    service = get_text2sql_service()
+    
+    # Load the schema in the background while the user is typing
+    service.prefetch_schema()
+    
     # Header
     st.markdown('<h1 class="main-header">🗄️ Text2SQL Assistant</h1>', unsafe_allow_html=True)
     st.markdown('<p style="text-align: center; font-size: 1.1rem; color: #666;">ຖາມຄໍາຖາມກ່ຽວກັບຂໍ້ມູນຂອງທ່ານເປັນພາສາທໍາມະຊາດ</p>', unsafe_allow_html=True)
@@ -79,23 +93,43 @@ def main():
         st.subheader("📊 ສະຖານະຖານຂໍ້ມູນ")
         if st.button("ທົດສອບການເຊື່ອມຕໍ່"):
             try:
-                db_ops = DatabaseOperations()
-                if db_ops.test_connection():
-                    st.success("✅ ເຊື່ອມຕໍ່ກັບຖານຂໍ້ມູນສໍາເລັດແລ້ວ")
-                else:
-                    st.error("❌ ການເຊື່ອມຕໍ່ກັບຖານຂໍ້ມູນລົ້ມເຫລວ")
+                with DatabaseOperations() as db_ops:
+                    if db_ops.test_connection():
+                        st.success("✅ ເຊື່ອມຕໍ່ກັບຖານຂໍ້ມູນສໍາເລັດແລ້ວ")
+                    else:
+                        st.error("❌ ການເຊື່ອມຕໍ່ກັບຖານຂໍ້ມູນລົ້ມເຫລວ")
             except Exception as e:
                 st.error(f"❌ ຂໍ້ຜິດພາດ: {str(e)}")
         
         # Show database schema
         if st.button("ສະແດງ Schema"):
             try:
-                db_ops = DatabaseOperations()
-                if db_ops.connect():
-                    schema = db_ops.get_table_schema()
-                    st.text_area("ສະແດງຖານຂໍ້ມູນ Schema", schema, height=300)
+                with DatabaseOperations() as db_ops:
+                    if db_ops.connect():
+                        schema = db_ops.get_table_schema()
+                        st.text_area("ສະແດງຖານຂໍ້ມູນ Schema", schema, height=300)
             except Exception as e:
                 st.error(f"ຂໍ້ຜິດພາດ: {str(e)}")
+        
+        if st.button("🔄 ໂຫຼດ Schema ໃໝ່"):
+            get_schema_catalog().invalidate()
+            st.success("✅ Schema ຈະຖືກໂຫຼດໃໝ່ໃນຄໍາຖາມຕໍ່ໄປ")
+        
+        # Connection pool statistics
+        with st.expander("📈 ສະຖິຕິ Connection Pool"):
+            st.json(get_connection_pool().stats())
+        
+        # Generated SQL cache statistics
+        with st.expander("⚡ ສະຖິຕິ SQL Cache"):
+            st.json(get_sql_cache().stats())
+            if st.button("ລ້າງ SQL Cache"):
+                get_sql_cache().clear()
+        
+        # Query result cache statistics
+        with st.expander("🗃️ ສະຖິຕິ Result Cache"):
+            st.json(get_result_cache().stats())
+            if st.button("ລ້າງ Result Cache"):
+                get_result_cache().clear()
     
     # Main query interface
     st.markdown('<div class="query-box">', unsafe_allow_html=True)
@@ -123,26 +157,55 @@ def main():
         else:
             try:
                 with st.spinner("🤖 ກໍາລັງສ້າງຄໍາສັ່ງ SQL..."):
-                    # Get database schema
-                    db_ops = DatabaseOperations()
-                    if db_ops.connect():
-                        schema = db_ops.get_table_schema()
-                        
-                        # Generate SQL
-                        sql_gen = SQLGenerator(anthropic_key)
-                        result = sql_gen.generate_sql(query, schema)
-                        
-                        if "sql" in result:
-                            # Store results in session state
-                            st.session_state.sql_query = result["sql"]
-                            st.session_state.description = result.get("description", "")
-                            st.session_state.user_query = query
-                            st.success("✅ ສ້າງ SQL ສໍາເລັດແລ້ວ!")
+                    sql_preview = st.empty()
+                    description_preview = st.empty()
+                    partial = {"sql": "", "description": "", "sql_done": False}
+                    
+                    # Runs on the service loop thread: only record the partial answer,
+                    # the script thread renders it
+                    def record_event(event):
+                        if event["type"] == "field" and event["name"] in ("sql", "description"):
+                            partial[event["name"]] = event["value"]
+                        elif event["type"] == "sql":
+                            partial["sql"] = event["sql"]
+                            partial["sql_done"] = True
+                    
+                    # Schema loading and generation run on the shared service;
+                    # submitting cancels this session's previous request
+                    future = service.generate_sql(
+                        st.session_state.session_id, query, anthropic_key, on_event=record_event
+                    )
+                    while True:
+                        try:
+                            result = future.result(timeout=0.1)
+                            break
+                        except FutureTimeoutError:
+                            if partial["sql"]:
+                                sql_preview.code(partial["sql"] + ("" if partial["sql_done"] else " ▌"), language="sql")
+                            if partial["description"]:
+                                description_preview.markdown(
+                                    f'<div class="lao-text">{partial["description"]} ▌</div>', unsafe_allow_html=True
+                                )
+                    sql_preview.empty()
+                    description_preview.empty()
+                    
+                    if "sql" in result:
+                        # Store results in session state
+                        st.session_state.sql_query = result["sql"]
+                        st.session_state.description = result.get("description", "")
+                        st.session_state.user_query = query
+                        st.session_state.schema_selection = result.get("schema_selection")
+                        st.session_state.streaming = result.get("streaming")
+                        st.session_state.plan_check = result.get("plan_check")
+                        if result.get("cache", {}).get("hit"):
+                            st.success("⚡ ໄດ້ SQL ຈາກ Cache ແລ້ວ!")
                         else:
-                            st.error("❌ ການສ້າງ SQL ລົ້ມເຫລວ")
+                            st.success("✅ ສ້າງ SQL ສໍາເລັດແລ້ວ!")
                     else:
-                        st.error("❌ ການເຊື່ອມຕໍ່ກັບຖານຂໍ້ມູນລົ້ມເຫລວ")
+                        st.error("❌ ການສ້າງ SQL ລົ້ມເຫລວ")
                         
+            except ConnectionError:
+                st.error("❌ ການເຊື່ອມຕໍ່ກັບຖານຂໍ້ມູນລົ້ມເຫລວ")
             except Exception as e:
                 st.error(f"❌ ຂໍ້ຜິດພາດ: {str(e)}")
     
@@ -158,26 +221,74 @@ def main():
         st.subheader("🔍 SQL ທີ່ສ້າງໄດ້")
         st.markdown(f'<div class="sql-box">{st.session_state.sql_query}</div>', unsafe_allow_html=True)
         
+        selection = st.session_state.get("schema_selection")
+        if selection:
+            st.caption(
+                f"📉 Schema: {len(selection['tables'])}/{selection['tables_total']} ຕາຕະລາງ "
+                f"({', '.join(selection['tables'])}) · ປະຢັດ ~{selection['tokens_saved']:,} tokens"
+            )
+        
+        streaming = st.session_state.get("streaming")
+        if streaming and streaming.get("ttft_ms") is not None:
+            st.caption(
+                f"⏱️ Token ທໍາອິດ {streaming['ttft_ms']:,.0f} ms · SQL {streaming.get('sql_ms') or 0:,.0f} ms · "
+                f"ທັງໝົດ {streaming['total_ms']:,.0f} ms"
+            )
+        
+        # EXPLAIN check started while the description was still streaming
+        plan_check = st.session_state.get("plan_check")
+        if plan_check:
+            if "error" in plan_check:
+                st.warning(f"⚠️ {plan_check['error']}")
+            elif plan_check["action"] == "rejected":
+                st.warning(f"⚠️ ຄໍາສັ່ງນີ້ຈະຖືກປະຕິເສດ: {plan_check['reason']}")
+            else:
+                st.caption(f"🧮 ປະມານ {plan_check['estimated_rows']:,} ແຖວທີ່ຕ້ອງອ່ານ")
+        
         # Display description in Lao
         if st.session_state.description:
             st.subheader("💡 ຄໍາອະທິບາຍ")
             st.markdown(f'<div class="lao-text">{st.session_state.description}</div>', unsafe_allow_html=True)
         
         # Execute query button
-        if st.button("▶️ ປະຕິບັດຄໍາສັ່ງ", type="secondary"):
+        run_col, cancel_col = st.columns([1, 4])
+        with run_col:
+            execute_button = st.button("▶️ ປະຕິບັດຄໍາສັ່ງ", type="secondary")
+        with cancel_col:
+            if st.button("⏹️ ຍົກເລີກ"):
+                if service.cancel(st.session_state.session_id):
+                    st.info("ຍົກເລີກຄໍາສັ່ງທີ່ກໍາລັງເຮັດວຽກແລ້ວ")
+        
+        if execute_button:
             try:
                 with st.spinner("🔄 ກໍາລັງປະຕິບັດຄໍາສັ່ງ..."):
-                    db_ops = DatabaseOperations()
-                    if db_ops.connect():
-                        result = db_ops.execute_query(st.session_state.sql_query)
-                        
-                        if "error" not in result:
-                            st.session_state.query_result = result
-                            st.success("✅ ປະຕິບັດຄໍາສັ່ງສໍາເລັດແລ້ວ!")
-                        else:
-                            st.error(f"❌ ການປະຕິບັດຄໍາສັ່ງລົ້ມເຫລວ: {result['error']}")
+                    progress = st.empty()
+                    fetched = {"rows": 0}
+                    
+                    # Runs on a worker thread: only record progress, the script thread renders it
+                    def record_progress(chunk, stream):
+                        fetched["rows"] = stream.row_count
+                    
+                    future = service.execute_query(
+                        st.session_state.session_id, st.session_state.sql_query, on_chunk=record_progress
+                    )
+                    while True:
+                        try:
+                            result = future.result(timeout=0.25)
+                            break
+                        except FutureTimeoutError:
+                            progress.caption(f"📥 ໄດ້ຮັບແລ້ວ {fetched['rows']:,} ແຖວ...")
+                    progress.empty()
+                    
+                    if "error" not in result:
+                        st.session_state.query_result = result
+                        st.session_state.result_page = 0
+                        st.success("✅ ປະຕິບັດຄໍາສັ່ງສໍາເລັດແລ້ວ!")
                     else:
-                        st.error("❌ ການເຊື່ອມຕໍ່ກັບຖານຂໍ້ມູນລົ້ມເຫລວ")
+                        st.error(f"❌ ການປະຕິບັດຄໍາສັ່ງລົ້ມເຫລວ: {result['error']}")
+                        if result.get("plan"):
+                            with st.expander("🧮 EXPLAIN"):
+                                st.dataframe(result["plan"]["plan"], use_container_width=True)
                         
             except Exception as e:
                 st.error(f"❌ ຂໍ້ຜິດພາດ: {str(e)}")
@@ -203,10 +314,41 @@ def main():
             with col3:
                 st.metric("ຂະໜາດຂໍ້ມູນ", f"{df.memory_usage(deep=True).sum() / 1024:.1f} KB")
             
+            cache_info = result.get("cache") or {}
+            if cache_info.get("hit"):
+                st.caption(f"⚡ ຜົນລັບຈາກ Cache ({cache_info['tier']}, ອາຍຸ {cache_info['age']} s)")
+            
+            plan = result.get("plan")
+            if plan:
+                full_scans = ", ".join(str(table) for table in plan["full_scans"]) or "-"
+                st.caption(
+                    f"🧮 ແຜນການປະຕິບັດ: ປະມານ {plan['estimated_rows']:,} ແຖວທີ່ຕ້ອງສະແກນ · "
+                    f"Full scan: {full_scans} · Timeout: {plan['max_statement_time']} s"
+                )
+                if plan["action"] == "limit_added":
+                    st.info(f"ℹ️ {plan['reason']}")
+            
+            if result.get("truncated"):
+                limit = {"rows": "ຈໍານວນແຖວ", "guard": " LIMIT ຂອງ query guard"}.get(result.get("truncated_by"), "ຂະໜາດຂໍ້ມູນ")
+                st.warning(f"⚠️ ຜົນລັບຖືກຕັດຕາມຂີດຈໍາກັດ{limit}; ໃຊ້ການແບ່ງໜ້າດ້ານລຸ່ມເພື່ອເບິ່ງຂໍ້ມູນທັງໝົດ")
+            
             # Data preview
             st.subheader("📋 ຕົວຢ່າງຂໍ້ມູນ")
             st.dataframe(df, use_container_width=True)
             
+            # Server-side pagination for results that did not fit under the cap
+            if result.get("truncated"):
+                page = st.number_input("ໜ້າ", min_value=0, step=1, key="result_page")
+                if page > 0:
+                    with DatabaseOperations() as db_ops:
+                        page_result = db_ops.fetch_page(st.session_state.sql_query, page=int(page), page_size=1000)
+                    if "error" in page_result:
+                        st.error(f"❌ {page_result['error']}")
+                    else:
+                        st.dataframe(page_result["data"], use_container_width=True)
+                        if not page_result["has_next"]:
+                            st.caption("ໜ້າສຸດທ້າຍ")
+            
             # Generate chart
             if not df.empty:
                 st.subheader("📈 ການສະແດງຜົນ")
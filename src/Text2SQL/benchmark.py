@@ -0,0 +1,479 @@
+"""
+Load-test and latency benchmark for the Text2SQL pipeline
+
+Drives N concurrent simulated users through the code app.py runs:
+DatabaseOperations.get_table_schema, SQLGenerator.generate_sql (schema selection,
+LLM call, response parsing), DatabaseOperations.execute_query (result cache,
+QueryGuard EXPLAIN check, chunked QueryStream fetch, DataFrame build) and
+ChartGenerator.create_chart. The parsing and DataFrame build stages are read from
+the sql.parse and db.fetch spans those calls emit, so they are part of (not added
+to) the generation and execution stages. No external service is needed: the Anthropic client
+is replaced by a stub that returns canned JSON after a configurable delay, and
+MariaDB by a SQLite database seeded with synthetic tables and an emulated
+information_schema.
+
+Usage:
+    python benchmark.py --users 8 --requests 20 --orders 200000 --llm-latency 0.8
+"""
+import argparse
+import json
+import os
+import random
+import re
+import resource
+import sqlite3
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from chart_generator import ChartGenerator
+from config_db.connection_pool import ConnectionPool
+from db_operations import DatabaseOperations
+from query_guard import QueryGuard
+from result_cache import ResultCache
+from schema_catalog import SchemaCatalog
+from schema_selector import SchemaSelector
+from sql_generator import SQLGenerator
+from rag_core.tracing import get_tracer  # on sys.path once the Text2SQL modules are imported
+
+STAGES = ["schema", "generation", "parsing", "execution", "dataframe", "chart", "total"]
+
+# Canned answers of the stub model, keyed by question
+CANNED_QUERIES = {
+    "top 10 customers by sales": (
+        "SELECT c.name, SUM(o.total) AS sales FROM orders o JOIN customers c ON c.id = o.customer_id "
+        "GROUP BY c.name ORDER BY sales DESC LIMIT 10"
+    ),
+    "sales by region": (
+        "SELECT c.region, SUM(o.total) AS sales FROM orders o JOIN customers c ON c.id = o.customer_id "
+        "GROUP BY c.region"
+    ),
+    "daily sales": "SELECT order_date, SUM(total) AS sales FROM orders GROUP BY order_date ORDER BY order_date",
+    "order quantity vs total": "SELECT quantity, total FROM orders",
+    "all orders": "SELECT * FROM orders",
+}
+
+
+# ---------------------------------------------------------------------------
+# Local stand-ins
+# ---------------------------------------------------------------------------
+
+class StubAnthropic:
+    def __init__(self, latency: float = 0.5, jitter: float = 0.2):
+        """
+        Drop-in for anthropic.Anthropic: messages.create sleeps for latency +/- jitter
+        and answers with the canned SQL for the question as JSON
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.messages = SimpleNamespace(create=self._create)
+
+    def _create(self, **kwargs):
+        question = kwargs["messages"][-1]["content"]
+        time.sleep(max(0.0, random.uniform(self.latency - self.jitter, self.latency + self.jitter)))
+        content = json.dumps({
+            "sql": CANNED_QUERIES.get(question, "SELECT 1 AS unknown_question"),
+            "description": "ຄໍາສັ່ງ SQL ສໍາລັບການທົດສອບ"
+        }, ensure_ascii=False)
+        return SimpleNamespace(
+            content=[SimpleNamespace(text=content)],
+            usage=SimpleNamespace(input_tokens=len(kwargs["system"]) // 4, output_tokens=len(content) // 4)
+        )
+
+
+class StandInCursor:
+    def __init__(self, connection: "StandInConnection"):
+        self._connection = connection
+        self._cursor = connection.sqlite.cursor()
+        self._rows = None
+        self.description = None
+        self.rowcount = -1
+
+    def execute(self, sql: str, params=()):
+        sql, select_limit = self._strip_statement_options(sql)
+        self._rows = None
+
+        if sql.upper().startswith("EXPLAIN"):
+            self._explain(sql[len("EXPLAIN"):].strip(), params)
+            return
+
+        if select_limit is not None and not re.search(r"\bLIMIT\s+\d+", sql, re.IGNORECASE):
+            sql = f"{sql} LIMIT {select_limit}"
+        self._cursor.execute(sql, params)
+        self.description = self._cursor.description
+        self.rowcount = self._cursor.rowcount
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows is not None else self._cursor.fetchone()
+
+    def fetchmany(self, size: int = 1):
+        if self._rows is not None:
+            rows, self._rows = self._rows[:size], self._rows[size:]
+            return rows
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        if self._rows is not None:
+            rows, self._rows = self._rows, []
+            return rows
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+    @staticmethod
+    def _strip_statement_options(sql: str) -> tuple:
+        # MariaDB's SET STATEMENT var = value, ... FOR <statement>
+        match = re.match(r"\s*SET\s+STATEMENT\s+(.*?)\s+FOR\s+(.*)$", sql, re.IGNORECASE | re.DOTALL)
+        if not match:
+            return sql.strip(), None
+        options = dict(re.findall(r"(\w+)\s*=\s*([\w.]+)", match.group(1)))
+        limit = options.get("sql_select_limit")
+        return match.group(2).strip(), int(limit) if limit else None
+
+    def _explain(self, sql: str, params):
+        # Translate SQLite's query plan into MariaDB-style EXPLAIN rows
+        self._cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        aliases = {
+            alias: table
+            for table, alias in re.findall(r"\b(?:FROM|JOIN)\s+(\w+)\s+(?:AS\s+)?(\w+)", sql, re.IGNORECASE)
+        }
+        rows = []
+        for _, _, _, detail in self._cursor.fetchall():
+            match = re.match(r"(SCAN|SEARCH)\s+(?:TABLE\s+)?(\w+)", detail)
+            if not match:
+                continue
+            access, table = match.groups()
+            table = aliases.get(table, table)
+            estimate = self._connection.row_counts.get(table, 1) if access == "SCAN" else 1
+            rows.append((1, "SIMPLE", table, "ALL" if access == "SCAN" else "ref", estimate))
+        self.description = [("id",), ("select_type",), ("table",), ("type",), ("rows",)]
+        self._rows = rows
+
+
+class StandInConnection:
+    _ids = iter(range(1, 1_000_000))
+
+    def __init__(self, database_path: str, row_counts: Dict[str, int]):
+        """
+        SQLite connection exposing the parts of the mariadb connector API the app uses
+        """
+        self.sqlite = sqlite3.connect(database_path, check_same_thread=False)
+        self.sqlite.execute(f"ATTACH DATABASE '{database_path}.information_schema' AS information_schema")
+        self.sqlite.create_function("DATABASE", 0, lambda: "bench")
+        self.row_counts = row_counts
+        self.connection_id = next(self._ids)
+
+    def cursor(self, buffered: bool = True) -> StandInCursor:
+        return StandInCursor(self)
+
+    def ping(self):
+        self.sqlite.execute("SELECT 1")
+
+    def commit(self):
+        self.sqlite.commit()
+
+    def rollback(self):
+        self.sqlite.rollback()
+
+    def close(self):
+        self.sqlite.close()
+
+
+def seed_database(directory: str, customers: int, orders: int, extra_tables: int, seed: int = 42) -> Dict[str, Any]:
+    """
+    Create the synthetic warehouse and its information_schema emulation
+
+    Returns:
+        Dict with the database path and per-table row counts
+    """
+    rng = np.random.default_rng(seed)
+    path = os.path.join(directory, "warehouse.sqlite3")
+    db = sqlite3.connect(path)
+    db.executescript("""
+        CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT NOT NULL, region TEXT);
+        CREATE TABLE orders (
+            id INTEGER PRIMARY KEY,
+            customer_id INTEGER NOT NULL REFERENCES customers(id),
+            order_date TEXT NOT NULL,
+            quantity INTEGER,
+            total REAL
+        );
+    """)
+
+    regions = np.array(["Vientiane", "Luang Prabang", "Savannakhet", "Champasak", "Xiengkhouang"])
+    db.executemany(
+        "INSERT INTO customers VALUES (?, ?, ?)",
+        ((i, f"Customer {i}", regions[i % len(regions)]) for i in range(1, customers + 1))
+    )
+
+    days = pd.date_range("2023-01-01", periods=730).strftime("%Y-%m-%d").to_numpy()
+    order_rows = zip(
+        range(1, orders + 1),
+        rng.integers(1, customers + 1, orders).tolist(),
+        days[rng.integers(0, len(days), orders)].tolist(),
+        rng.integers(1, 20, orders).tolist(),
+        np.round(rng.gamma(2.0, 50.0, orders), 2).tolist()
+    )
+    db.executemany("INSERT INTO orders VALUES (?, ?, ?, ?, ?)", order_rows)
+
+    # Wide, empty tables so schema loading and selection see a realistic catalog size
+    for t in range(extra_tables):
+        columns = ", ".join(f"attribute_{c} TEXT" for c in range(12))
+        db.execute(f"CREATE TABLE dim_extra_{t} (id INTEGER PRIMARY KEY, {columns})")
+    db.commit()
+
+    row_counts = {"customers": customers, "orders": orders}
+    _seed_information_schema(db, path)
+    db.close()
+    return {"path": path, "row_counts": row_counts}
+
+
+def _seed_information_schema(db: sqlite3.Connection, path: str) -> None:
+    db.execute(f"ATTACH DATABASE '{path}.information_schema' AS information_schema")
+    db.executescript("""
+        CREATE TABLE information_schema.TABLES (
+            TABLE_SCHEMA TEXT, TABLE_NAME TEXT, CREATE_TIME TEXT, UPDATE_TIME TEXT, TABLE_COMMENT TEXT
+        );
+        CREATE TABLE information_schema.COLUMNS (
+            TABLE_SCHEMA TEXT, TABLE_NAME TEXT, COLUMN_NAME TEXT, COLUMN_TYPE TEXT, IS_NULLABLE TEXT,
+            COLUMN_KEY TEXT, COLUMN_COMMENT TEXT, ORDINAL_POSITION INTEGER
+        );
+        CREATE TABLE information_schema.KEY_COLUMN_USAGE (
+            TABLE_SCHEMA TEXT, TABLE_NAME TEXT, COLUMN_NAME TEXT,
+            REFERENCED_TABLE_NAME TEXT, REFERENCED_COLUMN_NAME TEXT
+        );
+    """)
+
+    created = "2024-01-01T00:00:00"
+    tables = [row[0] for row in db.execute("SELECT name FROM main.sqlite_master WHERE type = 'table'")]
+    for table in tables:
+        db.execute("INSERT INTO information_schema.TABLES VALUES ('bench', ?, ?, NULL, '')", (table, created))
+        for cid, name, col_type, notnull, _, pk in db.execute(f"PRAGMA main.table_info({table})").fetchall():
+            db.execute(
+                "INSERT INTO information_schema.COLUMNS VALUES ('bench', ?, ?, ?, ?, ?, '', ?)",
+                (table, name, col_type.lower(), "NO" if notnull or pk else "YES", "PRI" if pk else "", cid + 1)
+            )
+        for row in db.execute(f"PRAGMA main.foreign_key_list({table})").fetchall():
+            db.execute(
+                "INSERT INTO information_schema.KEY_COLUMN_USAGE VALUES ('bench', ?, ?, ?, ?)",
+                (table, row[3], row[2], row[4])
+            )
+    db.commit()
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+class StageTimer:
+    def __init__(self):
+        """
+        Thread-safe collector of per-stage latencies
+        """
+        self.samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        report = {}
+        for stage, values in self.samples.items():
+            if not values:
+                continue
+            ms = np.array(values) * 1000
+            report[stage] = {
+                "count": len(values),
+                "p50_ms": round(float(np.percentile(ms, 50)), 2),
+                "p95_ms": round(float(np.percentile(ms, 95)), 2),
+                "p99_ms": round(float(np.percentile(ms, 99)), 2),
+                "mean_ms": round(float(ms.mean()), 2)
+            }
+        return report
+
+
+class SpanStageExporter:
+    def __init__(self, timer: StageTimer):
+        """
+        Tracing exporter feeding the stages that happen inside the pipeline's own calls:
+        response parsing (sql.parse) and DataFrame building (db.fetch)
+        """
+        self.timer = timer
+
+    def on_start(self, span) -> None:
+        pass
+
+    def on_end(self, span) -> None:
+        if span.name == "sql.parse":
+            self.timer.add("parsing", span.duration)
+        elif span.name == "db.fetch" and "dataframe_ms" in span.attributes:
+            self.timer.add("dataframe", span.attributes["dataframe_ms"] / 1000)
+
+
+def run_request(question: str, timer: StageTimer, pool: ConnectionPool, catalog: SchemaCatalog,
+                query_guard: QueryGuard, result_cache: ResultCache, generator: SQLGenerator,
+                chart_generator: ChartGenerator, max_rows: int, fetch_size: int,
+                use_result_cache: bool = True) -> Dict[str, Any]:
+    """
+    One simulated user request through the same calls as app.py
+
+    Returns:
+        Which shortcuts the request took (result cache hit, guard action)
+    """
+    with timer.measure("total"):
+        with DatabaseOperations(pool=pool, schema_catalog=catalog, query_guard=query_guard,
+                                result_cache=result_cache) as db_ops:
+            with timer.measure("schema"):
+                schema = db_ops.get_table_schema()
+
+            with timer.measure("generation"):
+                generated = generator.generate_sql(question, schema)
+
+            with timer.measure("execution"):
+                result = db_ops.execute_query(generated["sql"], max_rows=max_rows, chunk_size=fetch_size,
+                                              use_cache=use_result_cache)
+            if "error" in result:
+                raise RuntimeError(result["error"])
+
+        with timer.measure("chart"):
+            df = result["data"]
+            if "order_date" in df.columns:
+                # SQLite returns dates as text where MariaDB returns dates; cached frames are shared, so copy
+                df = df.assign(order_date=pd.to_datetime(df["order_date"]))
+            # Serialising is what the browser pays for, so include it
+            chart_generator.create_chart(df).to_json()
+
+    return {
+        "result_cache_hit": bool((result.get("cache") or {}).get("hit")),
+        "guard_action": (result.get("plan") or {}).get("action", "unchecked")
+    }
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as directory:
+        seeded = seed_database(directory, args.customers, args.orders, args.extra_tables)
+        pool = ConnectionPool(
+            lambda: StandInConnection(seeded["path"], seeded["row_counts"]),
+            pool_size=args.pool_size
+        )
+        catalog = SchemaCatalog(ttl=args.schema_ttl)
+        query_guard = QueryGuard()
+        # In-memory only, shared by all users like the app's process-wide cache
+        result_cache = ResultCache(cache_dir=None)
+
+        generator = SQLGenerator(
+            "stub", schema_selector=None if args.no_schema_selection else SchemaSelector(catalog)
+        )
+        generator.client = StubAnthropic(args.llm_latency, args.llm_jitter)
+
+        chart_generator = ChartGenerator()
+        questions = list(CANNED_QUERIES)
+        if args.no_full_scan:
+            questions.remove("all orders")
+        timer = StageTimer()
+        tracer = get_tracer()
+        exporters, record_metrics = tracer.exporters, tracer.record_metrics
+        tracer.configure(exporters + [SpanStageExporter(timer)], record_metrics=record_metrics)
+
+        if args.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.users) as executor:
+            futures = [
+                executor.submit(run_request, questions[i % len(questions)], timer, pool, catalog,
+                                query_guard, result_cache, generator, chart_generator, args.max_rows, args.fetch_size,
+                                not args.no_result_cache)
+                for i in range(args.users * args.requests)
+            ]
+            errors = [str(future.exception()) for future in futures if future.exception()]
+            outcomes = [future.result() for future in futures if not future.exception()]
+        wall_time = time.perf_counter() - start
+        tracer.configure(exporters, record_metrics=record_metrics)
+        peak_traced = None
+        if args.trace_memory:
+            _, peak_traced = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        completed = len(futures) - len(errors)
+        report = {
+            "config": vars(args),
+            "stages": timer.summary(),
+            "requests": len(futures),
+            "errors": errors[:10],
+            "wall_time_s": round(wall_time, 3),
+            "throughput_rps": round(completed / wall_time, 2) if wall_time else 0.0,
+            "peak_python_memory_mb": round(peak_traced / 1024 / 1024, 1) if peak_traced else None,
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "pool": pool.stats(),
+            "result_cache_hits": sum(outcome["result_cache_hit"] for outcome in outcomes),
+            "guard_actions": {
+                action: sum(outcome["guard_action"] == action for outcome in outcomes)
+                for action in sorted({outcome["guard_action"] for outcome in outcomes})
+            }
+        }
+        pool.close()
+        return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\n{'stage':<12}{'count':>8}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}")
+    for stage in STAGES:
+        row = report["stages"].get(stage)
+        if row:
+            print(f"{stage:<12}{row['count']:>8}{row['p50_ms']:>12.2f}{row['p95_ms']:>12.2f}{row['p99_ms']:>12.2f}")
+    print(f"\nusers={report['config']['users']} requests={report['requests']} errors={len(report['errors'])}")
+    print(f"throughput: {report['throughput_rps']} req/s over {report['wall_time_s']} s")
+    traced = report["peak_python_memory_mb"]
+    print(f"peak memory: {report['peak_rss_mb']} MB RSS" + (f", {traced} MB traced" if traced else ""))
+    print(f"pool: {report['pool']}")
+    print(f"result cache hits: {report['result_cache_hits']}  guard: {report['guard_actions']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Text2SQL load and latency benchmark with local stand-ins")
+    parser.add_argument("--users", type=int, default=4, help="Concurrent simulated users")
+    parser.add_argument("--requests", type=int, default=10, help="Requests per user")
+    parser.add_argument("--customers", type=int, default=5_000)
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--extra-tables", type=int, default=100, help="Additional empty tables in the catalog")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Stub model latency in seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.2)
+    parser.add_argument("--pool-size", type=int, default=5)
+    parser.add_argument("--schema-ttl", type=float, default=0.0, help="0 re-validates the catalog on every request")
+    parser.add_argument("--max-rows", type=int, default=100_000)
+    parser.add_argument("--fetch-size", type=int, default=5_000)
+    parser.add_argument("--no-schema-selection", action="store_true")
+    parser.add_argument("--no-full-scan", action="store_true", help="Skip the SELECT * question")
+    parser.add_argument("--no-result-cache", action="store_true", help="Execute every request against the database")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Track peak Python allocations with tracemalloc (slows every stage)")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+
+
+if __name__ == "__main__":
+    main()
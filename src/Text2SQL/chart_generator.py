@@ -1,14 +1,31 @@
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from typing import Dict, Any, List
 
+from data_reduction import density_2d, lttb_indices, minmax_indices, top_k_with_other
+
 class ChartGenerator:
-    def __init__(self):
+    def __init__(self, max_points: int = 2000, time_series_method: str = "lttb", density_bins: int = 100,
+                 top_k: int = 20, max_table_rows: int = 500):
         """
         Initialize Chart Generator for creating visualizations
+        
+        Large results are reduced before they reach Plotly so the figure JSON stays small:
+        
+        Args:
+            max_points: Points kept for line/scatter charts
+            time_series_method: "lttb" or "minmax" downsampling for time series
+            density_bins: Grid size of the 2D density used instead of large scatters
+            top_k: Categories kept for bar/pie charts, the rest becomes "Other"
+            max_table_rows: Rows rendered by the table chart
         """
-        pass
+        self.max_points = max_points
+        self.time_series_method = time_series_method
+        self.density_bins = density_bins
+        self.top_k = top_k
+        self.max_table_rows = max_table_rows
     
     def create_chart(self, df: pd.DataFrame) -> go.Figure:
         """
@@ -47,17 +64,38 @@ class ChartGenerator:
             return self._create_empty_chart(f"Error creating chart: {str(e)}")
     
     def _create_time_series_chart(self, df: pd.DataFrame, time_col: str, value_col: str) -> go.Figure:
-        """Create time series chart"""
-        fig = px.line(df, x=time_col, y=value_col, title=f"{value_col} over time")
+        """Create time series chart, downsampled with LTTB or min/max buckets"""
+        data = df[[time_col, value_col]].dropna().sort_values(time_col)
+        method = None
+        if len(data) > self.max_points:
+            x = data[time_col].to_numpy().astype("datetime64[ns]").astype(np.int64)
+            y = data[value_col].to_numpy(dtype=np.float64)
+            if self.time_series_method == "minmax":
+                keep = minmax_indices(y, self.max_points // 2)
+                method = "min/max"
+            else:
+                keep = lttb_indices(x, y, self.max_points)
+                method = "LTTB"
+            reduced = data.iloc[keep]
+        else:
+            reduced = data
+        
+        fig = px.line(reduced, x=time_col, y=value_col, title=f"{value_col} over time")
         fig.update_layout(height=500, xaxis_title=time_col, yaxis_title=value_col)
+        if method:
+            self._annotate_reduction(fig, len(data), len(reduced), method)
         return fig
     
     def _create_bar_chart(self, df: pd.DataFrame, cat_col: str, value_col: str) -> go.Figure:
         """Create bar chart"""
         # Group by categorical column and aggregate numeric column
         if value_col in df.columns:
-            grouped = df.groupby(cat_col)[value_col].sum().reset_index()
+            totals = top_k_with_other(df[cat_col], df[value_col], self.top_k)
+            grouped = pd.DataFrame({cat_col: totals.index.astype(str), value_col: totals.to_numpy()})
             fig = px.bar(grouped, x=cat_col, y=value_col, title=f"{value_col} by {cat_col}")
+            categories = df[cat_col].nunique()
+            if categories > self.top_k:
+                self._annotate_reduction(fig, categories, len(grouped), f"top {self.top_k} + Other", unit="categories")
         else:
             # Count categorical values
             value_counts = df[cat_col].value_counts().head(20)
@@ -67,33 +105,71 @@ class ChartGenerator:
         return fig
     
     def _create_scatter_chart(self, df: pd.DataFrame, x_col: str, y_col: str) -> go.Figure:
-        """Create scatter plot"""
-        fig = px.scatter(df, x=x_col, y=y_col, title=f"{x_col} vs {y_col}")
-        fig.update_layout(height=500, xaxis_title=x_col, yaxis_title=y_col)
+        """Create scatter plot, or a binned 2D density when there are too many points"""
+        if len(df) <= self.max_points:
+            fig = px.scatter(df, x=x_col, y=y_col, title=f"{x_col} vs {y_col}")
+            fig.update_layout(height=500, xaxis_title=x_col, yaxis_title=y_col)
+            return fig
+        
+        x = df[x_col].to_numpy(dtype=np.float64)
+        y = df[y_col].to_numpy(dtype=np.float64)
+        x_centers, y_centers, counts = density_2d(x, y, bins=self.density_bins)
+        fig = go.Figure(data=go.Heatmap(x=x_centers, y=y_centers, z=counts, colorscale="Blues",
+                                        colorbar=dict(title="Count")))
+        fig.update_layout(height=500, title=f"{x_col} vs {y_col} (density)", xaxis_title=x_col, yaxis_title=y_col)
+        # The cells aggregate points rather than select them, so say how many points they hold
+        points = int(np.nansum(counts))
+        cells = int(np.count_nonzero(~np.isnan(counts)))
+        self._annotate_reduction(fig, points, cells, "2D density", shown_unit="non-empty cells")
         return fig
     
     def _create_pie_chart(self, df: pd.DataFrame, cat_col: str) -> go.Figure:
         """Create pie chart"""
-        value_counts = df[cat_col].value_counts().head(10)  # Limit to top 10
-        fig = px.pie(values=value_counts.values, names=value_counts.index, title=f"Distribution of {cat_col}")
+        counts = top_k_with_other(df[cat_col], pd.Series(1, index=df.index), 10)  # Top 10 + Other
+        fig = px.pie(values=counts.to_numpy(), names=counts.index.astype(str), title=f"Distribution of {cat_col}")
         fig.update_layout(height=500)
+        categories = df[cat_col].nunique()
+        if categories > 10:
+            self._annotate_reduction(fig, categories, len(counts), "top 10 + Other", unit="categories")
         return fig
     
     def _create_histogram_chart(self, df: pd.DataFrame, num_col: str) -> go.Figure:
-        """Create histogram"""
-        fig = px.histogram(df, x=num_col, title=f"Distribution of {num_col}")
-        fig.update_layout(height=500, xaxis_title=num_col, yaxis_title="Frequency")
+        """Create histogram from bins computed here instead of shipping raw values"""
+        values = df[num_col].to_numpy(dtype=np.float64)
+        values = values[np.isfinite(values)]
+        counts, edges = np.histogram(values, bins="auto" if len(values) <= self.max_points else 100)
+        fig = go.Figure(data=go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges)))
+        fig.update_layout(height=500, title=f"Distribution of {num_col}", xaxis_title=num_col,
+                          yaxis_title="Frequency", bargap=0)
         return fig
     
     def _create_table_chart(self, df: pd.DataFrame) -> go.Figure:
         """Create table visualization"""
+        shown = df.head(self.max_table_rows)
         fig = go.Figure(data=[go.Table(
-            header=dict(values=list(df.columns), fill_color='paleturquoise', align='left'),
-            cells=dict(values=[df[col] for col in df.columns], fill_color='lavender', align='left'))
+            header=dict(values=list(shown.columns), fill_color='paleturquoise', align='left'),
+            cells=dict(values=[shown[col] for col in shown.columns], fill_color='lavender', align='left'))
         ])
         fig.update_layout(height=400, title="Data Table")
+        if len(df) > len(shown):
+            self._annotate_reduction(fig, len(df), len(shown), "first rows", unit="rows")
         return fig
     
+    def _annotate_reduction(self, fig: go.Figure, original: int, shown: int, method: str,
+                            unit: str = "points", shown_unit: str = None) -> None:
+        """Note on the chart how much the data was reduced (`shown_unit` when the shown marks are aggregates)"""
+        ratio = original / shown if shown else float("inf")
+        if shown_unit:
+            text = f"{original:,} {unit} shown as {shown:,} {shown_unit} ({method}, {ratio:,.1f}x reduction)"
+        else:
+            text = f"Showing {shown:,} of {original:,} {unit} ({method}, {ratio:,.1f}x reduction)"
+        fig.add_annotation(
+            text=text,
+            xref="paper", yref="paper",
+            x=1, y=1.06, xanchor="right", showarrow=False,
+            font=dict(size=11, color="gray")
+        )
+    
     def _create_empty_chart(self, message: str) -> go.Figure:
         """Create empty chart with message"""
         fig = go.Figure()
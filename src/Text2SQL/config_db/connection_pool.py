@@ -0,0 +1,198 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        connection_factory: Callable[[], Any],
+        pool_size: int = 5,
+        checkout_timeout: float = 30.0,
+        idle_timeout: float = 300.0,
+        ping_after: float = 5.0,
+    ):
+        """
+        Thread-safe pool of database connections shared by the whole process
+
+        Args:
+            connection_factory: Callable that opens a new connection
+            pool_size: Maximum number of open connections (idle + in use)
+            checkout_timeout: Seconds to wait for a free connection before giving up
+            idle_timeout: Idle connections older than this are closed
+            ping_after: Connections idle longer than this are pinged on checkout
+        """
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+
+        self.connection_factory = connection_factory
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+
+        self._idle = deque()  # (connection, released_at), most recent on the right
+        self._open_count = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "creations": 0,
+            "health_check_failures": 0,
+            "idle_evictions": 0,
+            "timeouts": 0,
+        }
+
+    def acquire(self) -> Any:
+        """
+        Borrow a connection, creating one if the pool is not yet full
+        """
+        deadline = time.monotonic() + self.checkout_timeout
+        waited = False
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Connection pool is closed")
+
+            stale = self._evict_idle_locked()
+            while True:
+                if self._idle:
+                    connection, released_at = self._idle.pop()
+                    break
+                if self._open_count < self.pool_size:
+                    # Reserve a slot; the connection itself is opened outside the lock
+                    self._open_count += 1
+                    connection, released_at = None, None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    self._close_all(stale)
+                    raise TimeoutError(
+                        f"No database connection available after {self.checkout_timeout}s "
+                        f"(pool_size={self.pool_size})"
+                    )
+                if not waited:
+                    waited = True
+                    self._stats["waits"] += 1
+                self._cond.wait(remaining)
+
+            self._stats["checkouts"] += 1
+
+        self._close_all(stale)
+
+        if connection is not None and not self._is_healthy(connection, released_at):
+            with self._cond:
+                self._stats["health_check_failures"] += 1
+            self._close_all([connection])
+            connection = None
+
+        if connection is None:
+            connection = self._create()
+
+        return connection
+
+    def release(self, connection: Any) -> None:
+        """
+        Return a borrowed connection to the pool
+        """
+        try:
+            # Never hand an open transaction to the next borrower
+            connection.rollback()
+        except Exception:
+            self.discard(connection)
+            return
+
+        with self._cond:
+            if not self._closed:
+                self._idle.append((connection, time.monotonic()))
+                self._cond.notify()
+                return
+            self._open_count -= 1
+
+        self._close_all([connection])
+
+    def discard(self, connection: Any) -> None:
+        """
+        Close a borrowed connection instead of returning it (e.g. after a fatal error)
+        """
+        with self._cond:
+            self._open_count -= 1
+            self._cond.notify()
+        self._close_all([connection])
+
+    def close(self) -> None:
+        """
+        Close all idle connections; connections still in use are closed on release
+        """
+        with self._cond:
+            self._closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._open_count -= len(idle)
+            self._cond.notify_all()
+        self._close_all(idle)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Snapshot of pool usage counters
+        """
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                **self._stats,
+                "pool_size": self.pool_size,
+                "open": self._open_count,
+                "idle": idle,
+                "in_use": self._open_count - idle,
+            }
+
+    def _create(self) -> Any:
+        try:
+            connection = self.connection_factory()
+        except Exception:
+            with self._cond:
+                self._open_count -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._stats["creations"] += 1
+        return connection
+
+    def _is_healthy(self, connection: Any, released_at: Optional[float]) -> bool:
+        if released_at is not None and time.monotonic() - released_at < self.ping_after:
+            return True
+        try:
+            connection.ping()
+            return True
+        except Exception:
+            return False
+
+    def _evict_idle_locked(self) -> list:
+        """
+        Pop connections idle longer than idle_timeout; caller closes them outside the lock
+        """
+        stale = []
+        cutoff = time.monotonic() - self.idle_timeout
+        # Oldest connections sit on the left
+        while self._idle and self._idle[0][1] < cutoff:
+            connection, _ = self._idle.popleft()
+            stale.append(connection)
+        if stale:
+            self._open_count -= len(stale)
+            self._stats["idle_evictions"] += len(stale)
+            self._cond.notify(len(stale))
+        return stale
+
+    @staticmethod
+    def _close_all(connections: list) -> None:
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception:
+                pass
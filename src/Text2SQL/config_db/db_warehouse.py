@@ -1,5 +1,11 @@
 import mariadb
 import os
+import threading
+
+from config_db.connection_pool import ConnectionPool
+
+_pool = None
+_pool_lock = threading.Lock()
 
 def get_db_connection():
     """
@@ -17,4 +23,22 @@ def get_db_connection():
         return connection
     except mariadb.Error as e:
         print(f"Error connecting to MariaDB: {e}")
-        raise 
\ No newline at end of file
+        raise
+
+def get_connection_pool() -> ConnectionPool:
+    """
+    ສົ່ງຄືນ Connection Pool ດຽວທີ່ໃຊ້ຮ່ວມກັນທັງ Process.
+    ຕັ້ງຄ່າຂະໜາດ ແລະ Timeout ຈາກ Environment Variables (DB_POOL_*).
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    get_db_connection,
+                    pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+                    checkout_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+                    idle_timeout=float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300")),
+                    ping_after=float(os.getenv("DB_POOL_PING_AFTER", "5"))
+                )
+    return _pool
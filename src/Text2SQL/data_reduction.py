@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+from typing import Tuple
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling
+
+    Returns the indices of the points to keep. `x` must be sorted ascending and
+    numeric (datetimes as int64). The first and last points are always kept; for
+    each bucket in between the point forming the largest triangle with the previous
+    pick and the next bucket's average is chosen.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+
+    # Bucket edges over the interior points [1, n - 1)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+
+    # Average of every bucket (vectorised with cumulative sums); the last bucket's
+    # "next" average is the final point itself
+    cum_x = np.concatenate(([0.0], np.cumsum(x)))
+    cum_y = np.concatenate(([0.0], np.cumsum(y)))
+    counts = np.maximum(ends - starts, 1)
+    avg_x = (cum_x[ends] - cum_x[starts]) / counts
+    avg_y = (cum_y[ends] - cum_y[starts]) / counts
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        if end <= start:
+            selected[i + 1] = start
+            previous = start
+            continue
+        bx = x[start:end]
+        by = y[start:end]
+        # Twice the triangle area; the constant factor does not change the argmax
+        area = np.abs(
+            (x[previous] - next_x[i]) * (by - y[previous])
+            - (x[previous] - bx) * (next_y[i] - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+
+    return np.unique(selected)
+
+
+def minmax_indices(y: np.ndarray, n_buckets: int) -> np.ndarray:
+    """
+    Keep the minimum and maximum point of each of `n_buckets` equal-count buckets
+
+    Preserves spikes exactly; returns at most 2 * n_buckets sorted indices.
+    """
+    n = len(y)
+    if 2 * n_buckets >= n:
+        return np.arange(n)
+
+    bucket = np.arange(n) * n_buckets // n
+    # Sort by bucket, then value: first entry per bucket is its min, last is its max
+    order = np.lexsort((y, bucket))
+    boundaries = np.flatnonzero(np.diff(bucket[order])) + 1
+    firsts = np.concatenate(([0], boundaries))
+    lasts = np.concatenate((boundaries - 1, [n - 1]))
+    return np.unique(np.concatenate((order[firsts], order[lasts])))
+
+
+def density_2d(x: np.ndarray, y: np.ndarray, bins: int = 100) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Bin a point cloud into a `bins` x `bins` count grid
+
+    Returns (x_centers, y_centers, counts) with counts shaped (y, x) for a heatmap;
+    empty cells are NaN so they render transparent.
+    """
+    mask = np.isfinite(x) & np.isfinite(y)
+    counts, x_edges, y_edges = np.histogram2d(x[mask], y[mask], bins=bins)
+    counts = counts.T
+    counts[counts == 0] = np.nan
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    return x_centers, y_centers, counts
+
+
+def top_k_with_other(labels: pd.Series, values: pd.Series, k: int, other_label: str = "Other") -> pd.Series:
+    """
+    Aggregate values per label and keep the K largest, summing the rest into one bucket
+    """
+    totals = values.groupby(labels, sort=False).sum()
+    if len(totals) <= k:
+        return totals.sort_values(ascending=False)
+
+    array = totals.to_numpy()
+    top = np.argpartition(-array, k - 1)[:k]
+    top = top[np.argsort(-array[top])]
+    rest = np.ones(len(array), dtype=bool)
+    rest[top] = False
+
+    reduced = totals.iloc[top]
+    return pd.concat([reduced, pd.Series([array[rest].sum()], index=[other_label])])
@@ -1,20 +1,47 @@
+import os
+import sys
+import time
 import pandas as pd 
-from typing import Dict, Any
-from config_db.db_warehouse import get_db_connection
+from typing import Dict, Any, Callable, Iterator, List
+from config_db.connection_pool import ConnectionPool
+from config_db.db_warehouse import get_connection_pool
+from schema_catalog import SchemaCatalog, get_schema_catalog
+from query_guard import QueryGuard, get_query_guard, has_limit, is_read_only, strip_semicolon, with_statement_options
+from result_cache import ResultCache, get_result_cache, referenced_tables
+
+# Shared instrumentation (src/rag_core)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag_core.tracing import get_tracer
+
+tracer = get_tracer()
 
 class DatabaseOperations:
-    def __init__(self):
+    def __init__(self, pool: ConnectionPool = None, schema_catalog: SchemaCatalog = None,
+                 query_guard: QueryGuard = None, result_cache: ResultCache = None):
         """
         Initialize Database Operations
         """
+        self.pool = pool or get_connection_pool()
+        self.schema_catalog = schema_catalog or get_schema_catalog()
+        self.query_guard = query_guard or get_query_guard()
+        self.result_cache = result_cache or get_result_cache()
         self.connection = None
     
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.disconnect()
+    
     def connect(self) -> bool:
         """
-        Establish database connection
+        Borrow a connection from the shared pool
         """
+        if self.connection:
+            return True
+        
         try:
-            self.connection = get_db_connection()
+            self.connection = self.pool.acquire()
             return True
         except Exception as e:
             print(f"Database connection failed: {e}")
@@ -22,46 +49,119 @@ class DatabaseOperations:
     
     def disconnect(self):
         """
-        Close database connection
+        Return the borrowed connection to the pool
         """
         if self.connection:
-            self.connection.close()
+            self.pool.release(self.connection)
             self.connection = None
     
-    def execute_query(self, sql_query: str) -> Dict[str, Any]:
+    def execute_query(self, sql_query: str, max_rows: int = None, max_bytes: int = None,
+                      chunk_size: int = None, on_chunk: Callable[[pd.DataFrame, "QueryStream"], None] = None,
+                      guard: bool = True, use_cache: bool = True) -> Dict[str, Any]:
         """
         Execute SQL query and return results
+        
+        With `use_cache` SELECT results are served from the result cache while the
+        referenced tables are unchanged; "cache" in the result tells whether it hit.
+        With `guard` the statement is first checked with EXPLAIN by the query guard,
+        which may reject it or add a LIMIT; the estimate is returned as "plan" and the
+        statement runs under the guard's max_statement_time.
+        SELECT results are fetched in chunks and capped at `max_rows` rows / `max_bytes`
+        bytes of DataFrame memory (defaults from QUERY_MAX_ROWS / QUERY_MAX_BYTES);
+        "truncated" in the result tells whether the cap, or a LIMIT the guard added
+        (truncated_by "guard"), was hit. `on_chunk` is called with every fetched chunk
+        so the UI can render progress.
         """
         if not self.connection:
             if not self.connect():
                 return {"error": "Database connection failed"}
         
+        is_select = sql_query.strip().upper().startswith('SELECT')
+        cache_key = None
+        if use_cache and is_select:
+            try:
+                tables = referenced_tables(sql_query, self.schema_catalog.tables.keys())
+                versions = self.result_cache.table_versions(self.connection, tables)
+                # A guarded run may come back LIMITed, so guarded and unguarded results are kept apart
+                cache_key = self.result_cache.make_key(sql_query, max_rows=max_rows, max_bytes=max_bytes, guard=guard)
+                cached = self.result_cache.get(cache_key, versions)
+                if cached:
+                    return cached
+            except Exception as e:
+                print(f"Result cache lookup failed: {e}")
+                cache_key = None
+        
+        plan = None
+        max_statement_time = None
+        if guard:
+            try:
+                plan = self.query_guard.inspect(self.connection, sql_query)
+            except Exception as e:
+                return {
+                    "error": f"Query plan check failed: {str(e)}",
+                    "sql": sql_query
+                }
+            if plan["action"] == "rejected":
+                return {
+                    "error": f"Query rejected by cost guard: {plan['reason']}",
+                    "sql": sql_query,
+                    "plan": plan
+                }
+            sql_query = plan["sql"]
+            max_statement_time = plan["max_statement_time"]
+        
+        cursor = None
         try:
-            cursor = self.connection.cursor()
-            cursor.execute(sql_query)
-            
             # Check if it's a SELECT query
-            if sql_query.strip().upper().startswith('SELECT'):
-                # Fetch results
-                columns = [desc[0] for desc in cursor.description]
-                rows = cursor.fetchall()
+            if is_select:
+                # db.fetch splits the time into server fetches and DataFrame building
+                with tracer.span("db.fetch") as span:
+                    stream = self.stream_query(sql_query, max_rows=max_rows, max_bytes=max_bytes, chunk_size=chunk_size,
+                                               max_statement_time=max_statement_time)
+                    chunks = []
+                    for chunk in stream:
+                        chunks.append(chunk)
+                        if on_chunk:
+                            on_chunk(chunk, stream)
+                    
+                    # Convert to DataFrame
+                    started = time.perf_counter()
+                    df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=stream.columns)
+                    dataframe_seconds = stream.dataframe_seconds + time.perf_counter() - started
+                    span.set_attributes(rows=len(df), chunks=len(chunks),
+                                        fetch_ms=round(stream.fetch_seconds * 1000, 3),
+                                        dataframe_ms=round(dataframe_seconds * 1000, 3))
                 
-                # Convert to DataFrame
-                df = pd.DataFrame(rows, columns=columns)
+                truncated, truncated_by = stream.truncated, stream.truncated_by
+                if (not truncated and plan and plan["action"] == "limit_added"
+                        and len(df) >= self.query_guard.auto_limit):
+                    # The LIMIT the guard added cut the result short
+                    truncated, truncated_by = True, "guard"
                 
-                return {
+                result = {
                     "success": True,
                     "data": df,
                     "row_count": len(df),
-                    "columns": columns
+                    "columns": stream.columns,
+                    "truncated": truncated,
+                    "truncated_by": truncated_by,
+                    "max_rows": stream.max_rows,
+                    "plan": plan
                 }
+                if cache_key:
+                    result["cache"] = {"hit": False}
+                    self.result_cache.put(cache_key, result, versions)
+                return result
             else:
                 # For non-SELECT queries
+                cursor = self.connection.cursor()
+                cursor.execute(with_statement_options(sql_query, max_statement_time=max_statement_time))
                 self.connection.commit()
                 return {
                     "success": True,
                     "message": f"Query executed successfully. Rows affected: {cursor.rowcount}",
-                    "row_count": cursor.rowcount
+                    "row_count": cursor.rowcount,
+                    "plan": plan
                 }
                 
         except Exception as e:
@@ -73,50 +173,130 @@ class DatabaseOperations:
             if cursor:
                 cursor.close()
     
-    def get_table_schema(self) -> str:
+    def stream_query(self, sql_query: str, max_rows: int = None, max_bytes: int = None,
+                     chunk_size: int = None, max_statement_time: float = None) -> "QueryStream":
         """
-        Get database schema information as a string
+        Run a SELECT and return a QueryStream that yields DataFrame chunks
         """
         if not self.connection:
             if not self.connect():
-                return "Database connection failed"
+                raise ConnectionError("Database connection failed")
+        
+        max_rows = max_rows or int(os.getenv("QUERY_MAX_ROWS", "100000"))
+        max_bytes = max_bytes or int(os.getenv("QUERY_MAX_BYTES", str(200 * 1024 * 1024)))
+        chunk_size = chunk_size or int(os.getenv("QUERY_FETCH_SIZE", "5000"))
+        
+        # Let the server stop after max_rows + 1 rows (the extra row detects truncation);
+        # an explicit LIMIT in the query still takes precedence
+        limited_sql = with_statement_options(
+            sql_query, sql_select_limit=max_rows + 1, max_statement_time=max_statement_time
+        )
+        
+        cursor = self.connection.cursor(buffered=False)
+        try:
+            cursor.execute(limited_sql)
+        except Exception:
+            cursor.close()
+            raise
+        return QueryStream(cursor, chunk_size, max_rows, max_bytes)
+    
+    def fetch_page(self, sql_query: str, page: int = 0, page_size: int = 1000,
+                   guard: bool = True) -> Dict[str, Any]:
+        """
+        Fetch one page of a SELECT result with LIMIT/OFFSET on the server
+        
+        Only read-only SELECTs are paged. With `guard` the paged statement goes through
+        the query guard like execute_query: it may be rejected, and it runs under the
+        guard's max_statement_time; the estimate is returned as "plan".
+        """
+        if not is_read_only(sql_query):
+            return {
+                "error": "Only read-only SELECT statements can be paged",
+                "sql": sql_query
+            }
+        
+        if not self.connection:
+            if not self.connect():
+                return {"error": "Database connection failed"}
+        
+        sql = strip_semicolon(sql_query)
+        offset = max(page, 0) * page_size
+        if has_limit(sql):
+            # Keep the query's own LIMIT (and its ORDER BY) inside a derived table
+            paged_sql = f"SELECT * FROM ({sql}) AS paged_query LIMIT {page_size + 1} OFFSET {offset}"
+        else:
+            paged_sql = f"{sql} LIMIT {page_size + 1} OFFSET {offset}"
+        
+        plan = None
+        max_statement_time = None
+        if guard:
+            try:
+                plan = self.query_guard.inspect(self.connection, paged_sql)
+            except Exception as e:
+                return {
+                    "error": f"Query plan check failed: {str(e)}",
+                    "sql": paged_sql
+                }
+            if plan["action"] == "rejected":
+                return {
+                    "error": f"Query rejected by cost guard: {plan['reason']}",
+                    "sql": paged_sql,
+                    "plan": plan
+                }
+            max_statement_time = plan["max_statement_time"]
         
+        cursor = None
         try:
             cursor = self.connection.cursor()
+            cursor.execute(with_statement_options(paged_sql, max_statement_time=max_statement_time))
+            columns = [desc[0] for desc in cursor.description]
+            rows = cursor.fetchall()
             
-            # Get all tables
-            cursor.execute("SHOW TABLES")
-            tables = cursor.fetchall()
-            
-            schema_info = "Database Schema:\n"
-            for table in tables:
-                table_name = table[0]
-                schema_info += f"\nTable: {table_name}\n"
-                
-                # Get table structure
-                cursor.execute(f"DESCRIBE {table_name}")
-                columns = cursor.fetchall()
-                
-                for col in columns:
-                    schema_info += f"  - {col[0]}: {col[1]}"
-                    if col[2] == 'NO':
-                        schema_info += " (NOT NULL)"
-                    if col[3] == 'PRI':
-                        schema_info += " (PRIMARY KEY)"
-                    schema_info += "\n"
-            
-            return schema_info
-                
+            has_next = len(rows) > page_size
+            df = pd.DataFrame(rows[:page_size], columns=columns)
+            return {
+                "success": True,
+                "data": df,
+                "row_count": len(df),
+                "columns": columns,
+                "page": page,
+                "page_size": page_size,
+                "has_next": has_next,
+                "plan": plan
+            }
         except Exception as e:
-            return f"Schema retrieval failed: {str(e)}"
+            return {
+                "error": f"Query execution failed: {str(e)}",
+                "sql": sql_query
+            }
         finally:
             if cursor:
                 cursor.close()
     
+    def get_table_schema(self) -> str:
+        """
+        Get database schema information as a string
+        """
+        # A fresh (or freshly loaded from disk) catalog needs no database round trip
+        if self.schema_catalog.is_fresh():
+            return self.schema_catalog.to_schema_string()
+        
+        if not self.connection:
+            if not self.connect():
+                return "Database connection failed"
+        
+        try:
+            self.schema_catalog.get_tables(self.connection)
+            return self.schema_catalog.to_schema_string()
+                
+        except Exception as e:
+            return f"Schema retrieval failed: {str(e)}"
+    
     def test_connection(self) -> bool:
         """
         Test database connection
         """
+        was_connected = self.connection is not None
         try:
             if self.connect():
                 cursor = self.connection.cursor()
@@ -126,4 +306,68 @@ class DatabaseOperations:
                 return True
             return False
         except:
-            return False 
\ No newline at end of file
+            return False
+        finally:
+            if not was_connected:
+                self.disconnect() 
+
+class QueryStream:
+    def __init__(self, cursor, chunk_size: int, max_rows: int, max_bytes: int):
+        """
+        Iterator over a running SELECT that yields DataFrame chunks via fetchmany
+        
+        After iteration `row_count`, `bytes`, `truncated` and `truncated_by`
+        ("rows" or "bytes") describe what was fetched; `fetch_seconds` and
+        `dataframe_seconds` split the time between fetchmany and building the chunks.
+        """
+        self.cursor = cursor
+        self.columns: List[str] = [desc[0] for desc in cursor.description]
+        self.chunk_size = chunk_size
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        
+        self.row_count = 0
+        self.bytes = 0
+        self.truncated = False
+        self.truncated_by = None
+        self.fetch_seconds = 0.0
+        self.dataframe_seconds = 0.0
+    
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        try:
+            while True:
+                started = time.perf_counter()
+                rows = self.cursor.fetchmany(self.chunk_size)
+                self.fetch_seconds += time.perf_counter() - started
+                if not rows:
+                    break
+                
+                remaining = self.max_rows - self.row_count
+                if len(rows) > remaining:
+                    rows = rows[:remaining]
+                    self.truncated, self.truncated_by = True, "rows"
+                
+                if rows:
+                    started = time.perf_counter()
+                    chunk = pd.DataFrame(rows, columns=self.columns)
+                    self.dataframe_seconds += time.perf_counter() - started
+                    self.row_count += len(chunk)
+                    self.bytes += int(chunk.memory_usage(deep=True).sum())
+                    yield chunk
+                
+                if self.truncated:
+                    break
+                if self.bytes >= self.max_bytes:
+                    # Only truncated if rows remain (the row cap checks its extra row the same way)
+                    started = time.perf_counter()
+                    if self.cursor.fetchmany(1):
+                        self.truncated, self.truncated_by = True, "bytes"
+                    self.fetch_seconds += time.perf_counter() - started
+                    break
+        finally:
+            self.close()
+    
+    def close(self):
+        if self.cursor:
+            self.cursor.close()
+            self.cursor = None
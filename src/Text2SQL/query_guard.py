@@ -0,0 +1,187 @@
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+_TRAILING_LIMIT = re.compile(r"\bLIMIT\s+\d+(\s*(,|OFFSET)\s*\d+)?\s*$", re.IGNORECASE)
+# SELECTs that still write or lock when executed
+_SELECT_SIDE_EFFECTS = re.compile(
+    r"\bINTO\s+(OUTFILE|DUMPFILE|@)|\bFOR\s+UPDATE\b|\bLOCK\s+IN\s+SHARE\s+MODE\b", re.IGNORECASE
+)
+
+
+def strip_semicolon(sql_query: str) -> str:
+    """
+    Remove trailing whitespace and semicolons so the statement can be wrapped
+    """
+    return sql_query.strip().rstrip(";").strip()
+
+
+def has_limit(sql_query: str) -> bool:
+    """
+    True when the statement already ends with a LIMIT clause
+    """
+    return bool(_TRAILING_LIMIT.search(strip_semicolon(sql_query)))
+
+
+def is_read_only(sql_query: str) -> bool:
+    """
+    True for a plain SELECT, the only kind of statement safe to execute for its plan
+    """
+    sql = strip_semicolon(sql_query)
+    return bool(re.match(r"SELECT\b", sql, re.IGNORECASE)) and not _SELECT_SIDE_EFFECTS.search(sql)
+
+
+def with_statement_options(sql_query: str, **options) -> str:
+    """
+    Prefix a statement with MariaDB's per-statement variables (SET STATEMENT ... FOR)
+    """
+    options = {name: value for name, value in options.items() if value is not None}
+    sql = strip_semicolon(sql_query)
+    if not options:
+        return sql
+    assignments = ", ".join(f"{name} = {value}" for name, value in options.items())
+    return f"SET STATEMENT {assignments} FOR {sql}"
+
+
+class QueryGuard:
+    def __init__(
+        self,
+        max_scan_rows: int = 50_000_000,
+        limit_scan_rows: int = 1_000_000,
+        auto_limit: int = 10_000,
+        max_statement_time: float = 60.0,
+        use_analyze: bool = False,
+    ):
+        """
+        Pre-execution cost guard for generated SQL
+
+        Args:
+            max_scan_rows: Estimated rows above which the statement is rejected
+            limit_scan_rows: Estimated rows above which a LIMIT is added to SELECTs without one
+            auto_limit: LIMIT value added in that case
+            max_statement_time: Per-statement server timeout in seconds (0 disables it)
+            use_analyze: Use ANALYZE FORMAT=JSON (actual row counts) for read-only
+                SELECTs. This executes the SELECT, so only enable it where running
+                it twice is acceptable; other statements always use EXPLAIN.
+        """
+        self.max_scan_rows = max_scan_rows
+        self.limit_scan_rows = limit_scan_rows
+        self.auto_limit = auto_limit
+        self.max_statement_time = max_statement_time or None
+        self.use_analyze = use_analyze
+
+    def inspect(self, connection, sql_query: str) -> Dict[str, Any]:
+        """
+        Estimate the cost of a statement and decide whether it may run
+
+        ANALYZE executes the statement, so with `use_analyze` only read-only SELECTs
+        are analyzed; anything else (INSERT/UPDATE/DELETE, SELECT ... FOR UPDATE)
+        falls back to EXPLAIN and is executed once, by the caller.
+
+        Returns:
+            Dict with the (possibly rewritten) "sql", "action" ("ok", "limit_added"
+            or "rejected"), "estimated_rows", "full_scans", the plan rows and
+            "method" ("analyze" or "explain")
+        """
+        sql = strip_semicolon(sql_query)
+        analyze = self.use_analyze and is_read_only(sql)
+        cursor = connection.cursor()
+        try:
+            if analyze:
+                cursor.execute(with_statement_options(
+                    f"ANALYZE FORMAT=JSON {sql}", max_statement_time=self.max_statement_time
+                ))
+                plan = self._plan_from_json(json.loads(cursor.fetchone()[0]))
+            else:
+                cursor.execute(f"EXPLAIN {sql}")
+                columns = [desc[0].lower() for desc in cursor.description]
+                plan = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+        estimated_rows = self.estimate_rows(plan)
+        full_scans = [row.get("table") for row in plan if str(row.get("type", "")).upper() == "ALL"]
+
+        estimate = {
+            "sql": sql,
+            "action": "ok",
+            "reason": None,
+            "estimated_rows": estimated_rows,
+            "full_scans": full_scans,
+            "plan": plan,
+            "method": "analyze" if analyze else "explain",
+            "max_statement_time": self.max_statement_time
+        }
+
+        if estimated_rows > self.max_scan_rows:
+            estimate["action"] = "rejected"
+            estimate["reason"] = (
+                f"Estimated {estimated_rows:,} rows scanned exceeds the limit of {self.max_scan_rows:,}"
+            )
+        elif (estimated_rows > self.limit_scan_rows
+              and sql.upper().startswith("SELECT")
+              and not has_limit(sql)):
+            estimate["sql"] = f"{sql} LIMIT {self.auto_limit}"
+            estimate["action"] = "limit_added"
+            estimate["reason"] = (
+                f"Estimated {estimated_rows:,} rows scanned; added LIMIT {self.auto_limit}"
+            )
+
+        return estimate
+
+    @staticmethod
+    def estimate_rows(plan: List[Dict[str, Any]]) -> int:
+        """
+        Rows examined: product of per-table rows within a SELECT id (nested-loop join),
+        summed over SELECT ids (subqueries, UNION parts)
+        """
+        per_select: Dict[Any, int] = {}
+        for row in plan:
+            rows = row.get("rows")
+            try:
+                rows = int(float(rows)) if rows is not None else 1
+            except (TypeError, ValueError):
+                rows = 1
+            select_id = row.get("id")
+            per_select[select_id] = per_select.get(select_id, 1) * max(rows, 1)
+        return sum(per_select.values()) if per_select else 0
+
+    @staticmethod
+    def _plan_from_json(node: Any, select_id: Optional[int] = None, plan: List = None) -> List[Dict[str, Any]]:
+        """
+        Flatten ANALYZE/EXPLAIN FORMAT=JSON output into EXPLAIN-like rows
+        """
+        if plan is None:
+            plan = []
+        if isinstance(node, dict):
+            if "select_id" in node:
+                select_id = node["select_id"]
+            table = node.get("table")
+            if isinstance(table, dict) and "table_name" in table:
+                plan.append({
+                    "id": select_id,
+                    "table": table["table_name"],
+                    "type": table.get("access_type"),
+                    # Prefer the measured row count when ANALYZE provided one
+                    "rows": table.get("r_rows", table.get("rows"))
+                })
+            for value in node.values():
+                QueryGuard._plan_from_json(value, select_id, plan)
+        elif isinstance(node, list):
+            for item in node:
+                QueryGuard._plan_from_json(item, select_id, plan)
+        return plan
+
+
+def get_query_guard() -> QueryGuard:
+    """
+    Build a query guard configured from environment variables
+    """
+    return QueryGuard(
+        max_scan_rows=int(os.getenv("QUERY_GUARD_MAX_ROWS", "50000000")),
+        limit_scan_rows=int(os.getenv("QUERY_GUARD_LIMIT_ROWS", "1000000")),
+        auto_limit=int(os.getenv("QUERY_GUARD_AUTO_LIMIT", "10000")),
+        max_statement_time=float(os.getenv("QUERY_MAX_STATEMENT_TIME", "60")),
+        use_analyze=os.getenv("QUERY_GUARD_USE_ANALYZE", "false").lower() == "true"
+    )
@@ -0,0 +1,315 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+TABLE_VERSIONS_QUERY = """
+    SELECT TABLE_NAME, CREATE_TIME, UPDATE_TIME
+    FROM information_schema.TABLES
+    WHERE TABLE_SCHEMA = DATABASE()
+"""
+
+
+def normalize_sql(sql_query: str) -> str:
+    """
+    Collapse whitespace outside string literals and drop the trailing semicolon
+    """
+    parts = re.split(r"('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\")", sql_query.strip().rstrip(";"))
+    return "".join(part if i % 2 else re.sub(r"\s+", " ", part) for i, part in enumerate(parts)).strip()
+
+
+def referenced_tables(sql_query: str, known_tables: Iterable[str] = ()) -> List[str]:
+    """
+    Tables a statement reads from: catalog table names appearing as identifiers,
+    or FROM/JOIN targets when no catalog is available
+    """
+    known = set(known_tables)
+    if known:
+        identifiers = set(re.findall(r"`([^`]+)`|\b(\w+)\b", sql_query))
+        names = {quoted or bare for quoted, bare in identifiers}
+        return sorted(names & known)
+    targets = re.findall(r"\b(?:FROM|JOIN)\s+`?([\w.]+)`?", sql_query, re.IGNORECASE)
+    return sorted({target.split(".")[-1] for target in targets})
+
+
+class ResultCache:
+    def __init__(
+        self,
+        cache_dir: str = ".cache/results",
+        ttl: float = 600.0,
+        max_memory_bytes: int = 256 * 1024 * 1024,
+        max_disk_bytes: int = 2 * 1024 * 1024 * 1024,
+    ):
+        """
+        Two-tier cache of query results: an in-memory LRU of DataFrames in front of
+        Parquet files on local disk
+
+        Entries expire after `ttl` seconds or as soon as the CREATE_TIME/UPDATE_TIME
+        of any table the statement reads from moves.
+
+        Args:
+            cache_dir: Directory for Parquet files and their metadata
+            ttl: Maximum age of an entry in seconds
+            max_memory_bytes: Budget for DataFrames held in memory
+            max_disk_bytes: Budget for Parquet files on disk
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (DataFrame, meta)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "invalidations": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+    @staticmethod
+    def make_key(sql_query: str, **options) -> str:
+        """
+        Cache key from the normalised SQL plus anything that changes the result (e.g. row caps)
+        """
+        payload = json.dumps({"sql": normalize_sql(sql_query), **options}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def table_versions(self, connection, tables: List[str]) -> Dict[str, List[Optional[str]]]:
+        """
+        Current CREATE_TIME/UPDATE_TIME of the given tables (one information_schema query)
+        """
+        if not tables:
+            return {}
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                TABLE_VERSIONS_QUERY + f" AND TABLE_NAME IN ({', '.join('?' for _ in tables)})",
+                tuple(tables)
+            )
+            return {
+                name: [_to_text(create_time), _to_text(update_time)]
+                for name, create_time, update_time in cursor.fetchall()
+            }
+        finally:
+            cursor.close()
+
+    def get(self, key: str, versions: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached result dict for `key` if it is still valid for `versions`
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                df, meta = entry
+                if self._is_valid(meta, versions):
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return self._to_result(df, meta, "memory")
+                self._drop_locked(key)
+                self._stats["invalidations"] += 1
+
+        meta = self._read_meta(key)
+        if meta is not None:
+            if self._is_valid(meta, versions):
+                try:
+                    df = pd.read_parquet(self._path(key, "parquet"))
+                except Exception as e:
+                    print(f"Warning: could not read cached result {key}: {e}")
+                    df = None
+                if df is not None:
+                    with self._lock:
+                        self._stats["disk_hits"] += 1
+                        self._put_memory_locked(key, df, meta)
+                    return self._to_result(df, meta, "disk")
+            else:
+                with self._lock:
+                    self._stats["invalidations"] += 1
+            self._remove_files(key)
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, key: str, result: Dict[str, Any], versions: Dict[str, Any]) -> None:
+        """
+        Store a successful SELECT result in both tiers
+        """
+        df = result["data"]
+        meta = {
+            "created_at": time.time(),
+            "versions": versions,
+            "columns": result.get("columns", list(df.columns)),
+            "truncated": result.get("truncated", False),
+            "truncated_by": result.get("truncated_by"),
+            "max_rows": result.get("max_rows"),
+            "plan": _plan_summary(result.get("plan"))
+        }
+
+        with self._lock:
+            self._stats["stores"] += 1
+            self._put_memory_locked(key, df, meta)
+
+        if self.cache_dir:
+            try:
+                # Parquet needs string column names; the original names live in meta
+                df.set_axis([str(i) for i in range(df.shape[1])], axis=1).to_parquet(
+                    self._path(key, "parquet"), index=False
+                )
+                with open(self._path(key, "json"), "w", encoding="utf-8") as f:
+                    json.dump(meta, f, ensure_ascii=False, default=str)
+                self._enforce_disk_budget()
+            except Exception as e:
+                print(f"Warning: could not write cached result {key}: {e}")
+                self._remove_files(key)
+
+    def clear(self) -> None:
+        """
+        Drop every entry from both tiers
+        """
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        if self.cache_dir:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith((".parquet", ".json")):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Snapshot of hit/miss/eviction counters and memory/disk usage
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_bytes
+        stats["disk_bytes"] = sum(size for _, _, size in self._disk_files())
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+        return stats
+
+    def _is_valid(self, meta: Dict[str, Any], versions: Dict[str, Any]) -> bool:
+        if time.time() - meta["created_at"] > self.ttl:
+            return False
+        return meta["versions"] == versions
+
+    def _to_result(self, df: pd.DataFrame, meta: Dict[str, Any], tier: str) -> Dict[str, Any]:
+        df = df.copy(deep=False)
+        df.columns = meta["columns"]
+        return {
+            "success": True,
+            "data": df,
+            "row_count": len(df),
+            "columns": meta["columns"],
+            "truncated": meta["truncated"],
+            "truncated_by": meta["truncated_by"],
+            "max_rows": meta["max_rows"],
+            "plan": meta["plan"],
+            "cache": {"hit": True, "tier": tier, "age": round(time.time() - meta["created_at"], 1)}
+        }
+
+    def _put_memory_locked(self, key: str, df: pd.DataFrame, meta: Dict[str, Any]) -> None:
+        size = int(df.memory_usage(deep=True).sum())
+        if size > self.max_memory_bytes:
+            # Too large for the memory tier; it is still served from disk
+            return
+        self._drop_locked(key)
+        self._memory[key] = (df, {**meta, "bytes": size})
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes and self._memory:
+            _, (_, evicted_meta) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_meta["bytes"]
+            self._stats["memory_evictions"] += 1
+
+    def _drop_locked(self, key: str) -> None:
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[1].get("bytes", 0)
+
+    def _path(self, key: str, extension: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.{extension}")
+
+    def _read_meta(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(key, "json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _remove_files(self, key: str) -> None:
+        for extension in ("parquet", "json"):
+            try:
+                os.remove(self._path(key, extension))
+            except OSError:
+                pass
+
+    def _disk_files(self) -> List[tuple]:
+        if not self.cache_dir:
+            return []
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".parquet"):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, name[:-len(".parquet")], stat.st_size))
+        return files
+
+    def _enforce_disk_budget(self) -> None:
+        files = sorted(self._disk_files())  # oldest first
+        total = sum(size for _, _, size in files)
+        for _, key, size in files:
+            if total <= self.max_disk_bytes:
+                break
+            self._remove_files(key)
+            total -= size
+            with self._lock:
+                self._stats["disk_evictions"] += 1
+
+
+def _plan_summary(plan: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    # The raw EXPLAIN rows may hold non-JSON values; keep only what the UI shows
+    if not plan:
+        return None
+    return {key: plan.get(key) for key in ("action", "reason", "estimated_rows", "full_scans", "max_statement_time")}
+
+
+def _to_text(value) -> Optional[str]:
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_result_cache() -> ResultCache:
+    """
+    Return the process-wide result cache configured from environment variables
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache(
+                    cache_dir=os.getenv("RESULT_CACHE_DIR", ".cache/results"),
+                    ttl=float(os.getenv("RESULT_CACHE_TTL", "600")),
+                    max_memory_bytes=int(os.getenv("RESULT_CACHE_MEMORY_BYTES", str(256 * 1024 * 1024))),
+                    max_disk_bytes=int(os.getenv("RESULT_CACHE_DISK_BYTES", str(2 * 1024 * 1024 * 1024)))
+                )
+    return _cache
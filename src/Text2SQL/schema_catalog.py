@@ -0,0 +1,220 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+TABLES_QUERY = """
+    SELECT TABLE_NAME, CREATE_TIME, UPDATE_TIME, TABLE_COMMENT
+    FROM information_schema.TABLES
+    WHERE TABLE_SCHEMA = DATABASE()
+"""
+
+COLUMNS_QUERY = """
+    SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY, COLUMN_COMMENT
+    FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = DATABASE()
+"""
+
+FOREIGN_KEYS_QUERY = """
+    SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+    FROM information_schema.KEY_COLUMN_USAGE
+    WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL
+"""
+
+
+class SchemaCatalog:
+    def __init__(self, ttl: float = 300.0, cache_path: Optional[str] = None, database: Optional[str] = None):
+        """
+        Cached catalog of tables and columns loaded from information_schema
+
+        Args:
+            ttl: Seconds a loaded catalog is served without checking the database
+            cache_path: Optional JSON file used to persist the catalog across restarts
+            database: Database name stored with the cache file so another database's
+                catalog is never reused
+        """
+        self.ttl = ttl
+        self.cache_path = cache_path
+        self.database = database
+
+        self.tables: Dict[str, Dict[str, Any]] = {}
+        self.loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+        if self.cache_path:
+            self._load_from_file()
+
+    def is_fresh(self) -> bool:
+        """
+        True when the cached catalog is younger than the TTL
+        """
+        return self.loaded_at is not None and time.time() - self.loaded_at < self.ttl
+
+    def get_tables(self, connection) -> Dict[str, Dict[str, Any]]:
+        """
+        Return the catalog, refreshing it from the database when the TTL expired
+        """
+        if not self.is_fresh():
+            self.refresh(connection)
+        return self.tables
+
+    def refresh(self, connection, force: bool = False) -> List[str]:
+        """
+        Reload columns only for tables whose CREATE_TIME/UPDATE_TIME changed
+
+        Returns:
+            List[str]: Names of tables that were added, changed or removed
+        """
+        with self._lock:
+            if not force and self.is_fresh():
+                return []
+
+            cursor = connection.cursor()
+            try:
+                cursor.execute(TABLES_QUERY)
+                versions = {
+                    row[0]: {"version": [_to_text(row[1]), _to_text(row[2])], "comment": row[3] or ""}
+                    for row in cursor.fetchall()
+                }
+
+                removed = [name for name in self.tables if name not in versions]
+                changed = [
+                    name for name, info in versions.items()
+                    if force
+                    or name not in self.tables
+                    or self.tables[name]["version"] != info["version"]
+                ]
+
+                columns: Dict[str, List[Dict[str, str]]] = {name: [] for name in changed}
+                foreign_keys: Dict[str, List[Dict[str, str]]] = {name: [] for name in changed}
+                if changed:
+                    if len(changed) == len(versions):
+                        # Full (re)load: one query for the whole database
+                        table_filter, params = "", ()
+                    else:
+                        table_filter = f" AND TABLE_NAME IN ({', '.join('?' for _ in changed)})"
+                        params = tuple(changed)
+
+                    cursor.execute(FOREIGN_KEYS_QUERY + table_filter, params)
+                    for table_name, column_name, ref_table, ref_column in cursor.fetchall():
+                        if table_name in foreign_keys:
+                            foreign_keys[table_name].append({
+                                "column": column_name,
+                                "ref_table": ref_table,
+                                "ref_column": ref_column
+                            })
+
+                    cursor.execute(COLUMNS_QUERY + table_filter + " ORDER BY TABLE_NAME, ORDINAL_POSITION", params)
+                    for table_name, column_name, column_type, nullable, key, comment in cursor.fetchall():
+                        if table_name in columns:
+                            columns[table_name].append({
+                                "name": column_name,
+                                "type": column_type,
+                                "nullable": nullable == "YES",
+                                "key": key or "",
+                                "comment": comment or ""
+                            })
+            finally:
+                cursor.close()
+
+            tables = {name: info for name, info in self.tables.items() if name in versions}
+            for name in changed:
+                tables[name] = {**versions[name], "columns": columns[name], "foreign_keys": foreign_keys[name]}
+
+            self.tables = tables
+            self.loaded_at = time.time()
+
+            if self.cache_path:
+                self._save_to_file()
+
+            return sorted(changed + removed)
+
+    def invalidate(self) -> None:
+        """
+        Force the next lookup to check the database again
+        """
+        self.loaded_at = None
+
+    def to_schema_string(self) -> str:
+        """
+        Render the catalog in the same text format the SQL prompt expects
+        """
+        schema_info = "Database Schema:\n"
+        for table_name in sorted(self.tables):
+            schema_info += format_table(table_name, self.tables[table_name])
+        return schema_info
+
+    def _load_from_file(self) -> None:
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("database") != self.database:
+                return
+            self.tables = data["tables"]
+            self.loaded_at = data["loaded_at"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: ignoring schema cache {self.cache_path}: {e}")
+
+    def _save_to_file(self) -> None:
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"database": self.database, "loaded_at": self.loaded_at, "tables": self.tables},
+                    f, ensure_ascii=False
+                )
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"Warning: could not persist schema cache: {e}")
+
+
+def format_table(table_name: str, table: Dict[str, Any]) -> str:
+    """
+    Render one catalog table as schema text
+    """
+    references = {fk["column"]: fk for fk in table.get("foreign_keys", [])}
+
+    text = f"\nTable: {table_name}\n"
+    for col in table["columns"]:
+        text += f"  - {col['name']}: {col['type']}"
+        if not col["nullable"]:
+            text += " (NOT NULL)"
+        if col["key"] == "PRI":
+            text += " (PRIMARY KEY)"
+        if col["name"] in references:
+            fk = references[col["name"]]
+            text += f" (FOREIGN KEY -> {fk['ref_table']}.{fk['ref_column']})"
+        if col.get("comment"):
+            text += f" -- {col['comment']}"
+        text += "\n"
+    return text
+
+
+def _to_text(value) -> Optional[str]:
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_schema_catalog() -> SchemaCatalog:
+    """
+    Return the process-wide schema catalog configured from environment variables
+    """
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = SchemaCatalog(
+                    ttl=float(os.getenv("SCHEMA_CACHE_TTL", "300")),
+                    cache_path=os.getenv("SCHEMA_CACHE_PATH", ".cache/schema_catalog.json") or None,
+                    database=os.getenv("DB_SIT_NAME")
+                )
+    return _catalog
@@ -0,0 +1,181 @@
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, List
+
+from schema_catalog import SchemaCatalog, format_table, get_schema_catalog
+
+# Field weights: a hit on a table name says more than a hit on a column comment
+TABLE_NAME_WEIGHT = 3.0
+COLUMN_NAME_WEIGHT = 2.0
+COMMENT_WEIGHT = 1.0
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough prompt token estimate (~4 characters per token for schema text)
+    """
+    return max(1, len(text) // 4) if text else 0
+
+
+def extract_terms(text: str) -> List[str]:
+    """
+    Split text into matchable terms
+
+    Latin identifiers are split on snake_case/camelCase and lightly singularised;
+    Lao/Thai text has no word spaces, so it is matched with character trigrams.
+    """
+    if not text:
+        return []
+
+    terms = []
+    spaced = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    for word in re.findall(r"[A-Za-z0-9]+", spaced):
+        word = word.lower()
+        terms.append(word)
+        if len(word) > 3 and word.endswith("s"):
+            terms.append(word[:-1])
+
+    for run in re.findall(r"[^\x00-\x7f]+", text):
+        run = run.strip()
+        if len(run) < 3:
+            if run:
+                terms.append(run)
+            continue
+        terms.extend(run[i:i + 3] for i in range(len(run) - 2))
+
+    return terms
+
+
+class SchemaSelector:
+    def __init__(self, catalog: SchemaCatalog, top_n: int = 5, max_tables: int = 10):
+        """
+        Pick the tables relevant to a question so the prompt carries only part of the schema
+
+        Args:
+            catalog: Schema catalog to index
+            top_n: Number of best-scoring tables to keep
+            max_tables: Upper bound after foreign-key neighbours are added
+        """
+        self.catalog = catalog
+        self.top_n = top_n
+        self.max_tables = max(max_tables, top_n)
+
+        # (indexed tables, per-table weighted terms, idf), swapped in as one tuple
+        self._index = (None, {}, {})
+
+    def select(self, question: str) -> Dict[str, Any]:
+        """
+        Build the pruned schema text for a question
+
+        Returns:
+            Dict with the schema text, selected tables and token statistics
+        """
+        tables, table_terms, idf = self._ensure_index()
+        full_schema = "Database Schema:\n" + "".join(format_table(name, tables[name]) for name in sorted(tables))
+
+        scores = self._score(question, table_terms, idf)
+        ranked = [name for name, score in sorted(scores.items(), key=lambda item: -item[1]) if score > 0]
+
+        if not ranked or len(tables) <= self.top_n:
+            # Nothing matched (or the schema is already small): send everything
+            selected = sorted(tables)
+            fallback = bool(tables) and not ranked and len(tables) > self.top_n
+        else:
+            selected = ranked[:self.top_n]
+            for neighbour in self._foreign_key_neighbours(tables, selected):
+                if len(selected) >= self.max_tables:
+                    break
+                if neighbour not in selected:
+                    selected.append(neighbour)
+            fallback = False
+
+        schema = "Database Schema:\n" + "".join(format_table(name, tables[name]) for name in selected)
+
+        full_tokens = estimate_tokens(full_schema)
+        selected_tokens = estimate_tokens(schema)
+        return {
+            "schema": schema,
+            "tables": selected,
+            "scores": {name: round(scores.get(name, 0.0), 3) for name in selected},
+            "fallback": fallback,
+            "tables_total": len(tables),
+            "schema_tokens_full": full_tokens,
+            "schema_tokens_selected": selected_tokens,
+            "tokens_saved": full_tokens - selected_tokens
+        }
+
+    def _ensure_index(self) -> tuple:
+        # SchemaCatalog.refresh swaps in a new dict, so identity tells us when to rebuild
+        tables = self.catalog.tables
+        if self._index[0] is tables:
+            return self._index
+
+        table_terms = {}
+        document_frequency = Counter()
+        for name, table in tables.items():
+            terms = Counter()
+            for term in extract_terms(name):
+                terms[term] += TABLE_NAME_WEIGHT
+            for term in extract_terms(table.get("comment", "")):
+                terms[term] += COMMENT_WEIGHT
+            for col in table["columns"]:
+                for term in extract_terms(col["name"]):
+                    terms[term] += COLUMN_NAME_WEIGHT
+                for term in extract_terms(col.get("comment", "")):
+                    terms[term] += COMMENT_WEIGHT
+            table_terms[name] = terms
+            document_frequency.update(terms.keys())
+
+        total = len(tables)
+        idf = {term: math.log(1 + total / df) for term, df in document_frequency.items()}
+        self._index = (tables, table_terms, idf)
+        return self._index
+
+    def _score(self, question: str, table_terms: Dict[str, Counter], idf: Dict[str, float]) -> Dict[str, float]:
+        query_terms = set(extract_terms(question))
+        scores = {}
+        for name, terms in table_terms.items():
+            score = 0.0
+            for term in query_terms:
+                weight = terms.get(term)
+                if weight:
+                    # Dampen repeated hits so wide tables do not win on column count alone
+                    score += idf[term] * (1 + math.log(weight))
+            scores[name] = score
+        return scores
+
+    def _foreign_key_neighbours(self, tables: Dict[str, Any], selected: List[str]) -> List[str]:
+        selected_set = set(selected)
+        neighbours = []
+
+        # Tables the selection references (e.g. orders -> customers)
+        for name in selected:
+            for fk in tables[name].get("foreign_keys", []):
+                if fk["ref_table"] in tables and fk["ref_table"] not in neighbours:
+                    neighbours.append(fk["ref_table"])
+
+        # Tables that reference the selection (e.g. customers <- orders)
+        for name, table in sorted(tables.items()):
+            if any(fk["ref_table"] in selected_set for fk in table.get("foreign_keys", [])):
+                if name not in neighbours:
+                    neighbours.append(name)
+
+        return [name for name in neighbours if name not in selected_set]
+
+
+_selector = None
+
+def get_schema_selector() -> SchemaSelector:
+    """
+    Return the process-wide selector over the shared schema catalog
+    """
+    global _selector
+    if _selector is None:
+        _selector = SchemaSelector(
+            get_schema_catalog(),
+            top_n=int(os.getenv("SCHEMA_TOP_N", "5")),
+            max_tables=int(os.getenv("SCHEMA_MAX_TABLES", "10"))
+        )
+    return _selector
@@ -0,0 +1,293 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS sql_cache (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        question TEXT NOT NULL,
+        schema_fingerprint TEXT NOT NULL,
+        sql TEXT NOT NULL,
+        description TEXT,
+        embedding BLOB,
+        created_at REAL NOT NULL,
+        last_used_at REAL NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0,
+        UNIQUE (question, schema_fingerprint)
+    )
+"""
+
+
+def normalize_question(question: str) -> str:
+    """
+    Lowercase, collapse whitespace and drop trailing punctuation
+    """
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip("?.!။ ")
+
+
+def schema_fingerprint(table_schema: str) -> str:
+    """
+    Stable hash of the schema text; any column/table change produces a new fingerprint
+    """
+    return hashlib.sha256(table_schema.encode("utf-8")).hexdigest()
+
+
+# Words that flip the meaning of a question while barely changing its characters
+# ("sorted by price ascending" vs "descending", "in Vientiane" vs "not in Vientiane").
+# A fuzzy hit must agree on all of them; Lao has no word breaks, so it is matched by substring.
+QUALIFIERS = {
+    "not": {"not", "no", "without", "except", "excluding", "exclude", "never", "none", "isn't", "aren't", "don't",
+            "doesn't", "didn't", "ບໍ່", "ຍົກເວັ້ນ", "ນອກຈາກ"},
+    "asc": {"asc", "ascending", "lowest", "smallest", "least", "cheapest", "oldest", "earliest", "min", "minimum",
+            "bottom", "ຕໍ່າສຸດ", "ນ້ອຍສຸດ", "ໜ້ອຍສຸດ", "ເກົ່າສຸດ", "ນ້ອຍຫາໃຫຍ່"},
+    "desc": {"desc", "descending", "highest", "largest", "biggest", "most", "greatest", "latest", "newest", "max",
+             "maximum", "top", "ສູງສຸດ", "ໃຫຍ່ສຸດ", "ຫຼາຍສຸດ", "ລ່າສຸດ", "ໃຫຍ່ຫານ້ອຍ"},
+    "gt": {">", "more", "greater", "above", "over", "exceeding", "exceeds", "after", "since", "ຫຼາຍກວ່າ", "ເກີນ",
+           "ສູງກວ່າ", "ຫຼັງຈາກ"},
+    "lt": {"<", "less", "fewer", "below", "under", "before", "until", "ໜ້ອຍກວ່າ", "ນ້ອຍກວ່າ", "ຕໍ່າກວ່າ", "ກ່ອນ"},
+    "eq": {"=", "equal", "equals", "exactly", "ເທົ່າກັບ"},
+    "between": {"between", "ລະຫວ່າງ"},
+}
+
+
+def question_signature(question: str) -> tuple:
+    """
+    Numbers and meaning-changing qualifiers of a normalised question; fuzzy cache
+    hits must have the same signature as the question they answer
+    """
+    words = set(re.findall(r"[a-z]+(?:'[a-z]+)?|[<>=]", question))
+    qualifiers = frozenset(
+        name for name, terms in QUALIFIERS.items()
+        if any(term in words if term.isascii() else term in question for term in terms)
+    )
+    return tuple(re.findall(r"\d+(?:\.\d+)?", question)), qualifiers
+
+
+def char_ngram_embedder(n_features: int = 4096) -> Callable[[List[str]], np.ndarray]:
+    """
+    Default local embedder: hashed character n-grams (works for Lao text, no model download)
+    """
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    vectorizer = HashingVectorizer(
+        analyzer="char_wb",
+        ngram_range=(2, 4),
+        n_features=n_features,
+        alternate_sign=False,
+        norm="l2"
+    )
+
+    def embed(texts: List[str]) -> np.ndarray:
+        return vectorizer.transform(texts).toarray().astype(np.float32)
+
+    return embed
+
+
+class SQLCache:
+    def __init__(
+        self,
+        path: str = ".cache/sql_cache.sqlite3",
+        max_entries: int = 1000,
+        similarity_threshold: Optional[float] = None,
+        embed_fn: Callable[[List[str]], np.ndarray] = None,
+    ):
+        """
+        Persistent cache of generated SQL keyed by question and schema fingerprint
+
+        Lookups match the normalised question exactly. Fuzzy matching is opt-in: with
+        `similarity_threshold` set, the most similar cached question above it is also
+        accepted, provided it has the same numbers and the same negation, ordering and
+        comparison words ("top 10" never answers "top 20", "descending" never answers
+        "ascending", "not in" never answers "in"). Character n-grams cannot tell such
+        questions apart on their own, so pass a sentence-embedding `embed_fn` when
+        enabling it.
+
+        Args:
+            path: SQLite file holding the cache
+            max_entries: Least recently used entries beyond this are evicted
+            similarity_threshold: Minimum cosine similarity for a fuzzy hit (None = exact only)
+            embed_fn: Maps a list of texts to L2-normalised row vectors
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._embed_fn = embed_fn
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(CREATE_TABLE)
+        self._db.commit()
+
+        # In-memory similarity index for the current fingerprint: (fingerprint, ids, signatures, matrix)
+        self._index = None
+
+        self._stats = {
+            "exact_hits": 0,
+            "similar_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    def lookup(self, question: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached SQL for a question, or None on a miss
+        """
+        question = normalize_question(question)
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, sql, description FROM sql_cache WHERE question = ? AND schema_fingerprint = ?",
+                (question, fingerprint)
+            ).fetchone()
+            if row:
+                self._stats["exact_hits"] += 1
+                self._touch(row[0])
+                return {"sql": row[1], "description": row[2], "match": "exact", "similarity": 1.0}
+
+            if self.similarity_threshold is None:
+                self._stats["misses"] += 1
+                return None
+
+            _, ids, signatures, matrix = self._get_index(fingerprint)
+            if len(ids):
+                query_vector = self.embed_fn([question])[0]
+                similarities = matrix @ query_vector
+                query_signature = question_signature(question)
+                for position in np.argsort(-similarities):
+                    similarity = float(similarities[position])
+                    if similarity < self.similarity_threshold:
+                        break
+                    if signatures[position] != query_signature:
+                        continue
+                    row = self._db.execute(
+                        "SELECT id, sql, description FROM sql_cache WHERE id = ?", (ids[position],)
+                    ).fetchone()
+                    if row:
+                        self._stats["similar_hits"] += 1
+                        self._touch(row[0])
+                        return {"sql": row[1], "description": row[2], "match": "similar", "similarity": similarity}
+
+            self._stats["misses"] += 1
+            return None
+
+    def store(self, question: str, fingerprint: str, sql: str, description: str) -> None:
+        """
+        Cache generated SQL, dropping entries for older schemas and evicting LRU overflow
+        """
+        question = normalize_question(question)
+        embedding = self.embed_fn([question])[0].astype(np.float32) if self.similarity_threshold is not None else None
+        now = time.time()
+
+        with self._lock:
+            stale = self._db.execute(
+                "DELETE FROM sql_cache WHERE schema_fingerprint != ?", (fingerprint,)
+            ).rowcount
+            if stale:
+                self._stats["invalidations"] += stale
+
+            self._db.execute(
+                """INSERT OR REPLACE INTO sql_cache
+                   (question, schema_fingerprint, sql, description, embedding, created_at, last_used_at, hits)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, 0)""",
+                (question, fingerprint, sql, description, None if embedding is None else embedding.tobytes(), now, now)
+            )
+            evicted = self._db.execute(
+                """DELETE FROM sql_cache WHERE id NOT IN
+                   (SELECT id FROM sql_cache ORDER BY last_used_at DESC LIMIT ?)""",
+                (self.max_entries,)
+            ).rowcount
+            self._db.commit()
+
+            self._stats["stores"] += 1
+            self._stats["evictions"] += evicted
+            self._index = None
+
+    def clear(self) -> None:
+        """
+        Remove every cached entry
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM sql_cache")
+            self._db.commit()
+            self._index = None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Snapshot of hit/miss counters and cache size
+        """
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM sql_cache").fetchone()[0]
+            stats = dict(self._stats)
+        lookups = stats["exact_hits"] + stats["similar_hits"] + stats["misses"]
+        stats["entries"] = entries
+        stats["hit_rate"] = round((stats["exact_hits"] + stats["similar_hits"]) / lookups, 3) if lookups else 0.0
+        return stats
+
+    @property
+    def embed_fn(self) -> Callable[[List[str]], np.ndarray]:
+        # Built on first use: exact-only caches never need it
+        if self._embed_fn is None:
+            self._embed_fn = char_ngram_embedder()
+        return self._embed_fn
+
+    def _touch(self, entry_id: int) -> None:
+        self._db.execute(
+            "UPDATE sql_cache SET last_used_at = ?, hits = hits + 1 WHERE id = ?", (time.time(), entry_id)
+        )
+        self._db.commit()
+
+    def _get_index(self, fingerprint: str) -> tuple:
+        if self._index is not None and self._index[0] == fingerprint:
+            return self._index
+
+        rows = self._db.execute(
+            "SELECT id, question, embedding FROM sql_cache WHERE schema_fingerprint = ? AND embedding IS NOT NULL",
+            (fingerprint,)
+        ).fetchall()
+
+        dimension = len(self.embed_fn([""])[0])
+        ids, signatures, vectors = [], [], []
+        for entry_id, question, blob in rows:
+            vector = np.frombuffer(blob, dtype=np.float32)
+            # Skip rows written by a different embedder
+            if len(vector) != dimension:
+                continue
+            ids.append(entry_id)
+            signatures.append(question_signature(question))
+            vectors.append(vector)
+
+        matrix = np.vstack(vectors) if vectors else np.zeros((0, dimension), dtype=np.float32)
+        self._index = (fingerprint, ids, signatures, matrix)
+        return self._index
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_sql_cache() -> SQLCache:
+    """
+    Return the process-wide SQL cache configured from environment variables
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SQLCache(
+                    path=os.getenv("SQL_CACHE_PATH", ".cache/sql_cache.sqlite3"),
+                    max_entries=int(os.getenv("SQL_CACHE_MAX_ENTRIES", "1000")),
+                    # Unset = exact matches only
+                    similarity_threshold=float(os.environ["SQL_CACHE_SIMILARITY"]) if os.getenv("SQL_CACHE_SIMILARITY") else None
+                )
+    return _cache
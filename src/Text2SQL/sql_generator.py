@@ -1,37 +1,295 @@
 import anthropic
+import json
 import os
-from typing import Dict, Any
+import sys
+from typing import Any, AsyncIterator, Dict, Iterator, List
+from schema_selector import SchemaSelector
+from sql_cache import SQLCache, schema_fingerprint
+
+# Shared instrumentation (src/rag_core)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag_core.streaming import JsonFieldStream, TokenTimer, atimed_stream, timed_stream
+from rag_core.tracing import current_span, get_tracer
+
+tracer = get_tracer()
 
 class SQLGenerator:
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, schema_selector: SchemaSelector = None, sql_cache: SQLCache = None):
         """
         Initialize SQL Generator with Anthropic API key
+        
+        Args:
+            api_key: Anthropic API key (falls back to ANTHROPIC_API_KEY)
+            schema_selector: Optional selector that prunes the schema to the tables
+                relevant to each question before the prompt is built
+            sql_cache: Optional cache that answers repeated questions without an LLM call
         """
         self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
+        self.schema_selector = schema_selector
+        self.sql_cache = sql_cache
+        self.last_usage = None
+        self._async_client = None
         if self.api_key:
             self.client = anthropic.Anthropic(api_key=self.api_key)
         else:
             raise ValueError("Anthropic API key is required. Set ANTHROPIC_API_KEY environment variable.")
     
     def generate_sql(self, natural_language_query: str, table_schema: str) -> Dict[str, Any]:
+        """
+        Generate SQL query from natural language, serving repeated questions from the cache
+        and pruning the schema first when a selector is set
+        """
+        with tracer.span("sql.generate", query_chars=len(natural_language_query or "")):
+            cached, table_schema, fingerprint, selection = self._prepare(natural_language_query, table_schema)
+            if cached:
+                return cached
+            
+            result, self.last_usage = self._generate_sql(natural_language_query, table_schema)
+            return self._finish(natural_language_query, result, fingerprint, selection, self.last_usage)
+    
+    async def agenerate_sql(self, natural_language_query: str, table_schema: str) -> Dict[str, Any]:
+        """
+        Async variant of generate_sql using the Anthropic async client
+        """
+        with tracer.span("sql.generate", query_chars=len(natural_language_query or ""), mode="async"):
+            cached, table_schema, fingerprint, selection = self._prepare(natural_language_query, table_schema)
+            if cached:
+                return cached
+            
+            # Usage stays local here so concurrent calls on one generator do not mix
+            result, usage = await self._agenerate_sql(natural_language_query, table_schema)
+            return self._finish(natural_language_query, result, fingerprint, selection, usage)
+    
+    def stream_sql(self, natural_language_query: str, table_schema: str) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming variant of generate_sql, yielding events while Claude's answer arrives:
+        
+            {"type": "token", "text": ...}                      each text delta
+            {"type": "field", "name": ..., "value": ..., "complete": ...}
+                                                                JSON string field so far
+            {"type": "sql", "sql": ...}                         as soon as the "sql" field closes,
+                                                                before the description is written
+            {"type": "done", "result": {...}}                   what generate_sql returns, plus
+                                                                "streaming" timings (ttft_ms, sql_ms, total_ms)
+        
+        Cache hits and invalid input yield "sql" (if any) and "done" straight away.
+        """
+        with tracer.span("sql.generate", query_chars=len(natural_language_query or ""), mode="stream"):
+            cached, table_schema, fingerprint, selection = self._prepare(natural_language_query, table_schema)
+            early = cached or self._validate_inputs(natural_language_query, table_schema)
+            if early:
+                yield from self._early_events(early)
+                return
+            
+            params = self._request_params(natural_language_query, table_schema)
+            reader, parts, usage, timer = JsonFieldStream(), [], None, None
+            try:
+                with tracer.span("llm.call", **{"llm.model": params["model"], "llm.stream": True}) as span:
+                    timer = TokenTimer(params["model"], span)
+                    with self.client.messages.stream(**params) as stream:
+                        for text in timed_stream(stream.text_stream, timer):
+                            parts.append(text)
+                            yield from self._stream_events(reader, text, timer)
+                        final = stream.get_final_message()
+                    span.record_usage(final)
+                    usage = getattr(final, "usage", None)
+                result = self._parse_response("".join(parts))
+            except Exception as e:
+                result = self._error_result(e)
+            
+            self.last_usage = usage
+            yield self._done_event(natural_language_query, result, fingerprint, selection, usage, timer)
+    
+    async def astream_sql(self, natural_language_query: str, table_schema: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Async variant of stream_sql using the Anthropic async client
+        """
+        with tracer.span("sql.generate", query_chars=len(natural_language_query or ""), mode="astream"):
+            cached, table_schema, fingerprint, selection = self._prepare(natural_language_query, table_schema)
+            early = cached or self._validate_inputs(natural_language_query, table_schema)
+            if early:
+                for event in self._early_events(early):
+                    yield event
+                return
+            
+            params = self._request_params(natural_language_query, table_schema)
+            reader, parts, usage, timer = JsonFieldStream(), [], None, None
+            try:
+                with tracer.span("llm.call", **{"llm.model": params["model"], "llm.stream": True}) as span:
+                    timer = TokenTimer(params["model"], span)
+                    async with self.async_client.messages.stream(**params) as stream:
+                        async for text in atimed_stream(stream.text_stream, timer):
+                            parts.append(text)
+                            for event in self._stream_events(reader, text, timer):
+                                yield event
+                        final = await stream.get_final_message()
+                    span.record_usage(final)
+                    usage = getattr(final, "usage", None)
+                result = self._parse_response("".join(parts))
+            except Exception as e:
+                result = self._error_result(e)
+            
+            yield self._done_event(natural_language_query, result, fingerprint, selection, usage, timer)
+    
+    def _early_events(self, result: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Events for a result available without an LLM call (cache hit, invalid input)
+        """
+        events = [{"type": "sql", "sql": result["sql"]}] if "cache" in result else []
+        return events + [{"type": "done", "result": result}]
+    
+    def _stream_events(self, reader: JsonFieldStream, text: str, timer: TokenTimer) -> List[Dict[str, Any]]:
+        """
+        Token event plus field/sql events for one streamed text delta
+        """
+        events = [{"type": "token", "text": text}]
+        for name, value, complete in reader.feed(text):
+            events.append({"type": "field", "name": name, "value": value, "complete": complete})
+            if name == "sql" and complete and value.strip():
+                timer.checkpoint("sql")
+                events.append({"type": "sql", "sql": self._clean_sql(value)})
+        return events
+    
+    def _done_event(self, natural_language_query: str, result: Dict[str, Any], fingerprint: str,
+                    selection: Dict[str, Any], usage: Any, timer: TokenTimer) -> Dict[str, Any]:
+        result = self._finish(natural_language_query, result, fingerprint, selection, usage)
+        if timer is not None:
+            result["streaming"] = timer.stats()
+        return {"type": "done", "result": result}
+    
+    @property
+    def async_client(self) -> anthropic.AsyncAnthropic:
+        if self._async_client is None:
+            self._async_client = anthropic.AsyncAnthropic(api_key=self.api_key)
+        return self._async_client
+    
+    def _prepare(self, natural_language_query: str, table_schema: str) -> tuple:
+        """
+        Cache lookup and schema selection shared by the sync and async paths
+        
+        Returns:
+            (cached result or None, schema for the prompt, cache fingerprint, selection stats)
+        """
+        has_query = bool(natural_language_query and natural_language_query.strip())
+        fingerprint = None
+        if self.sql_cache and has_query and table_schema and table_schema.strip():
+            fingerprint = schema_fingerprint(table_schema)
+            with tracer.span("sql.cache_lookup") as span:
+                try:
+                    cached = self.sql_cache.lookup(natural_language_query, fingerprint)
+                except Exception as e:
+                    span.record_error(e)
+                    cached = None
+                span.set_attribute("hit", bool(cached))
+                if cached:
+                    span.set_attributes(match=cached["match"], similarity=round(cached["similarity"], 3))
+            if cached:
+                return {
+                    "sql": cached["sql"],
+                    "description": cached["description"],
+                    "cache": {"hit": True, "match": cached["match"], "similarity": cached["similarity"]}
+                }, table_schema, fingerprint, None
+        
+        selection = None
+        if self.schema_selector and has_query:
+            with tracer.span("sql.schema_select") as span:
+                try:
+                    selection = self.schema_selector.select(natural_language_query)
+                    if selection["tables"]:
+                        table_schema = selection["schema"]
+                    span.set_attributes(tables=len(selection["tables"]), tables_total=selection["tables_total"],
+                                        tokens_saved=selection["tokens_saved"])
+                except Exception as e:
+                    # Falls back to the full schema
+                    span.record_error(e)
+                    selection = None
+        
+        return None, table_schema, fingerprint, selection
+    
+    def _finish(self, natural_language_query: str, result: Dict[str, Any], fingerprint: str,
+                selection: Dict[str, Any], usage: Any) -> Dict[str, Any]:
+        """
+        Attach selection stats and store the generated SQL in the cache
+        """
+        if selection:
+            result["schema_selection"] = {key: value for key, value in selection.items() if key != "schema"}
+            if usage is not None:
+                result["schema_selection"]["prompt_tokens"] = getattr(usage, "input_tokens", None)
+        
+        if fingerprint:
+            result["cache"] = {"hit": False}
+            # Error/fallback placeholders all look like "SELECT 1 as ..." and must not be cached
+            if not result["sql"].startswith("SELECT 1 as "):
+                with tracer.span("sql.cache_store") as span:
+                    try:
+                        self.sql_cache.store(natural_language_query, fingerprint, result["sql"], result.get("description", ""))
+                    except Exception as e:
+                        span.record_error(e)
+        return result
+    
+    def _generate_sql(self, natural_language_query: str, table_schema: str) -> tuple:
         """
         Generate SQL query from natural language using Anthropic Claude
+        
+        Returns:
+            (result dict, response usage or None)
         """
         try:
-            # Validate inputs
-            if not natural_language_query or not natural_language_query.strip():
-                return {
-                    "sql": "SELECT 1 as no_query",
-                    "description": "ບໍ່ມີຄໍາຖາມໃຫ້ສ້າງ SQL"
-                }
+            invalid = self._validate_inputs(natural_language_query, table_schema)
+            if invalid:
+                return invalid, None
             
-            if not table_schema or not table_schema.strip():
-                return {
-                    "sql": "SELECT 1 as no_schema",
-                    "description": "ບໍ່ມີຂໍ້ມູນ Schema ຖານຂໍ້ມູນ"
-                }
+            params = self._request_params(natural_language_query, table_schema)
+            with tracer.span("llm.call", **{"llm.model": params["model"]}) as span:
+                response = self.client.messages.create(**params)
+                span.record_usage(response)
+            
+            return self._parse_response(response.content[0].text), getattr(response, "usage", None)
+                
+        except Exception as e:
+            return self._error_result(e), None
+    
+    async def _agenerate_sql(self, natural_language_query: str, table_schema: str) -> tuple:
+        """
+        Generate SQL query from natural language using the Anthropic async client
+        """
+        try:
+            invalid = self._validate_inputs(natural_language_query, table_schema)
+            if invalid:
+                return invalid, None
             
-            system_prompt = f"""You are an expert SQL developer for MariaDB. Convert natural language to SQL.
+            params = self._request_params(natural_language_query, table_schema)
+            with tracer.span("llm.call", **{"llm.model": params["model"]}) as span:
+                response = await self.async_client.messages.create(**params)
+                span.record_usage(response)
+            
+            return self._parse_response(response.content[0].text), getattr(response, "usage", None)
+                
+        except Exception as e:
+            return self._error_result(e), None
+    
+    def _validate_inputs(self, natural_language_query: str, table_schema: str) -> Dict[str, str]:
+        """
+        Placeholder result for empty input, None when the inputs are usable
+        """
+        if not natural_language_query or not natural_language_query.strip():
+            return {
+                "sql": "SELECT 1 as no_query",
+                "description": "ບໍ່ມີຄໍາຖາມໃຫ້ສ້າງ SQL"
+            }
+        
+        if not table_schema or not table_schema.strip():
+            return {
+                "sql": "SELECT 1 as no_schema",
+                "description": "ບໍ່ມີຂໍ້ມູນ Schema ຖານຂໍ້ມູນ"
+            }
+        return None
+    
+    def _request_params(self, natural_language_query: str, table_schema: str) -> Dict[str, Any]:
+        """
+        Arguments for messages.create, shared by the sync and async clients
+        """
+        system_prompt = f"""You are an expert SQL developer for MariaDB. Convert natural language to SQL.
 
 Database Schema:
 {table_schema}
@@ -54,75 +312,73 @@ IMPORTANT: Return ONLY the JSON format below, nothing else:
 }}
 
 Do not include any additional text, explanations, or markdown formatting. Just the JSON."""
-            
-            print(f"Debug: Sending request to Claude with query: {natural_language_query[:100]}...")
-            
-            response = self.client.messages.create(
-                model="claude-3-7-sonnet-20250219",
-                max_tokens=1500,
-                system=system_prompt,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": natural_language_query
-                    }
-                ]
-            )
-            
-            content = response.content[0].text
-            print(f"Debug: Claude response: {content[:200]}...")
-            
+        
+        return {
+            "model": "claude-3-7-sonnet-20250219",
+            "max_tokens": 1500,
+            "system": system_prompt,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": natural_language_query
+                }
+            ]
+        }
+    
+    def _parse_response(self, content: str) -> Dict[str, str]:
+        """
+        Extract SQL and description from Claude's JSON answer (timed as the sql.parse span)
+        """
+        with tracer.span("sql.parse", response_chars=len(content)) as span:
             # Try to extract JSON from response
             try:
-                import json
                 # Look for JSON in the response
                 start_idx = content.find('{')
                 end_idx = content.rfind('}') + 1
                 if start_idx != -1 and end_idx != 0:
                     json_str = content[start_idx:end_idx]
-                    print(f"Debug: Extracted JSON: {json_str}")
                     result = json.loads(json_str)
-                    
+                
                     # Validate the extracted SQL - ensure it's clean
                     if "sql" in result and result["sql"]:
-                        # Clean the SQL by removing any JSON artifacts
-                        sql = result["sql"].strip()
-                        # Remove any quotes or JSON formatting that might have leaked
-                        if sql.startswith('"') and sql.endswith('"'):
-                            sql = sql[1:-1]
-                        # Remove any escaped quotes
-                        sql = sql.replace('\\"', '"')
-                        
-                        print(f"Debug: Cleaned SQL: {sql[:100]}...")
-                        
+                        span.set_attribute("parse", "json")
+                    
                         return {
-                            "sql": sql,
+                            "sql": self._clean_sql(result["sql"]),
                             "description": result.get("description", "ບໍ່ມີຄໍາອະທິບາຍ")
                         }
                     else:
-                        print("Debug: No SQL found in JSON result")
+                        span.set_attribute("parse", "fallback:no_sql_in_json")
                         return self._extract_sql_and_description(content)
                 else:
-                    print("Debug: No JSON found, using fallback extraction")
+                    span.set_attribute("parse", "fallback:no_json")
                     return self._extract_sql_and_description(content)
             except json.JSONDecodeError as json_err:
-                print(f"Debug: JSON decode error: {json_err}")
+                span.set_attribute("parse", "fallback:json_error")
+                span.add_event("json_decode_error", error=str(json_err))
                 return self._extract_sql_and_description(content)
-                
-        except Exception as e:
-            print(f"Debug: Exception in generate_sql: {str(e)}")
-            print(f"Debug: Exception type: {type(e)}")
-            return {
-                "sql": f"SELECT 1 as error_{type(e).__name__}",
-                "description": f"ຂໍ້ຜິດພາດໃນການສ້າງ SQL: {str(e)}"
-            }
+    
+    def _clean_sql(self, sql: str) -> str:
+        """
+        Clean the SQL by removing any JSON artifacts that might have leaked
+        """
+        sql = sql.strip()
+        if sql.startswith('"') and sql.endswith('"'):
+            sql = sql[1:-1]
+        # Remove any escaped quotes
+        return sql.replace('\\"', '"')
+    
+    def _error_result(self, e: Exception) -> Dict[str, str]:
+        current_span().record_error(e)
+        return {
+            "sql": f"SELECT 1 as error_{type(e).__name__}",
+            "description": f"ຂໍ້ຜິດພາດໃນການສ້າງ SQL: {str(e)}"
+        }
     
     def _extract_sql_and_description(self, content: str) -> Dict[str, str]:
         """
         Extract SQL and description from Claude's response when JSON parsing fails
         """
-        print(f"Debug: Extracting from content: {content[:300]}...")
-        
         lines = content.split('\n')
         sql_lines = []
         description_lines = []
@@ -163,7 +419,6 @@ Do not include any additional text, explanations, or markdown formatting. Just t
                     description_lines.append(line)
         
         sql = ' '.join(sql_lines) if sql_lines else "SELECT 1 as no_sql_generated"
-        print(f"Debug: Extracted SQL: {sql}")
         
         # Default Lao description if none provided
         if description_lines:
@@ -171,8 +426,6 @@ Do not include any additional text, explanations, or markdown formatting. Just t
         else:
             description = "ຄໍາສັ່ງ SQL ທີ່ສ້າງຈາກຄໍາຖາມຂອງຜູ້ໃຊ້"
         
-        print(f"Debug: Extracted description: {description[:100]}...")
-        
         return {
             "sql": sql,
             "description": description
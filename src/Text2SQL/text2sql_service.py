@@ -0,0 +1,234 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from db_operations import DatabaseOperations
+from query_guard import get_query_guard
+from schema_catalog import get_schema_catalog
+from schema_selector import get_schema_selector
+from sql_cache import get_sql_cache
+from sql_generator import SQLGenerator
+
+
+class Text2SQLService:
+    def __init__(self, max_workers: int = None):
+        """
+        Non-blocking Text2SQL pipeline shared by all Streamlit sessions of a process
+
+        A single asyncio loop runs on a background thread. LLM calls use the Anthropic
+        async client on that loop; the blocking MariaDB connector runs in a thread pool.
+        Every public method returns a concurrent Future the script thread can wait on,
+        and a new request from a session cancels that session's previous one.
+
+        Args:
+            max_workers: Threads for database work (defaults to DB_POOL_SIZE)
+        """
+        max_workers = max_workers or int(os.getenv("DB_POOL_SIZE", "5"))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="text2sql-db")
+        # Separate thread so KILL QUERY is not stuck behind the queries it should stop
+        self._kill_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="text2sql-kill")
+
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor(self._executor)
+        self._thread = threading.Thread(target=self._loop.run_forever, name="text2sql-loop", daemon=True)
+        self._thread.start()
+
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._schema_future: Optional[Future] = None
+        self._generators: Dict[str, SQLGenerator] = {}
+
+    def prefetch_schema(self) -> Future:
+        """
+        Start loading the schema in the background (e.g. while the user is still typing)
+        """
+        with self._lock:
+            if self._schema_future is not None and not self._schema_future.done():
+                return self._schema_future
+            if get_schema_catalog().is_fresh():
+                future = Future()
+                future.set_result(get_schema_catalog().to_schema_string())
+                return future
+            self._schema_future = asyncio.run_coroutine_threadsafe(self._load_schema(), self._loop)
+            return self._schema_future
+
+    def generate_sql(self, session_id: str, question: str, api_key: str,
+                     on_event: Callable[[Dict[str, Any]], None] = None) -> Future:
+        """
+        Generate SQL for a question; resolves to SQLGenerator.generate_sql's result dict
+
+        With `on_event` the answer is streamed: the callback gets SQLGenerator.stream_sql's
+        events on the loop thread (keep it cheap). As soon as the "sql" field closes the
+        query plan is checked with EXPLAIN while the description is still being written;
+        the outcome is sent as a {"type": "plan_check"} event and stored in the result
+        under "plan_check" (QueryGuard.inspect's dict, or {"error": ...}).
+        """
+        if on_event is None:
+            return self._submit(session_id, self._generate(question, api_key))
+        return self._submit(session_id, self._generate_stream(question, api_key, on_event))
+
+    def execute_query(self, session_id: str, sql_query: str, **kwargs) -> Future:
+        """
+        Execute SQL on a pooled connection; resolves to DatabaseOperations.execute_query's result dict
+        """
+        return self._submit(session_id, self._execute(sql_query, kwargs))
+
+    def cancel(self, session_id: str) -> bool:
+        """
+        Cancel the session's in-flight request, killing its running statement if any
+        """
+        with self._lock:
+            future = self._inflight.pop(session_id, None)
+        if future is None or future.done():
+            return False
+        # Cancels the task on the loop; _execute turns that into KILL QUERY
+        return future.cancel()
+
+    def shutdown(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._kill_executor.shutdown(wait=False)
+
+    def _submit(self, session_id: str, coroutine) -> Future:
+        self.cancel(session_id)
+        future = asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+        with self._lock:
+            self._inflight[session_id] = future
+        future.add_done_callback(lambda done: self._forget(session_id, done))
+        return future
+
+    def _forget(self, session_id: str, future: Future) -> None:
+        with self._lock:
+            if self._inflight.get(session_id) is future:
+                del self._inflight[session_id]
+
+    async def _load_schema(self) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._load_schema_sync)
+
+    @staticmethod
+    def _load_schema_sync() -> str:
+        with DatabaseOperations() as db_ops:
+            # A cached catalog needs no connection at all
+            if not db_ops.schema_catalog.is_fresh() and not db_ops.connect():
+                raise ConnectionError("Database connection failed")
+            return db_ops.get_table_schema()
+
+    async def _generate(self, question: str, api_key: str) -> Dict[str, Any]:
+        # Shielded: cancelling this request must not cancel the schema load other sessions share
+        schema = await asyncio.shield(asyncio.wrap_future(self.prefetch_schema()))
+        return await self._get_generator(api_key).agenerate_sql(question, schema)
+
+    async def _generate_stream(self, question: str, api_key: str,
+                               on_event: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+        schema = await asyncio.shield(asyncio.wrap_future(self.prefetch_schema()))
+        loop = asyncio.get_running_loop()
+        checked_sql, plan_check, result = None, None, None
+        async for event in self._get_generator(api_key).astream_sql(question, schema):
+            # ANALYZE would run the statement, so the early check only uses EXPLAIN
+            if event["type"] == "sql" and plan_check is None and not get_query_guard().use_analyze:
+                checked_sql = event["sql"]
+                plan_check = loop.run_in_executor(self._executor, self._plan_check_sync, checked_sql)
+            elif event["type"] == "done":
+                result = event["result"]
+            on_event(event)
+
+        if plan_check is not None:
+            check = await plan_check
+            if result["sql"] == checked_sql:
+                result["plan_check"] = check
+                on_event({"type": "plan_check", "plan_check": check})
+        return result
+
+    @staticmethod
+    def _plan_check_sync(sql_query: str) -> Dict[str, Any]:
+        try:
+            with DatabaseOperations() as db_ops:
+                if not db_ops.connect():
+                    return {"error": "Database connection failed"}
+                return db_ops.query_guard.inspect(db_ops.connection, sql_query)
+        except Exception as e:
+            return {"error": f"Query plan check failed: {str(e)}"}
+
+    def _get_generator(self, api_key: str) -> SQLGenerator:
+        # One generator per key so its HTTP clients are reused across requests
+        with self._lock:
+            generator = self._generators.get(api_key)
+            if generator is None:
+                generator = SQLGenerator(api_key, schema_selector=get_schema_selector(), sql_cache=get_sql_cache())
+                self._generators[api_key] = generator
+            return generator
+
+    async def _execute(self, sql_query: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        db_ops = DatabaseOperations()
+        cancelled = threading.Event()
+        try:
+            return await loop.run_in_executor(self._executor, self._execute_sync, db_ops, sql_query, kwargs, cancelled)
+        except asyncio.CancelledError:
+            # The worker thread keeps running: the event stops it before it starts the
+            # statement (or at the next chunk), KILL QUERY stops a statement already running
+            cancelled.set()
+            await loop.run_in_executor(self._kill_executor, self._kill_query, db_ops)
+            raise
+
+    @staticmethod
+    def _execute_sync(db_ops: DatabaseOperations, sql_query: str, kwargs: Dict[str, Any],
+                      cancelled: threading.Event) -> Dict[str, Any]:
+        with db_ops:
+            if not db_ops.connect():
+                return {"error": "Database connection failed"}
+            # Cancelled while waiting for a connection, when there was nothing to kill yet
+            if cancelled.is_set():
+                return {"error": "Query cancelled"}
+
+            on_chunk = kwargs.get("on_chunk")
+
+            def check_cancelled(chunk, stream):
+                if cancelled.is_set():
+                    raise RuntimeError("Query cancelled")
+                if on_chunk:
+                    on_chunk(chunk, stream)
+
+            return db_ops.execute_query(sql_query, **{**kwargs, "on_chunk": check_cancelled})
+
+    @staticmethod
+    def _kill_query(db_ops: DatabaseOperations) -> None:
+        connection = db_ops.connection
+        connection_id = getattr(connection, "connection_id", None)
+        if connection_id is None:
+            return
+        # Dedicated connection outside the pool: the pool may be exhausted by the very
+        # queries that need killing
+        killer = None
+        try:
+            killer = db_ops.pool.connection_factory()
+            cursor = killer.cursor()
+            cursor.execute(f"KILL QUERY {int(connection_id)}")
+            cursor.close()
+        except Exception as e:
+            print(f"Failed to kill query on connection {connection_id}: {e}")
+        finally:
+            if killer is not None:
+                try:
+                    killer.close()
+                except Exception:
+                    pass
+
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_text2sql_service() -> Text2SQLService:
+    """
+    Return the process-wide Text2SQL service
+    """
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = Text2SQLService()
+    return _service
@@ -0,0 +1,378 @@
+import asyncio
+import functools
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# StreamlinedAdvancedRAG methods timed per stage
+DEFAULT_STAGES = (
+    "rewrite_query", "arewrite_query", "generate_hyde", "agenerate_hyde",
+    "dense_retrieval_many", "rerank_documents", "diversify_documents",
+)
+
+
+def load_labels(path: str) -> List[Dict[str, Any]]:
+    """
+    Read a labelled question file (JSONL), one question per line:
+
+        {"question": "...", "relevant_ids": ["<chroma id>", ...]}
+        {"question": "...", "relevant": {"<chroma id>": 2, "<chroma id>": 1}}
+
+    "relevant" gives graded relevance for nDCG (relevant_ids all count as 1).
+    Optional "rewrite" and "hyde" hold frozen LLM outputs for stub_llm_steps.
+    """
+    labels = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            relevant = item.get("relevant") or {doc_id: 1 for doc_id in item.get("relevant_ids", [])}
+            if not item.get("question") or not relevant:
+                raise ValueError(f"{path}:{line_number}: needs a question and relevant_ids/relevant")
+            labels.append({**item, "relevant": {str(doc_id): float(grade) for doc_id, grade in relevant.items()}})
+    return labels
+
+
+def label_template(collection, path: str, n: int = 50, seed: int = 0) -> int:
+    """
+    Write a JSONL file of n random chunks from a chromadb collection with an empty
+    "question" to fill in, as a starting point for a labelled set
+    """
+    data = collection.get(include=["documents"])
+    rows = random.Random(seed).sample(range(len(data["ids"])), min(n, len(data["ids"])))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps({
+                "question": "",
+                "relevant_ids": [data["ids"][row]],
+                "chunk_preview": data["documents"][row][:300],
+            }, ensure_ascii=False) + "\n")
+    return len(rows)
+
+
+def recall_at_k(ranked_ids: Sequence[str], relevant: Dict[str, float], k: int) -> float:
+    return len(set(ranked_ids[:k]) & set(relevant)) / len(relevant)
+
+
+def reciprocal_rank(ranked_ids: Sequence[str], relevant: Dict[str, float]) -> float:
+    for rank, doc_id in enumerate(ranked_ids, start=1):
+        if doc_id in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+def ndcg_at_k(ranked_ids: Sequence[str], relevant: Dict[str, float], k: int) -> float:
+    """
+    nDCG with exponential gain (2^grade - 1)
+    """
+    dcg = sum((2 ** relevant.get(doc_id, 0.0) - 1) / math.log2(rank + 1) for rank, doc_id in enumerate(ranked_ids[:k], start=1))
+    ideal = sorted(relevant.values(), reverse=True)[:k]
+    idcg = sum((2 ** grade - 1) / math.log2(rank + 1) for rank, grade in enumerate(ideal, start=1))
+    return dcg / idcg if idcg else 0.0
+
+
+def percentiles(values: Sequence[float]) -> Dict[str, float]:
+    """
+    p50 / p95 / mean in milliseconds for a list of seconds
+    """
+    if not values:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "mean_ms": 0.0}
+    ms = np.asarray(values) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "mean_ms": round(float(ms.mean()), 2),
+    }
+
+
+class StageRecorder:
+    def __init__(self):
+        """
+        Wall time (and, in the memory pass, peak traced allocation) per call of the
+        instrumented methods
+
+        Memory is the tracemalloc peak during the call over what was allocated at its
+        start: Python and NumPy allocations only (not torch), and stages running at the
+        same time (parallel search) share one peak.
+        """
+        self.seconds: Dict[str, List[float]] = defaultdict(list)
+        self.peak_bytes: Dict[str, List[int]] = defaultdict(list)
+        # Highest absolute traced peak seen by any stage (stages reset the tracemalloc peak)
+        self.max_traced = 0
+        self._lock = threading.Lock()
+
+    def instrument(self, obj, names: Iterable[str] = DEFAULT_STAGES) -> None:
+        """
+        Replace obj's methods with timed wrappers (on this instance only)
+        """
+        for name in names:
+            method = getattr(obj, name, None)
+            if method is not None:
+                setattr(obj, name, self._wrap(name, method))
+
+    def reset(self) -> None:
+        with self._lock:
+            self.seconds.clear()
+            self.peak_bytes.clear()
+            self.max_traced = 0
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            stages = {}
+            for name, values in self.seconds.items():
+                stages[name] = {"calls": len(values), **percentiles(values)}
+                if self.peak_bytes.get(name):
+                    stages[name]["peak_kb"] = round(max(self.peak_bytes[name]) / 1024, 1)
+            return stages
+
+    def _record(self, name: str, seconds: float, peak: Optional[int]) -> None:
+        with self._lock:
+            self.seconds[name].append(seconds)
+            if peak is not None:
+                self.peak_bytes[name].append(peak)
+
+    @staticmethod
+    def _start_memory() -> Optional[int]:
+        if not tracemalloc.is_tracing():
+            return None
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        return current
+
+    def _peak(self, start: Optional[int]) -> Optional[int]:
+        if start is None:
+            return None
+        peak = tracemalloc.get_traced_memory()[1]
+        self.max_traced = max(self.max_traced, peak)
+        return max(peak - start, 0)
+
+    def _wrap(self, name: str, method: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def timed_async(*args, **kwargs):
+                start_memory = self._start_memory()
+                started = time.perf_counter()
+                try:
+                    return await method(*args, **kwargs)
+                finally:
+                    self._record(name, time.perf_counter() - started, self._peak(start_memory))
+            return timed_async
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start_memory = self._start_memory()
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._record(name, time.perf_counter() - started, self._peak(start_memory))
+        return timed
+
+
+def stub_llm_steps(rag, labels: Sequence[Dict[str, Any]] = (), delay: float = 0.0) -> None:
+    """
+    Replace the LLM steps of a StreamlinedAdvancedRAG instance with deterministic
+    local stubs: query rewriting and HyDE return the label's frozen "rewrite" /
+    "hyde" text when present, otherwise the question itself
+
+    Args:
+        rag: Object with rewrite_query / generate_hyde (and the async variants)
+        labels: Labelled questions (see load_labels)
+        delay: Seconds each stub sleeps, to simulate LLM latency
+    """
+    frozen = {label["question"]: label for label in labels}
+
+    def reply(kind: str, query: str) -> str:
+        if delay:
+            time.sleep(delay)
+        return frozen.get(query, {}).get(kind) or query
+
+    async def areply(kind: str, query: str) -> str:
+        if delay:
+            await asyncio.sleep(delay)
+        return frozen.get(query, {}).get(kind) or query
+
+    rag.rewrite_query = functools.partial(reply, "rewrite")
+    rag.generate_hyde = functools.partial(reply, "hyde")
+    rag.arewrite_query = functools.partial(areply, "rewrite")
+    rag.agenerate_hyde = functools.partial(areply, "hyde")
+
+
+def _environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {"python": platform.python_version(), "platform": platform.platform(), "git_commit": commit}
+
+
+def run_benchmark(
+    labels: Sequence[Dict[str, Any]],
+    configs: Dict[str, Callable[[str], List[Dict[str, Any]]]],
+    ks: Sequence[int] = (1, 3, 5, 10),
+    recorder: StageRecorder = None,
+    warmup: int = 1,
+    memory_questions: int = 10,
+    output: str = None,
+) -> Dict[str, Any]:
+    """
+    Run every retrieval configuration over the labelled questions
+
+    Each configuration is a function question -> ranked list of dicts with "id". A
+    configuration first answers `warmup` questions unrecorded (model loading, caches),
+    then every question is timed; finally the first `memory_questions` run again under
+    tracemalloc for the memory figures, so tracing does not distort the latencies.
+
+    Args:
+        labels: From load_labels
+        configs: {name: search function}
+        ks: Cut-offs for recall@k and nDCG@k
+        recorder: StageRecorder already instrumenting the searched object (per-stage figures)
+        warmup: Unrecorded questions per configuration
+        memory_questions: Questions re-run with tracemalloc (0 = skip)
+        output: JSON file to write (directories are created)
+
+    Returns:
+        Report dict: environment, settings and per configuration "metrics",
+        "latency" (total and per stage) and "per_question"
+    """
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": _environment(),
+        "questions": len(labels),
+        "ks": list(ks),
+        "configs": {},
+    }
+
+    for name, search in configs.items():
+        print(f"🏁 {name}: {len(labels)} questions")
+        for label in labels[:warmup]:
+            search(label["question"])
+        if recorder is not None:
+            recorder.reset()
+
+        totals, per_question = [], []
+        scores: Dict[str, List[float]] = defaultdict(list)
+        for label in labels:
+            started = time.perf_counter()
+            results = search(label["question"])
+            seconds = time.perf_counter() - started
+            ranked = [str(doc["id"]) for doc in results]
+            relevant = label["relevant"]
+
+            row = {"mrr": reciprocal_rank(ranked, relevant)}
+            for k in ks:
+                row[f"recall@{k}"] = recall_at_k(ranked, relevant, k)
+                row[f"ndcg@{k}"] = ndcg_at_k(ranked, relevant, k)
+            for metric, value in row.items():
+                scores[metric].append(value)
+            totals.append(seconds)
+            per_question.append({"question": label["question"], "seconds": round(seconds, 4), "ranked_ids": ranked[:max(ks)], **row})
+
+        stages = recorder.summary() if recorder is not None else {}
+
+        # Memory pass: traced separately so tracing overhead stays out of the latencies
+        memory_peaks = []
+        if memory_questions:
+            if recorder is not None:
+                recorder.reset()
+            tracemalloc.start()
+            try:
+                for label in labels[:memory_questions]:
+                    tracemalloc.reset_peak()
+                    start, _ = tracemalloc.get_traced_memory()
+                    if recorder is not None:
+                        recorder.max_traced = 0
+                    search(label["question"])
+                    peak = max(tracemalloc.get_traced_memory()[1], recorder.max_traced if recorder is not None else 0)
+                    memory_peaks.append(max(peak - start, 0))
+            finally:
+                tracemalloc.stop()
+            if recorder is not None:
+                for stage, stats in recorder.summary().items():
+                    if "peak_kb" in stats:
+                        stages.setdefault(stage, {"calls": 0, **percentiles([])})["peak_kb"] = stats["peak_kb"]
+
+        result = {
+            "metrics": {metric: round(float(np.mean(values)), 4) for metric, values in scores.items()},
+            "latency": {"total": percentiles(totals), "stages": stages},
+            "per_question": per_question,
+        }
+        if memory_peaks:
+            result["memory"] = {"peak_kb_max": round(max(memory_peaks) / 1024, 1),
+                                "peak_kb_mean": round(float(np.mean(memory_peaks)) / 1024, 1)}
+        report["configs"][name] = result
+
+    print_report(report)
+    if output:
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 Benchmark written to {output}")
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    k = max(report["ks"])
+    columns = [f"recall@{k}", "mrr", f"ndcg@{k}"]
+    print(f"{'config':<20}" + "".join(f"{column:>11}" for column in columns) + f"{'p50 ms':>10}{'p95 ms':>10}{'peak KB':>10}")
+    for name, result in report["configs"].items():
+        latency = result["latency"]["total"]
+        peak = result.get("memory", {}).get("peak_kb_max", float("nan"))
+        print(f"{name:<20}" + "".join(f"{result['metrics'][column]:>11.3f}" for column in columns)
+              + f"{latency['p50_ms']:>10.1f}{latency['p95_ms']:>10.1f}{peak:>10.0f}")
+        for stage, stats in result["latency"]["stages"].items():
+            print(f"    {stage:<24}{stats['calls']:>5} calls{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}"
+                  + (f"{stats['peak_kb']:>10.0f}" if "peak_kb" in stats else ""))
+
+
+def compare_reports(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    metric_tolerance: float = 0.01,
+    latency_tolerance: float = 0.2,
+) -> List[str]:
+    """
+    Regressions of `current` against `baseline` (reports or JSON file paths): quality
+    metrics that dropped by more than metric_tolerance (absolute) and p95 latency that
+    grew by more than latency_tolerance (relative)
+    """
+    if isinstance(baseline, str):
+        with open(baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    if isinstance(current, str):
+        with open(current, encoding="utf-8") as f:
+            current = json.load(f)
+
+    regressions = []
+    for name, result in current["configs"].items():
+        before = baseline["configs"].get(name)
+        if before is None:
+            continue
+        for metric, value in result["metrics"].items():
+            previous = before["metrics"].get(metric)
+            if previous is not None and previous - value > metric_tolerance:
+                regressions.append(f"{name}: {metric} {previous:.3f} → {value:.3f}")
+        p95, previous_p95 = result["latency"]["total"]["p95_ms"], before["latency"]["total"]["p95_ms"]
+        if previous_p95 and p95 > previous_p95 * (1 + latency_tolerance):
+            regressions.append(f"{name}: p95 latency {previous_p95:.1f} → {p95:.1f} ms")
+
+    for line in regressions:
+        print(f"⚠️  {line}")
+    if not regressions:
+        print("✅ No regressions against the baseline")
+    return regressions
@@ -0,0 +1,287 @@
+import os
+import threading
+from typing import Any, Callable, Dict, List, Union
+
+from rag_core.embedding_cache import normalize_text
+from rag_core.semantic_chunker import split_sentences
+
+TokenCounter = Callable[[List[str]], List[int]]
+
+_counters: Dict[str, TokenCounter] = {}
+_counters_lock = threading.Lock()
+
+
+def get_token_counter(tokenizer=None) -> TokenCounter:
+    """
+    Token counts for a list of texts from a real tokenizer, loaded once per process
+
+    Args:
+        tokenizer: A tokenizer object (Hugging Face tokenizer or tiktoken Encoding),
+            "tiktoken:<encoding>", a Hugging Face model name/path, or None for the
+            CONTEXT_TOKENIZER env var (default "tiktoken:o200k_base", the gpt-oss encoding)
+    """
+    if tokenizer is not None and not isinstance(tokenizer, str):
+        return _counter_for(tokenizer)
+
+    name = tokenizer or os.getenv("CONTEXT_TOKENIZER", "tiktoken:o200k_base")
+    if name not in _counters:
+        with _counters_lock:
+            if name not in _counters:
+                _counters[name] = _load_counter(name)
+    return _counters[name]
+
+
+def _load_counter(name: str) -> TokenCounter:
+    try:
+        if name.startswith("tiktoken:"):
+            import tiktoken
+            return _counter_for(tiktoken.get_encoding(name.split(":", 1)[1]))
+        from transformers import AutoTokenizer
+        return _counter_for(AutoTokenizer.from_pretrained(name))
+    except Exception as e:
+        # Same estimate as the semantic chunker uses without a tokenizer
+        print(f"⚠️  Tokenizer {name} unavailable ({e}), estimating 3 characters per token")
+        return lambda texts: [max(1, len(text) // 3) for text in texts]
+
+
+def _counter_for(tokenizer) -> TokenCounter:
+    if hasattr(tokenizer, "encode_ordinary_batch"):  # tiktoken
+        return lambda texts: [len(ids) for ids in tokenizer.encode_ordinary_batch(list(texts))]
+
+    def count(texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        return [len(ids) for ids in tokenizer(list(texts), add_special_tokens=False)["input_ids"]]
+    return count
+
+
+def _shingles(text: str, size: int = 5) -> set:
+    """
+    Character 5-grams of the normalised text (works for Lao/Thai, which has no word spaces)
+    """
+    text = normalize_text(text)
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def join_overlapping(left: str, right: str, probe_chars: int = 16) -> str:
+    """
+    Concatenate two consecutive chunks, dropping the text the splitter repeated
+    (chunk_overlap) at the end of `left` and the start of `right`
+    """
+    probe = right[:probe_chars]
+    position = left.find(probe) if probe else -1
+    while position != -1:
+        if right.startswith(left[position:]):
+            return left + right[len(left) - position:]
+        position = left.find(probe, position + 1)
+    return f"{left}\n{right}"
+
+
+class ContextPacker:
+    def __init__(
+        self,
+        max_tokens: int = 3000,
+        tokenizer=None,
+        token_counter: TokenCounter = None,
+        dedup_threshold: float = 0.85,
+        merge_adjacent: bool = True,
+        min_fragment_tokens: int = 64,
+        template: Union[str, Callable[[int, Dict[str, Any]], str]] = "[Document {index}] (Score: {score:.3f})\n{text}",
+        separator: str = "\n\n",
+        verbose: bool = False,
+    ):
+        """
+        Build an LLM context from retrieved chunks within a hard token budget
+
+        1. Near-identical chunks (character 5-gram Jaccard or containment above
+           `dedup_threshold`) are dropped in favour of the higher-scoring copy.
+        2. Chunks from the same source and page with consecutive chunk_id are merged
+           into one block, without the overlap the splitter repeated.
+        3. Blocks are added best score first while they fit; the first block that does
+           not fit is cut at a sentence boundary if at least `min_fragment_tokens` remain
+           (the best block is always cut to fit rather than left out).
+
+        Budgets are measured on the rendered text (headers and separators included).
+
+        Args:
+            max_tokens: Token budget of the whole context
+            tokenizer: See get_token_counter (ignored when `token_counter` is given)
+            token_counter: Token counts for a list of texts
+            dedup_threshold: Similarity above which two chunks count as the same
+            merge_adjacent: Merge neighbouring chunks of a page
+            min_fragment_tokens: Smallest useful truncated block
+            template: Format string (fields: index, score, text and the metadata keys)
+                or a function (index, block) -> str
+            separator: Text between blocks
+            verbose: Print a one-line report per pack() (the same figures are on the
+                context.pack span when tracing is on)
+        """
+        self.max_tokens = max_tokens
+        self.token_counter = token_counter or get_token_counter(tokenizer)
+        self.dedup_threshold = dedup_threshold
+        self.merge_adjacent = merge_adjacent
+        self.min_fragment_tokens = min_fragment_tokens
+        self.template = template
+        self.verbose = verbose
+        self.separator = separator
+
+    def pack(self, chunks: List[Dict[str, Any]], max_tokens: int = None) -> Dict[str, Any]:
+        """
+        Pack chunks into a context
+
+        Args:
+            chunks: Dicts with "text", "score" (higher is better) and optional "metadata"
+                (source_file/source, page, chunk_id are used for merging)
+            max_tokens: Budget for this call (default: the packer's)
+
+        Returns:
+            Dict with "text", "blocks" (text, score, metadata, members, truncated),
+            "input_tokens" (all chunks rendered as-is), "tokens", "tokens_saved" and
+            counts of duplicates, merged, truncated and dropped chunks
+        """
+        budget = max_tokens or self.max_tokens
+        chunks = [{**chunk, "index": i, "metadata": chunk.get("metadata") or {}} for i, chunk in enumerate(chunks)]
+        report = {
+            "text": "", "blocks": [], "budget": budget, "chunks": len(chunks),
+            "input_tokens": 0, "tokens": 0, "tokens_saved": 0,
+            "duplicates": 0, "merged": 0, "truncated": 0, "dropped": 0,
+        }
+        if not chunks:
+            return report
+
+        naive = [self._render(i, chunk) for i, chunk in enumerate(chunks, 1)]
+        report["input_tokens"] = self._count(self.separator.join(naive))
+
+        unique = self._deduplicate(chunks)
+        report["duplicates"] = len(chunks) - len(unique)
+        blocks = self._merge(unique) if self.merge_adjacent else [self._block([chunk]) for chunk in unique]
+        report["merged"] = len(unique) - len(blocks)
+
+        selected = self._fit(sorted(blocks, key=lambda block: block["score"], reverse=True), budget)
+        report["blocks"] = selected
+        report["truncated"] = sum(block["truncated"] for block in selected)
+        report["dropped"] = len(blocks) - len(selected)
+        report["text"] = self.separator.join(block["rendered"] for block in selected)
+        report["tokens"] = self._count(report["text"])
+        report["tokens_saved"] = max(report["input_tokens"] - report["tokens"], 0)
+
+        if self.verbose:
+            saved = report["tokens_saved"] / report["input_tokens"] if report["input_tokens"] else 0.0
+            print(
+                f"🧮 Context: {len(chunks)} chunks → {len(selected)} blocks "
+                f"({report['duplicates']} duplicate, {report['merged']} merged, {report['dropped']} dropped), "
+                f"{report['input_tokens']:,} → {report['tokens']:,} tokens (saved {report['tokens_saved']:,}, {saved:.0%})"
+            )
+        return report
+
+    def _count(self, text: str) -> int:
+        return self.token_counter([text])[0] if text else 0
+
+    def _render(self, index: int, block: Dict[str, Any]) -> str:
+        if callable(self.template):
+            return self.template(index, block)
+        fields = {**block["metadata"], "index": index, "score": block.get("score", 0.0), "text": block["text"].strip()}
+        return self.template.format(**fields)
+
+    def _deduplicate(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        kept: List[Dict[str, Any]] = []
+        kept_shingles: List[set] = []
+        for chunk in sorted(chunks, key=lambda chunk: chunk.get("score", 0.0), reverse=True):
+            shingles = _shingles(chunk["text"])
+            duplicate = False
+            for other in kept_shingles:
+                common = len(shingles & other)
+                jaccard = common / (len(shingles) + len(other) - common)
+                containment = common / min(len(shingles), len(other))
+                if jaccard >= self.dedup_threshold or containment >= self.dedup_threshold:
+                    duplicate = True
+                    break
+            if not duplicate:
+                kept.append(chunk)
+                kept_shingles.append(shingles)
+        return kept
+
+    @staticmethod
+    def _position(chunk: Dict[str, Any]):
+        metadata = chunk["metadata"]
+        source = metadata.get("source_file") or metadata.get("source") or metadata.get("file_path")
+        if source is None or metadata.get("page") is None or metadata.get("chunk_id") is None:
+            return None
+        return (source, metadata["page"]), int(metadata["chunk_id"])
+
+    def _merge(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        pages: Dict[Any, List[Dict[str, Any]]] = {}
+        blocks = []
+        for chunk in chunks:
+            position = self._position(chunk)
+            if position is None:
+                blocks.append(self._block([chunk]))
+            else:
+                pages.setdefault(position[0], []).append(chunk)
+
+        for page_chunks in pages.values():
+            page_chunks.sort(key=lambda chunk: self._position(chunk)[1])
+            run = [page_chunks[0]]
+            for chunk in page_chunks[1:]:
+                if self._position(chunk)[1] == self._position(run[-1])[1] + 1:
+                    run.append(chunk)
+                else:
+                    blocks.append(self._block(run))
+                    run = [chunk]
+            blocks.append(self._block(run))
+        return blocks
+
+    @staticmethod
+    def _block(run: List[Dict[str, Any]]) -> Dict[str, Any]:
+        text = run[0]["text"].strip()
+        for chunk in run[1:]:
+            text = join_overlapping(text, chunk["text"].strip())
+        best = max(run, key=lambda chunk: chunk.get("score", 0.0))
+        return {
+            "text": text,
+            "score": best.get("score", 0.0),
+            "metadata": best["metadata"],
+            "members": [chunk["index"] for chunk in run],
+            "truncated": False,
+        }
+
+    def _fit(self, blocks: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+        separator_tokens = self._count(self.separator)
+        selected: List[Dict[str, Any]] = []
+        used = 0
+        for block in blocks:
+            index = len(selected) + 1
+            extra = separator_tokens if selected else 0
+            rendered = self._render(index, block)
+            cost = self._count(rendered) + extra
+            if used + cost <= budget:
+                selected.append({**block, "rendered": rendered})
+                used += cost
+                continue
+
+            # Cut at a sentence boundary to use what is left of the budget
+            room = budget - used - extra - self._count(self._render(index, {**block, "text": ""}))
+            if room <= 0 or (selected and room < self.min_fragment_tokens):
+                continue
+            sentences = split_sentences(block["text"])
+            kept, total = [], 0
+            for sentence, tokens in zip(sentences, self.token_counter(sentences)):
+                # +1 for the space joining sentences
+                if total + tokens + 1 > room:
+                    if not kept and not selected:
+                        # Never return an empty context: cut the first sentence proportionally
+                        kept.append(sentence[:len(sentence) * room // (tokens + 1)])
+                    break
+                kept.append(sentence)
+                total += tokens + 1
+            if not kept or not kept[0]:
+                continue
+            fragment = {**block, "text": " ".join(kept), "truncated": True}
+            fragment["rendered"] = self._render(index, fragment)
+            cost = self._count(fragment["rendered"]) + extra
+            if used + cost <= budget:
+                selected.append(fragment)
+                used += cost
+        return selected
@@ -0,0 +1,380 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from rag_core.model_registry import SharedModel, get_registry
+from rag_core.tracing import get_tracer
+
+try:
+    # Lets vector stores accept CachedEmbedder as a regular LangChain embeddings object
+    from langchain_core.embeddings import Embeddings as _EmbeddingsBase
+except ImportError:
+    _EmbeddingsBase = object
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "embeddings")
+
+CREATE_TABLES = [
+    "CREATE TABLE IF NOT EXISTS cache_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS cache_vectors (key TEXT PRIMARY KEY, row INTEGER NOT NULL)",
+]
+
+
+def normalize_text(text: str) -> str:
+    """
+    NFC-normalise and collapse whitespace, so trivially different copies share one entry
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def model_id_for(model_name: str) -> str:
+    """
+    Same id for "D:\\model\\BAAI-bge-m3" and "D:/model/BAAI-bge-m3"
+    """
+    return model_name.replace("\\", "/").rstrip("/")
+
+
+class EmbeddingCache:
+    def __init__(self, namespace: str, cache_dir: str = DEFAULT_CACHE_DIR, grow_rows: int = 4096):
+        """
+        Disk-backed vector store for one embedding model: a float32 memory-mapped
+        matrix plus a SQLite index of key -> row
+
+        Rows are only ever appended. Row allocation happens inside a SQLite write
+        transaction, so several processes on one host can share the cache.
+
+        Args:
+            namespace: Model id; every namespace gets its own directory
+            cache_dir: Parent directory of all namespaces
+            grow_rows: Rows added to the matrix file whenever it is full
+        """
+        self.namespace = namespace
+        self.directory = os.path.join(cache_dir, hashlib.sha1(namespace.encode("utf-8")).hexdigest()[:16])
+        self.grow_rows = grow_rows
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._vectors_path = os.path.join(self.directory, "vectors.f32")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            os.path.join(self.directory, "index.sqlite3"), timeout=30, check_same_thread=False, isolation_level=None
+        )
+        for statement in CREATE_TABLES:
+            self._db.execute(statement)
+        self._db.execute("INSERT OR IGNORE INTO cache_meta (key, value) VALUES ('namespace', ?)", (namespace,))
+
+        self.dim = self._meta_int("dim")
+        self._memmap: Optional[np.memmap] = None
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        """
+        Vectors for the keys that are cached (missing keys are simply absent)
+        """
+        if not keys or self.dim is None and self._refresh_dim() is None:
+            return {}
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            rows = []
+            for i in range(0, len(keys), 500):
+                batch = list(keys[i:i + 500])
+                rows.extend(self._db.execute(
+                    f"SELECT key, row FROM cache_vectors WHERE key IN ({', '.join('?' for _ in batch)})", batch
+                ).fetchall())
+            if not rows:
+                return found
+            matrix = self._open(max(row for _, row in rows) + 1)
+            vectors = np.array(matrix[[row for _, row in rows]])
+        for (key, _), vector in zip(rows, vectors):
+            found[key] = vector
+        return found
+
+    def put_many(self, keys: Sequence[str], vectors: np.ndarray) -> int:
+        """
+        Append vectors for keys not cached yet; returns the number written
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(keys):
+            return 0
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                dim = self._meta_int("dim")
+                if dim is None:
+                    dim = vectors.shape[1]
+                    self._db.execute("INSERT INTO cache_meta (key, value) VALUES ('dim', ?)", (str(dim),))
+                elif dim != vectors.shape[1]:
+                    raise ValueError(f"Embedding size {vectors.shape[1]} does not match cached size {dim}")
+                self.dim = dim
+
+                existing = set()
+                for i in range(0, len(keys), 500):
+                    batch = list(keys[i:i + 500])
+                    existing.update(row[0] for row in self._db.execute(
+                        f"SELECT key FROM cache_vectors WHERE key IN ({', '.join('?' for _ in batch)})", batch
+                    ))
+                new = [i for i, key in enumerate(keys) if key not in existing]
+                if not new:
+                    self._db.execute("COMMIT")
+                    return 0
+
+                start = self._meta_int("rows") or 0
+                matrix = self._open(start + len(new))
+                matrix[start:start + len(new)] = vectors[new]
+                matrix.flush()
+
+                self._db.executemany(
+                    "INSERT INTO cache_vectors (key, row) VALUES (?, ?)",
+                    [(keys[i], start + offset) for offset, i in enumerate(new)]
+                )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache_meta (key, value) VALUES ('rows', ?)", (str(start + len(new)),)
+                )
+                self._db.execute("COMMIT")
+                return len(new)
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM cache_vectors").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM cache_vectors")
+            self._db.execute("DELETE FROM cache_meta WHERE key IN ('rows', 'dim')")
+            self._memmap = None
+            self.dim = None
+            try:
+                os.remove(self._vectors_path)
+            except OSError:
+                pass
+
+    def _meta_int(self, key: str) -> Optional[int]:
+        row = self._db.execute("SELECT value FROM cache_meta WHERE key = ?", (key,)).fetchone()
+        return int(row[0]) if row else None
+
+    def _refresh_dim(self) -> Optional[int]:
+        with self._lock:
+            self.dim = self._meta_int("dim")
+        return self.dim
+
+    def _open(self, min_rows: int) -> np.memmap:
+        # Re-map when another writer (or this one) grew the file past the current mapping
+        if self._memmap is not None and self._memmap.shape[0] >= min_rows:
+            return self._memmap
+        row_bytes = self.dim * 4
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        capacity = size // row_bytes
+        if capacity < min_rows:
+            capacity = min_rows + self.grow_rows
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        self._memmap = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        return self._memmap
+
+
+class CachedEmbedder(_EmbeddingsBase):
+    def __init__(
+        self,
+        model,
+        model_id: str,
+        cache: EmbeddingCache = None,
+        memory_items: int = 20000,
+        normalize_embeddings: bool = False,
+        batch_size: int = 32,
+    ):
+        """
+        Drop-in replacement for SentenceTransformer.encode and LangChain embeddings
+        that only sends cache misses to the model
+
+        Lookups go through an in-memory LRU, then the on-disk EmbeddingCache. Keys are
+        the SHA-256 of the normalised text plus whatever changes the vector
+        (normalisation, query vs document for LangChain models).
+
+        Args:
+            model: SentenceTransformer, or a LangChain embeddings object
+            model_id: Identifies the model in cache keys
+            cache: Disk tier (defaults to one under DEFAULT_CACHE_DIR for model_id)
+            memory_items: Vectors kept in the in-memory LRU
+            normalize_embeddings: Default for encode() and the LangChain methods
+            batch_size: Texts per model call for misses
+        """
+        self.model = model
+        self.model_id = model_id
+        self.cache = cache or EmbeddingCache(model_id)
+        self.memory_items = memory_items
+        self.normalize_embeddings = normalize_embeddings
+        self.batch_size = batch_size
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "computed": 0}
+
+    # ---- SentenceTransformer interface ----
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = None,
+        normalize_embeddings: bool = None,
+        convert_to_numpy: bool = True,
+        show_progress_bar: bool = None,
+        **kwargs
+    ):
+        """
+        Same call shape as SentenceTransformer.encode; returns a float32 ndarray
+        """
+        if normalize_embeddings is None:
+            normalize_embeddings = self.normalize_embeddings
+        if kwargs or not convert_to_numpy:
+            # Tensors, token embeddings, prompts, ...: not cacheable, go straight to the model
+            return self.model.encode(
+                sentences, batch_size=batch_size or self.batch_size, normalize_embeddings=normalize_embeddings,
+                convert_to_numpy=convert_to_numpy, show_progress_bar=show_progress_bar, **kwargs
+            )
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        vectors = self._embed(texts, "encode", normalize_embeddings, batch_size or self.batch_size)
+        return vectors[0] if single else vectors
+
+    # ---- LangChain Embeddings interface ----
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(list(texts), "document", self.normalize_embeddings, self.batch_size).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], "query", self.normalize_embeddings, self.batch_size)[0].tolist()
+
+    # ---- Metrics ----
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Hit/miss counters per tier and the overall hit rate
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        stats["disk_entries"] = self.cache.count()
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+        return stats
+
+    def __getattr__(self, name: str):
+        # Anything else (get_sentence_embedding_dimension, tokenizer, ...) comes from the model
+        model = self.__dict__.get("model")
+        if model is None:
+            raise AttributeError(name)
+        return getattr(model, name)
+
+    def _key(self, text: str, kind: str, normalize: bool) -> str:
+        # A SentenceTransformer embeds queries and documents alike; LangChain models may not
+        kind = "encode" if hasattr(self.model, "encode") else kind
+        return hashlib.sha256(f"{self.model_id}\0{kind}\0{int(normalize)}\0{text}".encode("utf-8")).hexdigest()
+
+    def _embed(self, texts: List[str], kind: str, normalize: bool, batch_size: int) -> np.ndarray:
+        with get_tracer().span("embed", texts=len(texts), kind=kind) as span:
+            vectors, computed = self._embed_cached(texts, kind, normalize, batch_size)
+            span.set_attributes(computed=computed, cache_hits=len(texts) - computed)
+            return vectors
+
+    def _embed_cached(self, texts: List[str], kind: str, normalize: bool, batch_size: int) -> Tuple[np.ndarray, int]:
+        """
+        Vectors for texts from memory, disk or the model, and how many were computed
+        """
+        normalized = [normalize_text(text) for text in texts]
+        keys = [self._key(text, kind, normalize) for text in normalized]
+        unique = dict(zip(keys, normalized))
+        found: Dict[str, np.ndarray] = {}
+
+        with self._lock:
+            for key in unique:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+            self._stats["memory_hits"] += len(found)
+
+        missing = [key for key in unique if key not in found]
+        if missing:
+            from_disk = self.cache.get_many(missing)
+            found.update(from_disk)
+            with self._lock:
+                self._stats["disk_hits"] += len(from_disk)
+                self._remember_locked(from_disk)
+            missing = [key for key in missing if key not in from_disk]
+
+        computed_count = len(missing)
+        if missing:
+            computed = self._compute([unique[key] for key in missing], kind, normalize, batch_size)
+            computed_map = dict(zip(missing, computed))
+            found.update(computed_map)
+            try:
+                self.cache.put_many(missing, computed)
+            except Exception as e:
+                print(f"Warning: could not write embedding cache: {e}")
+            with self._lock:
+                self._stats["misses"] += len(missing)
+                self._stats["computed"] += len(missing)
+                self._remember_locked(computed_map)
+
+        vectors = np.stack([found[key] for key in keys]) if keys else np.empty((0, self.cache.dim or 0), np.float32)
+        return vectors, computed_count
+
+    def _compute(self, texts: List[str], kind: str, normalize: bool, batch_size: int) -> np.ndarray:
+        if kind == "query" and not hasattr(self.model, "encode"):
+            vectors = [self.model.embed_query(text) for text in texts]
+        elif hasattr(self.model, "encode"):
+            vectors = self.model.encode(
+                texts, batch_size=batch_size, normalize_embeddings=normalize,
+                convert_to_numpy=True, show_progress_bar=False
+            )
+        else:
+            vectors = self.model.embed_documents(texts)
+        return np.asarray(vectors, dtype=np.float32)
+
+    def _remember_locked(self, vectors: Dict[str, np.ndarray]) -> None:
+        for key, vector in vectors.items():
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+
+_embedders: Dict[tuple, CachedEmbedder] = {}
+_embedders_lock = threading.Lock()
+
+def get_embedder(
+    model_name: str = "D:/model/BAAI-bge-m3",
+    device: str = "cpu",
+    normalize_embeddings: bool = False,
+) -> CachedEmbedder:
+    """
+    Return the process-wide cached embedder for a SentenceTransformer model
+
+    The model is loaded once per (model, device) through the model registry: loading
+    starts in the background here and the first encode waits for it. Cache misses
+    from concurrent callers are batched together (or sent to the model server when
+    MODEL_SERVER_ADDRESS is set). The cache location and memory tier size come from
+    EMBEDDING_CACHE_DIR and EMBEDDING_CACHE_MEMORY_ITEMS.
+    """
+    model_id = model_id_for(model_name)
+    key = (model_id, device, normalize_embeddings)
+    if key not in _embedders:
+        with _embedders_lock:
+            if key not in _embedders:
+                registry = get_registry()
+                registry.warm_up([("sentence_transformer", model_name, device)])
+                _embedders[key] = CachedEmbedder(
+                    SharedModel("sentence_transformer", model_name, device, registry=registry),
+                    model_id,
+                    cache=EmbeddingCache(model_id, os.getenv("EMBEDDING_CACHE_DIR", DEFAULT_CACHE_DIR)),
+                    memory_items=int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "20000")),
+                    normalize_embeddings=normalize_embeddings
+                )
+    return _embedders[key]
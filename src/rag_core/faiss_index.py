@@ -0,0 +1,300 @@
+import math
+import os
+import pickle
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Short names for the index types; any other string is passed to faiss.index_factory as is
+INDEX_KINDS = {
+    "flat": "Flat",
+    "ivfpq": "IVF{nlist},PQ{pq_m}x{pq_bits}",
+    "hnsw": "HNSW{hnsw_m}",
+    "hnsw_sq8": "HNSW{hnsw_m}_SQ8",
+    "sq8": "SQ8",
+    "ivf_sq8": "IVF{nlist},SQ8",
+}
+
+
+def index_path(persist_directory: str, index_name: str, kind: str) -> str:
+    """
+    Compressed index file, saved next to the LangChain index.faiss / index.pkl
+    """
+    return os.path.join(persist_directory, index_name, f"index.{kind}.faiss")
+
+
+def factory_string(
+    kind: str,
+    dim: int,
+    ntotal: int,
+    nlist: int = None,
+    pq_m: int = None,
+    pq_bits: int = 8,
+    hnsw_m: int = 32,
+) -> str:
+    """
+    faiss.index_factory description for a kind, with defaults sized to the corpus
+
+    nlist defaults to about 4 * sqrt(N) lists; pq_m to dim / 16 sub-quantizers
+    (64 bytes per vector for 1024-d bge-m3, against 4096 bytes as float32).
+    """
+    if kind not in INDEX_KINDS:
+        return kind
+    nlist = nlist or max(1, min(65536, int(4 * math.sqrt(max(ntotal, 1)))))
+    pq_m = pq_m or max(1, dim // 16)
+    if dim % pq_m:
+        raise ValueError(f"pq_m={pq_m} must divide the vector dimension {dim}")
+    return INDEX_KINDS[kind].format(nlist=nlist, pq_m=pq_m, pq_bits=pq_bits, hnsw_m=hnsw_m)
+
+
+def iter_vectors(index, batch_size: int = 100000):
+    """
+    Stored vectors of a flat index in order, a batch at a time
+    """
+    for start in range(0, index.ntotal, batch_size):
+        yield index.reconstruct_n(start, min(batch_size, index.ntotal - start))
+
+
+def build_index(
+    source,
+    kind: str = "ivfpq",
+    train_size: int = None,
+    batch_size: int = 100000,
+    seed: int = 0,
+    **params,
+):
+    """
+    Train a compressed index on a sample of the source vectors and add all of them
+    in the source's order, so positions (and LangChain's index_to_docstore_id) still match
+
+    Args:
+        source: Flat FAISS index with the exact vectors (e.g. vector_store.index)
+        kind: "ivfpq", "hnsw", "hnsw_sq8", "sq8", "ivf_sq8", "flat" or a factory string
+        train_size: Training sample (default: 50 vectors per IVF list / PQ centroid, at least 20000)
+        batch_size: Vectors reconstructed and added per step
+        params: nlist, pq_m, pq_bits, hnsw_m (see factory_string) and ef_construction
+
+    Returns:
+        The trained, filled FAISS index
+    """
+    import faiss
+
+    ef_construction = params.pop("ef_construction", 200)
+    description = factory_string(kind, source.d, source.ntotal, **params)
+    index = faiss.index_factory(source.d, description, source.metric_type)
+
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if hnsw is not None:
+        hnsw.efConstruction = ef_construction
+
+    if not index.is_trained:
+        nlist = getattr(_ivf(index), "nlist", 1)
+        train_size = min(source.ntotal, train_size or max(20000, 50 * max(nlist, 2 ** params.get("pq_bits", 8))))
+        rng = np.random.default_rng(seed)
+        rows = np.sort(rng.choice(source.ntotal, size=train_size, replace=False))
+        sample = np.vstack([source.reconstruct(int(row)) for row in rows]).astype(np.float32)
+        t0 = time.perf_counter()
+        index.train(sample)
+        print(f"🏋️  Trained {description} on {train_size} vectors in {time.perf_counter() - t0:.1f}s")
+
+    t0 = time.perf_counter()
+    for vectors in iter_vectors(source, batch_size):
+        index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+    print(f"📦 Added {index.ntotal} vectors to {description} in {time.perf_counter() - t0:.1f}s")
+    return index
+
+
+def save_index(index, path: str) -> int:
+    """
+    Write an index and return its size in bytes
+    """
+    import faiss
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    faiss.write_index(index, path)
+    return os.path.getsize(path)
+
+
+def read_index(path: str, mmap: bool = True):
+    """
+    Read an index, memory-mapped when the index type supports it (flat/SQ codes,
+    IVF inverted lists), so vectors are paged in from disk instead of loaded up front
+    """
+    import faiss
+
+    if mmap:
+        try:
+            return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            print(f"⚠️  Memory-mapped load not supported for {os.path.basename(path)}, reading into RAM: {e}")
+    return faiss.read_index(path)
+
+
+def set_search_params(index, nprobe: int = None, ef_search: int = None) -> None:
+    """
+    Speed/recall knobs: IVF lists probed per query, HNSW candidate list size
+    """
+    import faiss
+
+    ivf = _ivf(index)
+    if nprobe is not None and ivf is not None:
+        ivf.nprobe = nprobe
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if ef_search is not None and hnsw is not None:
+        hnsw.efSearch = ef_search
+
+
+def compress_vector_store(
+    persist_directory: str,
+    index_name: str = "pdf_documents",
+    kind: str = "ivfpq",
+    **params,
+) -> Dict[str, Any]:
+    """
+    Build a compressed copy of a saved LangChain FAISS index (index.faiss) as
+    index.<kind>.faiss in the same folder
+
+    Returns:
+        Dict with path, kind, vectors, flat_bytes and bytes (on disk)
+    """
+    import faiss
+
+    folder = os.path.join(persist_directory, index_name)
+    flat_path = os.path.join(folder, "index.faiss")
+    source = faiss.read_index(flat_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    index = build_index(source, kind, **params)
+    path = index_path(persist_directory, index_name, kind)
+    size = save_index(index, path)
+    flat_size = os.path.getsize(flat_path)
+    print(f"💾 {kind}: {size / 1e6:.1f} MB on disk (flat {flat_size / 1e6:.1f} MB, {flat_size / max(size, 1):.1f}x compression)")
+    return {"path": path, "kind": kind, "vectors": index.ntotal, "flat_bytes": flat_size, "bytes": size}
+
+
+def is_stale(persist_directory: str, index_name: str, kind: str) -> bool:
+    """
+    True when the compressed index is missing or older than the flat index.faiss
+    """
+    path = index_path(persist_directory, index_name, kind)
+    flat_path = os.path.join(persist_directory, index_name, "index.faiss")
+    return not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(flat_path)
+
+
+def load_vector_store(
+    persist_directory: str,
+    embeddings,
+    index_name: str = "pdf_documents",
+    kind: str = "ivfpq",
+    mmap: bool = True,
+    nprobe: int = None,
+    ef_search: int = None,
+):
+    """
+    LangChain FAISS store backed by a compressed, memory-mapped index
+
+    Only the docstore (index.pkl) is unpickled; the flat index.faiss is not read.
+    """
+    import faiss
+    from langchain.vectorstores import FAISS
+    from langchain_community.vectorstores.utils import DistanceStrategy
+
+    index = read_index(index_path(persist_directory, index_name, kind), mmap=mmap)
+    set_search_params(index, nprobe=nprobe, ef_search=ef_search)
+    # index.pkl is written by FAISS.save_local for this store (trusted, like load_local with
+    # allow_dangerous_deserialization=True)
+    with open(os.path.join(persist_directory, index_name, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    strategy = (
+        DistanceStrategy.MAX_INNER_PRODUCT if index.metric_type == faiss.METRIC_INNER_PRODUCT
+        else DistanceStrategy.EUCLIDEAN_DISTANCE
+    )
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+        distance_strategy=strategy,
+    )
+
+
+def recall_latency_report(
+    exact,
+    index,
+    queries: np.ndarray,
+    k: int = 10,
+    settings: Optional[Sequence[Dict[str, int]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Recall@k against the exact index and per-query latency for each search setting
+
+    Args:
+        exact: Flat index giving the true neighbours
+        index: Compressed index to evaluate
+        queries: Query vectors (float32, one row per query)
+        k: Neighbours compared
+        settings: [{"nprobe": ...} or {"ef_search": ...}]; defaults to a sweep that
+            fits the index type
+
+    Returns:
+        One row per setting: params, recall, p50_ms, p95_ms, qps (the first row is the exact index)
+    """
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    _, truth = exact.search(queries, k)
+
+    def measure(target) -> Dict[str, Any]:
+        latencies = []
+        found = np.empty_like(truth)
+        for i in range(len(queries)):
+            t0 = time.perf_counter()
+            _, found[i:i + 1] = target.search(queries[i:i + 1], k)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        hits = [len(set(row[row >= 0]) & set(true_row)) for row, true_row in zip(found, truth)]
+        return {
+            "recall": round(float(np.mean(hits)) / k, 4),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+            "qps": round(len(queries) / (sum(latencies) / 1000), 1) if sum(latencies) else 0.0,
+        }
+
+    rows = [{"params": "exact", **measure(exact)}]
+    if settings is None:
+        settings = _default_settings(index)
+    for setting in settings:
+        set_search_params(index, **setting)
+        rows.append({"params": ", ".join(f"{key}={value}" for key, value in setting.items()) or "default",
+                     **measure(index)})
+
+    print(f"{'params':<16}{'recall@' + str(k):>10}{'p50 ms':>10}{'p95 ms':>10}{'qps':>10}")
+    for row in rows:
+        print(f"{row['params']:<16}{row['recall']:>10.3f}{row['p50_ms']:>10.3f}{row['p95_ms']:>10.3f}{row['qps']:>10.1f}")
+    return rows
+
+
+def sample_queries(index, n: int = 200, seed: int = 0) -> np.ndarray:
+    """
+    Stored vectors to use as evaluation queries when no real queries are at hand
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(index.ntotal, size=min(n, index.ntotal), replace=False)
+    return np.vstack([index.reconstruct(int(row)) for row in rows]).astype(np.float32)
+
+
+def _ivf(index):
+    import faiss
+
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+
+def _default_settings(index) -> List[Dict[str, int]]:
+    import faiss
+
+    ivf = _ivf(index)
+    if ivf is not None:
+        return [{"nprobe": n} for n in (1, 2, 4, 8, 16, 32, 64, 128, 256) if n <= ivf.nlist]
+    if getattr(faiss.downcast_index(index), "hnsw", None) is not None:
+        return [{"ef_search": ef} for ef in (16, 32, 64, 128, 256)]
+    return [{}]
@@ -0,0 +1,165 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from rag_core.index_manifest import text_hash
+from rag_core.sparse_index import BM25Index
+
+# Shared by every HybridRetriever in the process; each search uses one thread per leg
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hybrid")
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[List[str]],
+    weights: Optional[Sequence[float]] = None,
+    k: int = 60,
+) -> List[Tuple[str, float]]:
+    """
+    Weighted reciprocal-rank fusion: score(d) = sum_i w_i / (k + rank_i(d))
+
+    Only ranks are used, so dense similarities and BM25 scores need no calibration.
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, key in enumerate(ranking, start=1):
+            fused[key] = fused.get(key, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def weighted_fusion(
+    scored: Sequence[List[Tuple[str, float]]],
+    weights: Optional[Sequence[float]] = None,
+) -> List[Tuple[str, float]]:
+    """
+    Weighted sum of min-max normalised scores (a document missing from a leg gets 0 there)
+    """
+    weights = weights or [1.0] * len(scored)
+    fused: Dict[str, float] = {}
+    for results, weight in zip(scored, weights):
+        if not results:
+            continue
+        values = [score for _, score in results]
+        low, high = min(values), max(values)
+        span = high - low
+        for key, score in results:
+            normalised = (score - low) / span if span else 1.0
+            fused[key] = fused.get(key, 0.0) + weight * normalised
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridRetriever:
+    def __init__(
+        self,
+        vector_store,
+        sparse_index: BM25Index,
+        k: int = 4,
+        fetch_k: int = 20,
+        fusion: str = "rrf",
+        weights: Sequence[float] = (0.5, 0.5),
+        rrf_k: int = 60,
+    ):
+        """
+        Dense + BM25 retrieval fused into one ranking
+
+        Both legs fetch `fetch_k` candidates at the same time (dense in a worker
+        thread, BM25 on the calling thread); results are matched by text, so the
+        two indexes do not need to share ids.
+
+        Args:
+            vector_store: LangChain vector store (FAISS, Chroma)
+            sparse_index: BM25Index over the same chunks
+            k: Documents returned
+            fetch_k: Candidates taken from each leg
+            fusion: "rrf" (reciprocal rank) or "weighted" (normalised scores)
+            weights: (dense, sparse) weights for either fusion
+            rrf_k: RRF smoothing constant
+        """
+        if fusion not in ("rrf", "weighted"):
+            raise ValueError(f"Unknown fusion: {fusion} (use 'rrf' or 'weighted')")
+        self.vector_store = vector_store
+        self.sparse_index = sparse_index
+        self.k = k
+        self.fetch_k = fetch_k
+        self.fusion = fusion
+        self.weights = list(weights)
+        self.rrf_k = rrf_k
+
+    def search(self, query: str, k: int = None):
+        """
+        Fused top-k LangChain Documents; metadata gets hybrid_score, dense_rank and sparse_rank
+        """
+        dense_future = _executor.submit(self._dense, query)
+        sparse = self._sparse(query)
+        return self._fuse(dense_future.result(), sparse, k or self.k)
+
+    async def asearch(self, query: str, k: int = None):
+        loop = asyncio.get_running_loop()
+        dense, sparse = await asyncio.gather(
+            loop.run_in_executor(_executor, self._dense, query),
+            loop.run_in_executor(_executor, self._sparse, query),
+        )
+        return self._fuse(dense, sparse, k or self.k)
+
+    def as_retriever(self):
+        """
+        LangChain retriever (invoke/ainvoke), usable in create_retrieval_chain
+        """
+        from langchain_core.retrievers import BaseRetriever
+
+        hybrid = self
+
+        class _HybridRetriever(BaseRetriever):
+            def _get_relevant_documents(self, query, *, run_manager=None):
+                return hybrid.search(query)
+
+            async def _aget_relevant_documents(self, query, *, run_manager=None):
+                return await hybrid.asearch(query)
+
+        return _HybridRetriever()
+
+    def _dense(self, query: str):
+        try:
+            return self.vector_store.similarity_search_with_relevance_scores(query, k=self.fetch_k)
+        except NotImplementedError:
+            # Stores without a relevance function: negate the distance so higher is better
+            return [(doc, -score) for doc, score in self.vector_store.similarity_search_with_score(query, k=self.fetch_k)]
+
+    def _sparse(self, query: str):
+        from langchain_core.documents import Document
+
+        return [
+            (Document(page_content=hit["text"], metadata=hit["metadata"]), hit["score"])
+            for hit in self.sparse_index.search(query, k=self.fetch_k)
+        ]
+
+    def _fuse(self, dense, sparse, k: int):
+        from langchain_core.documents import Document
+
+        documents = {}
+        legs = []
+        for results in (dense, sparse):
+            leg = []
+            for doc, score in results:
+                key = text_hash(doc.page_content)
+                documents.setdefault(key, doc)
+                leg.append((key, float(score)))
+            legs.append(leg)
+
+        if self.fusion == "rrf":
+            fused = reciprocal_rank_fusion([[key for key, _ in leg] for leg in legs], self.weights, self.rrf_k)
+        else:
+            fused = weighted_fusion(legs, self.weights)
+
+        ranks = [{key: rank for rank, (key, _) in enumerate(leg, start=1)} for leg in legs]
+        results = []
+        for key, score in fused[:k]:
+            doc = documents[key]
+            # A copy: FAISS hands out the Documents held in its docstore
+            results.append(Document(page_content=doc.page_content, metadata={
+                **(doc.metadata or {}),
+                "hybrid_score": round(score, 6),
+                "dense_rank": ranks[0].get(key),
+                "sparse_rank": ranks[1].get(key),
+            }))
+        return results
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+CREATE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS manifest_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS manifest_files (
+        path TEXT PRIMARY KEY,
+        sha256 TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS manifest_chunks (
+        id TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        metadata_hash TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS manifest_chunks_path ON manifest_chunks (path)",
+]
+
+
+# Settings earlier manifests recorded that do not affect the stored vectors
+_LEGACY_KEYS = ("sparse_index",)
+
+
+def file_digest(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """
+    SHA-256 of a file's bytes, read in blocks
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def metadata_hash(metadata: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(metadata, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def chunk_id_for(file_path: str, text: str, occurrence: int = 0) -> str:
+    """
+    Content-addressed vector id: the same text in the same file keeps its id when
+    chunks around it are added or removed; repeated texts get an occurrence suffix
+    """
+    path_digest = hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()[:16]
+    chunk_id = f"{path_digest}-{text_hash(text)[:24]}"
+    return f"{chunk_id}-{occurrence}" if occurrence else chunk_id
+
+
+class IndexManifest:
+    def __init__(self, path: str, config: Dict[str, Any]):
+        """
+        Per-file and per-chunk content hashes of what a vector store holds, kept in
+        SQLite next to the collection
+
+        Files are identified by their SHA-256, chunks by a content-addressed id plus a
+        hash of their metadata. A manifest written with other chunking/model settings
+        is not `compatible`, since none of its vectors can be reused. A manifest that
+        has never recorded any settings is not `initialized` (a new manifest, possibly
+        next to a store built without one).
+
+        Args:
+            path: SQLite file for the manifest
+            config: Settings the stored vectors depend on
+        """
+        self.path = path
+        self.config = json.dumps(config, sort_keys=True)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        for statement in CREATE_TABLES:
+            self._db.execute(statement)
+        self._db.commit()
+
+        row = self._db.execute("SELECT value FROM manifest_meta WHERE key = 'config'").fetchone()
+        self.initialized = row is not None
+        self.compatible = row is not None and row[0] == self.config
+        if row is not None and not self.compatible:
+            stored = json.loads(row[0])
+            if {key: value for key, value in stored.items() if key not in _LEGACY_KEYS} == json.loads(self.config):
+                # Same vector settings, written before those keys were dropped
+                self._db.execute("UPDATE manifest_meta SET value = ? WHERE key = 'config'", (self.config,))
+                self._db.commit()
+                self.compatible = True
+
+    def reset(self) -> None:
+        """
+        Forget every file and chunk and record the current settings
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM manifest_chunks")
+            self._db.execute("DELETE FROM manifest_files")
+            self._db.execute(
+                "INSERT OR REPLACE INTO manifest_meta (key, value) VALUES ('config', ?)", (self.config,)
+            )
+            self._db.commit()
+            self.compatible = True
+            self.initialized = True
+
+    def files(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT path FROM manifest_files")]
+
+    def file_entry(self, file_path: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT sha256, size, mtime FROM manifest_files WHERE path = ?", (file_path,)
+            ).fetchone()
+        return {"sha256": row[0], "size": row[1], "mtime": row[2]} if row else None
+
+    def chunk_hashes(self, file_path: str) -> Dict[str, str]:
+        """
+        {chunk id: metadata hash} of the chunks recorded for a file
+        """
+        with self._lock:
+            return dict(self._db.execute(
+                "SELECT id, metadata_hash FROM manifest_chunks WHERE path = ?", (file_path,)
+            ))
+
+    def chunk_ids(self) -> set:
+        """
+        Ids of every recorded chunk
+        """
+        with self._lock:
+            return {row[0] for row in self._db.execute("SELECT id FROM manifest_chunks")}
+
+    def record_file(self, file_path: str, sha256: str, chunks: Dict[str, str]) -> None:
+        """
+        Replace a file's entry and chunk list (call commit() once the store is persisted)
+        """
+        stat = os.stat(file_path)
+        with self._lock:
+            self._db.execute("DELETE FROM manifest_chunks WHERE path = ?", (file_path,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO manifest_files (path, sha256, size, mtime) VALUES (?, ?, ?, ?)",
+                (file_path, sha256, stat.st_size, stat.st_mtime)
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO manifest_chunks (id, path, metadata_hash) VALUES (?, ?, ?)",
+                [(chunk_id, file_path, hashed) for chunk_id, hashed in chunks.items()]
+            )
+
+    def remove_file(self, file_path: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM manifest_chunks WHERE path = ?", (file_path,))
+            self._db.execute("DELETE FROM manifest_files WHERE path = ?", (file_path,))
+
+    def commit(self) -> None:
+        with self._lock:
+            self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            files = self._db.execute("SELECT COUNT(*) FROM manifest_files").fetchone()[0]
+            chunks = self._db.execute("SELECT COUNT(*) FROM manifest_chunks").fetchone()[0]
+        return {"files": files, "chunks": chunks}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,629 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from rag_core.index_manifest import IndexManifest, chunk_id_for, file_digest, metadata_hash
+
+SEPARATORS = ["\n\n", "\n", ". ", "! ", "? ", "; ", ", ", " ", ""]
+
+# One text splitter per worker process, built by _init_worker
+_worker_splitter = None
+_worker_tokenizer = None
+_worker_max_tokens = None
+
+
+def _init_worker(chunk_size: int, chunk_overlap: int, tokenizer_model: str, max_token_limit: int) -> None:
+    global _worker_splitter, _worker_tokenizer, _worker_max_tokens
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from transformers import AutoTokenizer
+
+    _worker_tokenizer = AutoTokenizer.from_pretrained(tokenizer_model)
+    _worker_splitter = RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+        tokenizer=_worker_tokenizer,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        strip_whitespace=True,
+        separators=SEPARATORS
+    )
+    _worker_max_tokens = max_token_limit
+
+
+def parse_and_chunk(file_path: str) -> Dict[str, Any]:
+    """
+    Load one PDF and split it into chunks (runs inside a worker process)
+
+    Returns:
+        Dict with "file_path", "pages", "chunks" as (id, text, metadata) tuples,
+        "skipped" (oversized chunks), "seconds" and "error"
+    """
+    from langchain.document_loaders import PyPDFLoader
+
+    started = time.perf_counter()
+    result = {"file_path": file_path, "pages": 0, "chunks": [], "skipped": 0, "seconds": 0.0, "error": None}
+    try:
+        documents = PyPDFLoader(file_path).load()
+        file_info = {
+            "source_file": os.path.basename(file_path),
+            "file_type": os.path.splitext(file_path)[1].lower(),
+            "file_path": file_path,
+            "file_size": os.path.getsize(file_path),
+        }
+        for doc in documents:
+            doc.metadata = {**(doc.metadata or {}), **file_info}
+
+        chunks = []
+        occurrences: Dict[str, int] = {}
+        for i, chunk in enumerate(_worker_splitter.split_documents(documents)):
+            token_count = len(_worker_tokenizer.encode(chunk.page_content))
+            if token_count > _worker_max_tokens:
+                result["skipped"] += 1
+                continue
+            metadata = {
+                **chunk.metadata,
+                "chunk_id": i,
+                "token_count": token_count,
+                "char_count": len(chunk.page_content),
+                "chunk_method": "tokenizer_based"
+            }
+            occurrence = occurrences.get(chunk.page_content, 0)
+            occurrences[chunk.page_content] = occurrence + 1
+            chunks.append((chunk_id_for(file_path, chunk.page_content, occurrence), chunk.page_content, metadata))
+
+        result["pages"] = len(documents)
+        result["chunks"] = chunks
+    except Exception as e:
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+class ChromaStoreWriter:
+    def __init__(self, persist_directory: str = "./chroma_db", collection_name: str = "pdf_documents"):
+        """
+        Batched upserts straight into a persistent Chroma collection
+
+        The collection stays readable through LangChain's Chroma wrapper
+        (documents + metadatas), as written by DocumentLoader.create_vector_store.
+        """
+        import chromadb
+
+        os.makedirs(persist_directory, exist_ok=True)
+        self.persist_directory = persist_directory
+        self.collection_name = collection_name
+        self.client = chromadb.PersistentClient(path=persist_directory)
+        self.collection = self.client.get_or_create_collection(collection_name)
+
+    def reset(self) -> None:
+        try:
+            self.client.delete_collection(self.collection_name)
+            print(f"🗑️  Deleted existing collection: {self.collection_name}")
+        except Exception:
+            pass
+        self.collection = self.client.get_or_create_collection(self.collection_name)
+
+    def add(self, ids: List[str], texts: List[str], embeddings: List[List[float]], metadatas: List[dict]) -> None:
+        self.collection.upsert(ids=ids, documents=texts, embeddings=embeddings, metadatas=metadatas)
+
+    def update_metadata(self, ids: List[str], metadatas: List[dict]) -> None:
+        self.collection.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids: List[str]) -> None:
+        self.collection.delete(ids=ids)
+
+    def persist(self) -> None:
+        # PersistentClient writes through on every upsert
+        pass
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def get(self, ids: List[str]) -> List[Tuple[str, str, dict]]:
+        """
+        (id, text, metadata) of the stored chunks among `ids`
+        """
+        result = self.collection.get(ids=ids, include=["documents", "metadatas"])
+        return list(zip(result["ids"], result["documents"], result["metadatas"]))
+
+    def stored_metadata(self, batch_size: int = 5000) -> List[Tuple[str, dict]]:
+        """
+        (id, metadata) of every stored chunk
+        """
+        found = []
+        while True:
+            result = self.collection.get(include=["metadatas"], limit=batch_size, offset=len(found))
+            found.extend(zip(result["ids"], result["metadatas"]))
+            if len(result["ids"]) < batch_size:
+                return found
+
+
+class FaissStoreWriter:
+    def __init__(self, embeddings, persist_directory: str = "./faiss_db", index_name: str = "pdf_documents"):
+        """
+        Batched adds to a LangChain FAISS store, saved with save_local after every flush
+
+        Args:
+            embeddings: LangChain embeddings object the store is queried with later
+        """
+        self.embeddings = embeddings
+        self.path = os.path.join(persist_directory, index_name)
+        self.vector_store = None
+        if os.path.exists(os.path.join(self.path, "index.faiss")):
+            from langchain.vectorstores import FAISS
+            self.vector_store = FAISS.load_local(self.path, embeddings, allow_dangerous_deserialization=True)
+
+    def reset(self) -> None:
+        self.vector_store = None
+        for name in ("index.faiss", "index.pkl"):
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+
+    def add(self, ids: List[str], texts: List[str], embeddings: List[List[float]], metadatas: List[dict]) -> None:
+        from langchain.vectorstores import FAISS
+
+        pairs = list(zip(texts, embeddings))
+        if self.vector_store is None:
+            self.vector_store = FAISS.from_embeddings(pairs, self.embeddings, metadatas=metadatas, ids=ids)
+            return
+        # A file re-processed after an interrupted run replaces the vectors it already wrote
+        self.delete(ids)
+        self.vector_store.add_embeddings(pairs, metadatas=metadatas, ids=ids)
+
+    def update_metadata(self, ids: List[str], metadatas: List[dict]) -> None:
+        if self.vector_store is None:
+            return
+        for chunk_id, metadata in zip(ids, metadatas):
+            doc = self.vector_store.docstore.search(chunk_id)
+            if hasattr(doc, "metadata"):
+                doc.metadata = metadata
+
+    def delete(self, ids: List[str]) -> None:
+        if self.vector_store is None:
+            return
+        stored = set(self.vector_store.index_to_docstore_id.values())
+        existing = [chunk_id for chunk_id in ids if chunk_id in stored]
+        if existing:
+            self.vector_store.delete(existing)
+
+    def persist(self) -> None:
+        if self.vector_store is not None:
+            os.makedirs(self.path, exist_ok=True)
+            self.vector_store.save_local(self.path)
+
+    def count(self) -> int:
+        return self.vector_store.index.ntotal if self.vector_store is not None else 0
+
+    def get(self, ids: List[str]) -> List[Tuple[str, str, dict]]:
+        """
+        (id, text, metadata) of the stored chunks among `ids`
+        """
+        if self.vector_store is None:
+            return []
+        found = []
+        for chunk_id in ids:
+            doc = self.vector_store.docstore.search(chunk_id)
+            # The docstore answers unknown ids with a message string
+            if hasattr(doc, "page_content"):
+                found.append((chunk_id, doc.page_content, doc.metadata))
+        return found
+
+    def stored_metadata(self) -> List[Tuple[str, dict]]:
+        """
+        (id, metadata) of every stored chunk
+        """
+        if self.vector_store is None:
+            return []
+        ids = list(self.vector_store.index_to_docstore_id.values())
+        return [(chunk_id, metadata) for chunk_id, _, metadata in self.get(ids)]
+
+
+class IngestionPipeline:
+    def __init__(
+        self,
+        writer,
+        embed_fn: Callable[[List[str]], List[List[float]]],
+        manifest_path: str,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        tokenizer_model: str = "D:/model/BAAI-bge-m3",
+        max_token_limit: int = 8192,
+        embedding_model: str = None,
+        workers: int = None,
+        queue_size: int = 8,
+        embed_batch_size: int = 64,
+        write_batch_size: int = 1000,
+        flush_chunks: int = 2000,
+        sparse_index=None,
+    ):
+        """
+        Pipelined, incremental ingestion: hash -> parse -> chunk -> diff -> embed -> write
+
+        Every file is hashed first; files whose SHA-256 matches the manifest are not
+        opened again. Changed and new PDFs are parsed and chunked in a process pool and
+        sent through a bounded queue (so parsing cannot run far ahead of embedding) to
+        the embedding stage. There each file's chunks are diffed against the manifest:
+        only chunks with new text are embedded, chunks that disappeared are deleted and
+        unchanged chunks whose metadata moved (page, position) get a metadata update.
+        New chunks are gathered to about `flush_chunks`, sorted by length so each batch
+        pads to similar sizes, embedded in `embed_batch_size` batches and written in
+        `write_batch_size` batches. The manifest is committed only after the store is
+        persisted, so an interrupted run resumes with the files it had not finished.
+        A non-empty store without a manifest (built before manifests, or with the
+        manifest deleted) is adopted instead of re-embedded; see _adopt_store.
+
+        Args:
+            writer: ChromaStoreWriter or FaissStoreWriter
+            embed_fn: Embeds a list of texts (e.g. HuggingFaceEmbeddings.embed_documents)
+            manifest_path: SQLite file with the file and chunk hashes of the store
+            chunk_size, chunk_overlap, tokenizer_model, max_token_limit: as in
+                DocumentLoader.chunk_documents_standard
+            embedding_model: Recorded in the manifest; changing it needs run(rebuild=True)
+            workers: Parsing processes (defaults to CPU count - 1)
+            queue_size: Parsed files allowed to wait for embedding
+            embed_batch_size: Texts per embed_fn call
+            write_batch_size: Vectors per store write
+            flush_chunks: Chunks gathered before sorting, embedding and committing
+            sparse_index: Optional BM25Index kept in step with the store (same ids). It
+                is not part of the manifest settings: adding one to an existing store,
+                or changing its tokenizer, fills it from the stored chunks without
+                re-embedding anything.
+        """
+        self.writer = writer
+        self.embed_fn = embed_fn
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.tokenizer_model = tokenizer_model
+        self.max_token_limit = max_token_limit
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.queue_size = queue_size
+        self.embed_batch_size = embed_batch_size
+        self.write_batch_size = write_batch_size
+        self.flush_chunks = flush_chunks
+        self.sparse_index = sparse_index
+        # Every write goes to the vector store and, if given, the BM25 index
+        self._stores = [writer] + ([sparse_index] if sparse_index is not None else [])
+
+        self.manifest = IndexManifest(manifest_path, {
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "tokenizer_model": tokenizer_model,
+            "max_token_limit": max_token_limit,
+            "embedding_model": embedding_model or tokenizer_model,
+        })
+
+    def run(self, file_paths: List[str], rebuild: bool = False, prune: bool = False) -> Dict[str, Any]:
+        """
+        Bring the store in line with the given PDFs
+
+        Args:
+            file_paths: PDF file paths
+            rebuild: Drop the store and embed everything again. Without it a non-empty
+                store is never dropped: a store without a manifest is adopted, and a
+                run whose settings differ from the manifest's returns an "error" and
+                leaves the store as it is
+            prune: Also delete vectors of files in the manifest that are not in `file_paths`.
+                Files listed but missing on disk always keep their vectors.
+
+        Returns:
+            Dict of counters and throughput (docs_per_sec counts PDF pages, like load_docs),
+            plus "error" when the run was refused
+        """
+        started = time.perf_counter()
+        stats = {
+            "files_total": len(file_paths), "files_unchanged": 0, "files_new": 0, "files_changed": 0,
+            "files_removed": 0, "files_failed": 0,
+            "pages": 0, "chunks": 0, "chunks_embedded": 0, "chunks_reused": 0, "chunks_deleted": 0,
+            "metadata_updated": 0, "chunks_skipped": 0, "sparse_backfilled": 0, "files_adopted": 0,
+            "hash_seconds": 0.0, "parse_seconds": 0.0, "embed_seconds": 0.0, "write_seconds": 0.0,
+        }
+
+        candidates = []
+        for file_path in file_paths:
+            if not os.path.exists(file_path):
+                print(f"Warning: File {file_path} not found. Skipping...")
+                stats["files_failed"] += 1
+            elif os.path.splitext(file_path)[1].lower() != ".pdf":
+                print(f"Warning: {file_path} is not a PDF file. Skipping...")
+                stats["files_failed"] += 1
+            else:
+                candidates.append(file_path)
+
+        # Only drop stored vectors when there is something to rebuild them from, and a
+        # non-empty store only when asked to
+        adopt = not rebuild and not self.manifest.initialized and self.writer.count() > 0
+        if rebuild and not candidates:
+            stats["error"] = "No PDF files to rebuild from; the store was left unchanged"
+        elif not rebuild and not self.manifest.compatible and not adopt and self.writer.count():
+            stats["error"] = (
+                "The store was built with other chunking/model settings; "
+                "pass rebuild=True to embed everything again"
+            )
+        if "error" in stats:
+            print(f"⚠️  {stats['error']}")
+            return self._finish(stats, started)
+        if rebuild or not (self.manifest.compatible or adopt):
+            self.manifest.reset()
+            for store in self._stores:
+                store.reset()
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            self._digests = dict(zip(candidates, pool.map(file_digest, candidates)))
+        stats["hash_seconds"] = time.perf_counter() - t0
+
+        if adopt:
+            self._adopt_store(stats)
+
+        pending = []
+        for file_path in candidates:
+            entry = self.manifest.file_entry(file_path)
+            if entry is None:
+                stats["files_new"] += 1
+            elif entry["sha256"] != self._digests[file_path]:
+                stats["files_changed"] += 1
+            else:
+                stats["files_unchanged"] += 1
+                continue
+            pending.append(file_path)
+
+        if prune:
+            listed = set(file_paths)
+            self._remove([path for path in self.manifest.files() if path not in listed], stats)
+
+        if self.sparse_index is not None:
+            self._sync_sparse_index(stats)
+
+        print(
+            f"🔄 {stats['files_unchanged']} unchanged, {stats['files_changed']} changed, "
+            f"{stats['files_new']} new files; parsing {len(pending)} with {self.workers} processes"
+        )
+
+        if pending:
+            self._ingest(pending, stats, started)
+        return self._finish(stats, started)
+
+    def _finish(self, stats: Dict[str, Any], started: float) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - started
+        stats["elapsed_seconds"] = round(elapsed, 2)
+        stats["docs_per_sec"] = round(stats["pages"] / elapsed, 2) if elapsed else 0.0
+        stats["chunks_per_sec"] = round(stats["chunks"] / elapsed, 2) if elapsed else 0.0
+        stats["vectors_total"] = self.writer.count()
+        for key in ("hash_seconds", "parse_seconds", "embed_seconds", "write_seconds"):
+            stats[key] = round(stats[key], 2)
+
+        print(
+            f"📊 {stats['pages']} pages, {stats['chunks']} chunks in {stats['elapsed_seconds']}s "
+            f"({stats['docs_per_sec']} docs/sec, {stats['chunks_per_sec']} chunks/sec); "
+            f"embedded {stats['chunks_embedded']}, reused {stats['chunks_reused']}, deleted {stats['chunks_deleted']}"
+        )
+        print(f"📊 Total vectors in store: {stats['vectors_total']}")
+        return stats
+
+    def remove(self, file_paths: List[str]) -> Dict[str, Any]:
+        """
+        Delete the vectors of the given files from the store and the manifest
+        """
+        stats = {"files_removed": 0, "chunks_deleted": 0}
+        self._remove(file_paths, stats)
+        return stats
+
+    def _remove(self, file_paths: List[str], stats: Dict[str, Any]) -> None:
+        if not file_paths:
+            return
+        ids = []
+        for file_path in file_paths:
+            ids.extend(self.manifest.chunk_hashes(file_path))
+        for store in self._stores:
+            for i in range(0, len(ids), self.write_batch_size):
+                store.delete(ids[i:i + self.write_batch_size])
+            store.persist()
+        for file_path in file_paths:
+            self.manifest.remove_file(file_path)
+            print(f"🗑️  Removed {file_path} from the store")
+        self.manifest.commit()
+        stats["files_removed"] += len(file_paths)
+        stats["chunks_deleted"] += len(ids)
+
+    def _adopt_store(self, stats: Dict[str, Any]) -> None:
+        """
+        Record the chunks of a store that has no manifest under the files they came from
+        (their "file_path" metadata), so unchanged files are not embedded again
+
+        Adopted chunks keep their ids. A file whose size differs from the one stored in
+        its chunks is recorded without a digest, so this run re-chunks it and replaces
+        its old chunks. Chunks of files no longer on disk, or without a file path, stay in
+        the store untracked.
+        The current settings are assumed to be the ones the store was built with; pass
+        rebuild=True if they are not.
+        """
+        by_file: Dict[str, Dict[str, str]] = {}
+        sizes: Dict[str, Any] = {}
+        untracked = 0
+        for chunk_id, metadata in self.writer.stored_metadata():
+            metadata = metadata or {}
+            file_path = metadata.get("file_path") or metadata.get("source")
+            if file_path:
+                by_file.setdefault(file_path, {})[chunk_id] = metadata_hash(metadata)
+                sizes.setdefault(file_path, metadata.get("file_size"))
+            else:
+                untracked += 1
+
+        self.manifest.reset()
+        for file_path, chunks in by_file.items():
+            if not os.path.exists(file_path):
+                untracked += len(chunks)
+                continue
+            if sizes[file_path] is not None and sizes[file_path] != os.path.getsize(file_path):
+                digest = ""
+            else:
+                digest = self._digests.get(file_path) or file_digest(file_path)
+            self.manifest.record_file(file_path, digest, chunks)
+            stats["files_adopted"] += 1
+        self.manifest.commit()
+        print(
+            f"📥 Adopted {stats['files_adopted']} files from a store without a manifest"
+            + (f" ({untracked} chunks without a file on disk stay untracked)" if untracked else "")
+        )
+
+    def _sync_sparse_index(self, stats: Dict[str, Any]) -> None:
+        """
+        Copy chunks the BM25 index lacks (new or reset index) from the vector store and
+        drop ones the manifest no longer has
+        """
+        recorded = self.manifest.chunk_ids()
+        indexed = self.sparse_index.ids()
+        missing = sorted(recorded - indexed)
+        stale = list(indexed - recorded)
+        if not missing and not stale:
+            return
+
+        for i in range(0, len(missing), self.write_batch_size):
+            found = self.writer.get(missing[i:i + self.write_batch_size])
+            if found:
+                self.sparse_index.add(
+                    [chunk_id for chunk_id, _, _ in found],
+                    [text for _, text, _ in found],
+                    metadatas=[metadata for _, _, metadata in found]
+                )
+                stats["sparse_backfilled"] += len(found)
+        for i in range(0, len(stale), self.write_batch_size):
+            self.sparse_index.delete(stale[i:i + self.write_batch_size])
+        self.sparse_index.persist()
+        print(f"🔤 BM25 index: added {stats['sparse_backfilled']} stored chunks, removed {len(stale)}")
+
+    def _ingest(self, file_paths: List[str], stats: Dict[str, Any], started: float) -> None:
+        parsed: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(file_paths, parsed, stop), daemon=True)
+        producer.start()
+
+        buffer: List[Dict[str, Any]] = []
+        buffered_chunks = 0
+        try:
+            while True:
+                item = parsed.get()
+                if item is None:
+                    break
+                stats["parse_seconds"] += item["seconds"]
+                if item["error"]:
+                    print(f"❌ Error processing {item['file_path']}: {item['error']}")
+                    stats["files_failed"] += 1
+                    continue
+                print(f"✅ Parsed PDF: {item['file_path']} ({item['pages']} pages, {len(item['chunks'])} chunks)")
+                buffer.append(item)
+                buffered_chunks += len(item["chunks"])
+                if buffered_chunks >= self.flush_chunks:
+                    self._flush(buffer, stats, started)
+                    buffer, buffered_chunks = [], 0
+            if buffer:
+                self._flush(buffer, stats, started)
+        finally:
+            stop.set()
+            # Unblock the producer if it is waiting on a full queue
+            while producer.is_alive():
+                try:
+                    parsed.get_nowait()
+                except queue.Empty:
+                    producer.join(timeout=0.1)
+
+    def _produce(self, file_paths: List[str], parsed: queue.Queue, stop: threading.Event) -> None:
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self.chunk_size, self.chunk_overlap, self.tokenizer_model, self.max_token_limit)
+            ) as pool:
+                remaining = iter(file_paths)
+                in_flight = set()
+                while not stop.is_set():
+                    # Keep only a few files per worker in flight; the bounded queue does the rest
+                    while len(in_flight) < self.workers * 2:
+                        file_path = next(remaining, None)
+                        if file_path is None:
+                            break
+                        in_flight.add(pool.submit(parse_and_chunk, file_path))
+                    if not in_flight:
+                        break
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        parsed.put(future.result())
+                for future in in_flight:
+                    future.cancel()
+        except Exception as e:
+            print(f"❌ Parsing pool failed: {e}")
+        finally:
+            parsed.put(None)
+
+    def _flush(self, items: List[Dict[str, Any]], stats: Dict[str, Any], started: float) -> None:
+        to_embed: List[Tuple[str, str, dict]] = []
+        to_update: List[Tuple[str, dict]] = []
+        to_delete: List[str] = []
+        records = []
+        for item in items:
+            previous = self.manifest.chunk_hashes(item["file_path"])
+            current = {}
+            for chunk in item["chunks"]:
+                chunk_id, _, metadata = chunk
+                current[chunk_id] = metadata_hash(metadata)
+                if chunk_id not in previous:
+                    to_embed.append(chunk)
+                elif previous[chunk_id] != current[chunk_id]:
+                    to_update.append((chunk_id, metadata))
+            to_delete.extend(chunk_id for chunk_id in previous if chunk_id not in current)
+            records.append((item, current))
+
+        # Similar lengths per batch means far less padding inside the embedding model
+        to_embed.sort(key=lambda chunk: chunk[2]["token_count"])
+
+        try:
+            t0 = time.perf_counter()
+            vectors = []
+            for i in range(0, len(to_embed), self.embed_batch_size):
+                batch = to_embed[i:i + self.embed_batch_size]
+                vectors.extend(list(map(float, vector)) for vector in self.embed_fn([text for _, text, _ in batch]))
+            t1 = time.perf_counter()
+
+            for store in self._stores:
+                for i in range(0, len(to_embed), self.write_batch_size):
+                    batch = to_embed[i:i + self.write_batch_size]
+                    store.add(
+                        [chunk_id for chunk_id, _, _ in batch],
+                        [text for _, text, _ in batch],
+                        vectors[i:i + self.write_batch_size],
+                        [metadata for _, _, metadata in batch]
+                    )
+                for i in range(0, len(to_update), self.write_batch_size):
+                    batch = to_update[i:i + self.write_batch_size]
+                    store.update_metadata([chunk_id for chunk_id, _ in batch], [metadata for _, metadata in batch])
+                for i in range(0, len(to_delete), self.write_batch_size):
+                    store.delete(to_delete[i:i + self.write_batch_size])
+                store.persist()
+            t2 = time.perf_counter()
+        except Exception as e:
+            # The manifest is not committed, so these files are retried on the next run
+            print(f"❌ Error embedding/writing {len(items)} files ({len(to_embed)} chunks): {e}")
+            stats["files_failed"] += len(items)
+            return
+
+        for item, current in records:
+            self.manifest.record_file(item["file_path"], self._digests[item["file_path"]], current)
+            stats["pages"] += item["pages"]
+            stats["chunks"] += len(item["chunks"])
+            stats["chunks_skipped"] += item["skipped"]
+        self.manifest.commit()
+
+        stats["chunks_embedded"] += len(to_embed)
+        stats["chunks_reused"] += sum(len(current) for _, current in records) - len(to_embed)
+        stats["chunks_deleted"] += len(to_delete)
+        stats["metadata_updated"] += len(to_update)
+        stats["embed_seconds"] += t1 - t0
+        stats["write_seconds"] += t2 - t1
+        elapsed = time.perf_counter() - started
+        print(
+            f"📦 {len(items)} files: embedded {len(to_embed)}, updated {len(to_update)}, deleted {len(to_delete)} "
+            f"chunks (embed {t1 - t0:.1f}s, write {t2 - t1:.1f}s) - {stats['chunks'] / elapsed:.1f} chunks/sec so far"
+        )
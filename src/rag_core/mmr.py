@@ -0,0 +1,220 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def mmr_select(
+    candidate_embeddings,
+    query_embedding=None,
+    k: int = 4,
+    lambda_mult: float = 0.5,
+    relevance: Optional[Sequence[float]] = None,
+) -> List[Tuple[int, float]]:
+    """
+    Greedy maximal marginal relevance over precomputed candidate embeddings
+
+    The candidate-candidate cosine matrix is computed once; after each pick only the
+    running max similarity to the selected set is updated (one np.maximum per pick),
+    so selection is O(n * k) after the matrix.
+
+    Args:
+        candidate_embeddings: (n, d) vectors of the candidates, as stored in the index
+        query_embedding: Query vector; relevance is its cosine with each candidate
+        k: Number of candidates to select
+        lambda_mult: 1 = relevance only, 0 = diversity only
+        relevance: Scores to use instead of the query cosine (e.g. rerank or fusion
+            scores); they are min-max scaled to [0, 1] to be comparable with cosine
+
+    Returns:
+        [(candidate index, mmr score)] in selection order
+    """
+    vectors = normalize_rows(candidate_embeddings)
+    n = len(vectors)
+    if n == 0 or k <= 0:
+        return []
+
+    if relevance is not None:
+        relevance = np.asarray(relevance, dtype=np.float32)
+        span = float(relevance.max() - relevance.min())
+        relevance = (relevance - relevance.min()) / span if span else np.ones(n, dtype=np.float32)
+    elif query_embedding is not None:
+        relevance = vectors @ normalize_rows(query_embedding)[0]
+    else:
+        raise ValueError("mmr_select needs query_embedding or relevance")
+
+    similarity = vectors @ vectors.T
+    max_similarity = None  # per candidate: highest similarity to anything selected so far
+    available = np.ones(n, dtype=bool)
+    selected: List[Tuple[int, float]] = []
+    for _ in range(min(k, n)):
+        scores = lambda_mult * relevance
+        if max_similarity is not None:
+            scores = scores - (1.0 - lambda_mult) * max_similarity
+        scores = np.where(available, scores, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append((best, float(scores[best])))
+        available[best] = False
+        if max_similarity is None:
+            max_similarity = similarity[best].copy()
+        else:
+            np.maximum(max_similarity, similarity[best], out=max_similarity)
+    return selected
+
+
+def faiss_candidates(vector_store, query_embedding, fetch_k: int = 20):
+    """
+    Top fetch_k Documents of a LangChain FAISS store with their stored vectors
+    (reconstructed from the index, not re-embedded)
+
+    Returns:
+        (documents, embeddings (n, d) array)
+    """
+    index = vector_store.index
+    query = np.asarray(query_embedding, dtype=np.float32).reshape(1, -1)
+    _, positions = index.search(query, fetch_k)
+    positions = [int(position) for position in positions[0] if position >= 0]
+    if not positions:
+        return [], np.zeros((0, index.d), dtype=np.float32)
+
+    try:
+        embeddings = np.vstack([index.reconstruct(position) for position in positions])
+    except RuntimeError:
+        # IVF indexes need a direct map to look vectors up by position
+        import faiss
+
+        faiss.extract_index_ivf(index).make_direct_map()
+        embeddings = np.vstack([index.reconstruct(position) for position in positions])
+
+    documents = [vector_store.docstore.search(vector_store.index_to_docstore_id[position]) for position in positions]
+    return documents, embeddings
+
+
+def chroma_candidates(collection, query_embedding, fetch_k: int = 20):
+    """
+    Top fetch_k results of a chromadb collection with the embeddings Chroma stored
+
+    Returns:
+        (list of dicts with id, text, metadata, score, embeddings (n, d) array)
+    """
+    results = collection.query(
+        query_embeddings=[list(map(float, query_embedding))],
+        n_results=fetch_k,
+        include=["documents", "metadatas", "distances", "embeddings"]
+    )
+    candidates = [
+        {
+            "id": doc_id,
+            "text": text,
+            "metadata": metadata or {},
+            "score": 1 - distance,
+        }
+        for doc_id, text, metadata, distance in zip(
+            results["ids"][0], results["documents"][0], results["metadatas"][0], results["distances"][0]
+        )
+    ]
+    return candidates, np.asarray(results["embeddings"][0], dtype=np.float32)
+
+
+class MMRRetriever:
+    def __init__(self, vector_store, k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5):
+        """
+        Diversity-aware retrieval for LangChain FAISS / Chroma stores
+
+        One index search returns fetch_k candidates together with their stored
+        vectors; mmr_select then picks k of them. The query is embedded once and
+        no candidate is re-embedded.
+
+        Args:
+            vector_store: LangChain FAISS or Chroma store
+            k: Documents returned
+            fetch_k: Candidates considered
+            lambda_mult: 1 = relevance only, 0 = diversity only
+        """
+        self.vector_store = vector_store
+        self.k = k
+        self.fetch_k = fetch_k
+        self.lambda_mult = lambda_mult
+
+    def search(self, query: str, k: int = None, lambda_mult: float = None):
+        """
+        Selected LangChain Documents; metadata gets relevance_score, mmr_score and mmr_rank
+        """
+        from langchain_core.documents import Document
+
+        query_embedding = np.asarray(self.vector_store.embeddings.embed_query(query), dtype=np.float32)
+        if hasattr(self.vector_store, "index_to_docstore_id"):
+            documents, embeddings = faiss_candidates(self.vector_store, query_embedding, self.fetch_k)
+        else:
+            candidates, embeddings = chroma_candidates(self.vector_store._collection, query_embedding, self.fetch_k)
+            documents = [Document(page_content=c["text"], metadata=c["metadata"]) for c in candidates]
+        if not documents:
+            return []
+
+        relevance = normalize_rows(embeddings) @ normalize_rows(query_embedding)[0]
+        selected = mmr_select(
+            embeddings,
+            query_embedding,
+            k=k or self.k,
+            lambda_mult=self.lambda_mult if lambda_mult is None else lambda_mult
+        )
+        # Copies: FAISS hands out the Documents held in its docstore
+        return [
+            Document(page_content=documents[i].page_content, metadata={
+                **(documents[i].metadata or {}),
+                "relevance_score": round(float(relevance[i]), 6),
+                "mmr_score": round(score, 6),
+                "mmr_rank": rank,
+            })
+            for rank, (i, score) in enumerate(selected, start=1)
+        ]
+
+    def as_retriever(self):
+        """
+        LangChain retriever (invoke/ainvoke), usable in create_retrieval_chain
+        """
+        from langchain_core.retrievers import BaseRetriever
+
+        mmr = self
+
+        class _MMRRetriever(BaseRetriever):
+            def _get_relevant_documents(self, query, *, run_manager=None):
+                return mmr.search(query)
+
+            async def _aget_relevant_documents(self, query, *, run_manager=None):
+                return await asyncio.to_thread(mmr.search, query)
+
+        return _MMRRetriever()
+
+
+def diversify(
+    items: List[Dict[str, Any]],
+    embeddings,
+    k: int,
+    lambda_mult: float = 0.7,
+    score_key: str = "score",
+) -> List[Dict[str, Any]]:
+    """
+    MMR over an already ranked list (after fusion or reranking), using its scores as
+    relevance; items get "mmr_score" and are returned in selection order
+    """
+    if len(items) <= 1:
+        return items[:k]
+    selected = mmr_select(
+        embeddings,
+        k=k,
+        lambda_mult=lambda_mult,
+        relevance=[item[score_key] for item in items]
+    )
+    result = []
+    for i, score in selected:
+        items[i]["mmr_score"] = score
+        result.append(items[i])
+    return result
@@ -0,0 +1,536 @@
+import argparse
+import os
+import queue
+import secrets
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag_core.tracing import get_tracer
+
+
+def _load_sentence_transformer(name: str, device: str):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(name, device=device)
+
+
+def _load_cross_encoder(name: str, device: str):
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(name, device=device)
+
+
+def _load_chroma(path: str, device: str):
+    import chromadb
+    return chromadb.PersistentClient(path=path)
+
+
+# Heavy libraries are only imported by these loaders, the first time a model of the kind is needed
+LOADERS: Dict[str, Callable[[str, str], Any]] = {
+    "sentence_transformer": _load_sentence_transformer,
+    "cross_encoder": _load_cross_encoder,
+    "chroma": _load_chroma,
+}
+
+# Kinds a model server can run for other processes (clients such as Chroma stay in-process)
+REMOTE_KINDS = ("sentence_transformer", "cross_encoder")
+
+# Shared secret of the server and its clients, created by the server on first start
+DEFAULT_AUTHKEY_FILE = os.path.join("~", ".cache", "rag_core", "model_server.key")
+
+
+def resolve_authkey(authkey: str = None, create: bool = False) -> bytes:
+    """
+    Key for the multiprocessing handshake: `authkey`, MODEL_SERVER_AUTHKEY, or the key
+    file (MODEL_SERVER_AUTHKEY_FILE, default ~/.cache/rag_core/model_server.key)
+
+    Requests are pickled, so anyone holding the key can run code in the server. There
+    is no built-in default: with `create` (the server) a random key is written to a
+    file only the owner can read; clients read that file.
+    """
+    authkey = authkey or os.getenv("MODEL_SERVER_AUTHKEY")
+    if authkey:
+        return authkey.encode("utf-8")
+
+    path = os.path.expanduser(os.getenv("MODEL_SERVER_AUTHKEY_FILE", DEFAULT_AUTHKEY_FILE))
+    if create and not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        try:
+            descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass  # Another server created it first
+        else:
+            with os.fdopen(descriptor, "w") as file:
+                file.write(secrets.token_hex(32))
+
+    if not os.path.exists(path):
+        raise ValueError(
+            f"No model server key: set MODEL_SERVER_AUTHKEY or start the server first to create {path}"
+        )
+    if os.name == "posix" and os.stat(path).st_mode & 0o077:
+        raise PermissionError(f"{path} is readable by other users; run chmod 600 on it")
+    with open(path, encoding="utf-8") as file:
+        key = file.read().strip()
+    if not key:
+        raise ValueError(f"{path} is empty")
+    return key.encode("utf-8")
+
+
+def parse_address(address: str):
+    """
+    "host:port" for TCP, anything else is a Unix socket path
+    """
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return host, int(port)
+    return address
+
+
+class DynamicBatcher:
+    def __init__(
+        self,
+        fn: Callable[[List[Any]], Any],
+        max_batch: int = 64,
+        max_wait_ms: float = 5.0,
+        name: str = "batcher",
+    ):
+        """
+        Runs fn(items) -> one result row per item on a background thread, merging the
+        items of requests that arrive within `max_wait_ms` of each other into one call
+
+        Args:
+            fn: Model call for a list of items (texts, (query, passage) pairs)
+            max_batch: Items per call; a larger single request still runs whole
+            max_wait_ms: How long the first request of a batch waits for company
+            name: Thread name and metrics label
+        """
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self.requests = 0
+        self.max_queue_depth = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Tuple[List[Any], Future]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name=name)
+        self._thread.start()
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Items waiting for a model call
+        """
+        return self._pending
+
+    def submit(self, items: List[Any]) -> Future:
+        """
+        Future resolving to an array with one row per item
+        """
+        future: Future = Future()
+        if not items:
+            future.set_result(np.zeros(0, dtype=np.float32))
+            return future
+        with self._lock:
+            self._pending += len(items)
+            self.max_queue_depth = max(self.max_queue_depth, self._pending)
+        self._queue.put((list(items), future))
+        return future
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "batches": self.batches,
+            "items": self.items,
+            "requests": self.requests,
+            "requests_per_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "items_per_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0][0])
+            deadline = time.perf_counter() + self.max_wait
+            while size < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            with self._lock:
+                self._pending -= size
+            items = [item for request_items, _ in batch for item in request_items]
+            try:
+                results = np.asarray(self.fn(items), dtype=np.float32)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(items)
+            self.requests += len(batch)
+            start = 0
+            for request_items, future in batch:
+                future.set_result(results[start:start + len(request_items)])
+                start += len(request_items)
+
+
+class ModelClient:
+    def __init__(self, address: str, authkey: str = None):
+        """
+        Connection to a ModelServer; one socket per calling thread
+        """
+        self.address = parse_address(address)
+        self.authkey = resolve_authkey(authkey)
+        self._local = threading.local()
+
+    def call(self, op: str, *args):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = Client(self.address, authkey=self.authkey)
+            self._local.connection = connection
+        try:
+            connection.send((op, args))
+            status, value = connection.recv()
+        except (EOFError, OSError):
+            # Server restarted: reconnect on the next call
+            self._local.connection = None
+            raise
+        if status == "error":
+            raise RuntimeError(f"Model server: {value}")
+        return value
+
+
+class ModelRegistry:
+    def __init__(self, server_address: str = None, loaders: Dict[str, Callable[[str, str], Any]] = None):
+        """
+        Loads each model once per process and hands out shared dynamic batchers
+
+        With `server_address`, encode/predict calls for REMOTE_KINDS go to a
+        ModelServer on this host instead, so several worker processes share one copy
+        of each model (and one batch queue).
+
+        Args:
+            server_address: "host:port" or socket path of a ModelServer (None: load in-process)
+            loaders: Extra or replacement loaders {kind: fn(name, device) -> model}
+        """
+        self.loaders = {**LOADERS, **(loaders or {})}
+        self.client = ModelClient(server_address) if server_address else None
+        self._models: Dict[Tuple[str, str, str], Future] = {}
+        self._info: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self._batchers: Dict[tuple, DynamicBatcher] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(kind: str, name: str, device: str) -> Tuple[str, str, str]:
+        # Same entry for "D:\\model\\BAAI-bge-m3" and "D:/model/BAAI-bge-m3"
+        return kind, name.replace("\\", "/").rstrip("/"), device
+
+    def is_remote(self, kind: str) -> bool:
+        return self.client is not None and kind in REMOTE_KINDS
+
+    def load(self, kind: str, name: str, device: str = "cpu"):
+        """
+        The model, loading it on this thread unless it is already loaded or loading
+        (then this waits for that load)
+        """
+        if kind not in self.loaders:
+            raise ValueError(f"Unknown model kind: {kind} (known: {', '.join(self.loaders)})")
+        key = self._key(kind, name, device)
+        with self._lock:
+            future = self._models.get(key)
+            owner = future is None
+            if owner:
+                future = self._models[key] = Future()
+        if owner:
+            self._run_load(key, name, future)
+        return future.result()
+
+    def warm_up(self, specs: Sequence[Tuple[str, ...]]) -> None:
+        """
+        Start loading models in the background, e.g. while the rest of a class initialises
+
+        Args:
+            specs: (kind, name) or (kind, name, device) tuples
+        """
+        for spec in specs:
+            kind, name, device = (*spec, "cpu")[:3]
+            if self.is_remote(kind):
+                target = lambda kind=kind, name=name, device=device: self.client.call("load", kind, name, device)
+            elif self._key(kind, name, device) in self._models:
+                continue
+            else:
+                target = lambda kind=kind, name=name, device=device: self.load(kind, name, device)
+            threading.Thread(target=self._quiet(target), daemon=True, name=f"warm-{kind}").start()
+
+    def batcher(
+        self,
+        kind: str,
+        name: str,
+        device: str = "cpu",
+        max_batch: int = 64,
+        max_wait_ms: float = 5.0,
+        **options,
+    ) -> DynamicBatcher:
+        """
+        Shared batcher for encode ("sentence_transformer", options: normalize_embeddings)
+        or predict ("cross_encoder") calls; the model loads on the first batch
+        """
+        key = (*self._key(kind, name, device), tuple(sorted(options.items())))
+        with self._lock:
+            batcher = self._batchers.get(key)
+            if batcher is None:
+                batcher = self._batchers[key] = DynamicBatcher(
+                    self._batch_fn(kind, name, device, max_batch, options),
+                    max_batch=max_batch,
+                    max_wait_ms=max_wait_ms,
+                    name=f"{kind}:{key[1].split('/')[-1]}"
+                )
+        return batcher
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Load time per model and queue depth / batch sizes per batcher (plus the
+        server's metrics when one is used)
+        """
+        with self._lock:
+            models = [dict(info) for info in self._info.values()]
+            loading = [f"{kind}:{name}" for (kind, name, device), future in self._models.items() if not future.done()]
+            batchers = {
+                f"{kind}:{name}" + (f" {dict(options)}" if options else ""): batcher.metrics()
+                for (kind, name, device, options), batcher in self._batchers.items()
+            }
+        metrics = {"models": models, "loading": loading, "batchers": batchers}
+        if self.client is not None:
+            try:
+                metrics["server"] = self.client.call("metrics")
+            except Exception as e:
+                metrics["server"] = {"error": str(e)}
+        return metrics
+
+    def _run_load(self, key: Tuple[str, str, str], name: str, future: Future) -> None:
+        kind, _, device = key
+        started = time.perf_counter()
+        try:
+            with get_tracer().span("model.load", kind=kind, model=key[1], device=device):
+                model = self.loaders[kind](name, device)
+        except Exception as e:
+            with self._lock:
+                # Forget the failed load so a later call can retry
+                self._models.pop(key, None)
+                self._info[key] = {"kind": kind, "name": key[1], "device": device, "error": str(e)}
+            future.set_exception(e)
+            return
+        seconds = time.perf_counter() - started
+        with self._lock:
+            self._info[key] = {
+                "kind": kind, "name": key[1], "device": device,
+                "load_seconds": round(seconds, 2), "loaded_at": time.time(),
+            }
+        future.set_result(model)
+
+    def _batch_fn(self, kind: str, name: str, device: str, max_batch: int, options: Dict[str, Any]):
+        if self.is_remote(kind):
+            op = "encode" if kind == "sentence_transformer" else "predict"
+            return lambda items: self.client.call(op, name, device, items, options)
+        if kind == "sentence_transformer":
+            return lambda texts: self.load(kind, name, device).encode(
+                texts, batch_size=max_batch, normalize_embeddings=options.get("normalize_embeddings", False),
+                convert_to_numpy=True, show_progress_bar=False
+            )
+        if kind == "cross_encoder":
+            return lambda pairs: self.load(kind, name, device).predict(pairs, batch_size=max_batch, show_progress_bar=False)
+        raise ValueError(f"No batched call for model kind: {kind}")
+
+    @staticmethod
+    def _quiet(target: Callable[[], Any]) -> Callable[[], None]:
+        def run() -> None:
+            try:
+                target()
+            except Exception as e:
+                # The error is raised again to whoever uses the model
+                print(f"⚠️  Warm-up failed: {e}")
+        return run
+
+
+class SharedModel:
+    def __init__(
+        self,
+        kind: str,
+        name: str,
+        device: str = "cpu",
+        registry: ModelRegistry = None,
+        max_batch: int = 64,
+        max_wait_ms: float = 5.0,
+    ):
+        """
+        Stand-in for a SentenceTransformer / CrossEncoder whose encode/predict calls go
+        through the registry's shared batcher (in-process or on the model server)
+
+        Constructing it loads nothing; other attributes (tokenizer, ...) load the
+        in-process model on first access and are not available from a server.
+        """
+        self.kind = kind
+        self.name = name
+        self.device = device
+        self.registry = registry or get_registry()
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+
+    @property
+    def model(self):
+        return self.registry.load(self.kind, self.name, self.device)
+
+    def encode(
+        self,
+        sentences,
+        batch_size: int = None,
+        normalize_embeddings: bool = False,
+        convert_to_numpy: bool = True,
+        show_progress_bar: bool = None,
+        **kwargs
+    ):
+        if kwargs or not convert_to_numpy:
+            # Tensors, prompts, ...: straight to the in-process model
+            return self.model.encode(
+                sentences, batch_size=batch_size or self.max_batch, normalize_embeddings=normalize_embeddings,
+                convert_to_numpy=convert_to_numpy, show_progress_bar=show_progress_bar, **kwargs
+            )
+        single = isinstance(sentences, str)
+        batcher = self.registry.batcher(
+            self.kind, self.name, self.device, self.max_batch, self.max_wait_ms,
+            normalize_embeddings=bool(normalize_embeddings)
+        )
+        vectors = batcher.submit([sentences] if single else list(sentences)).result()
+        return vectors[0] if single else vectors
+
+    def predict(self, pairs, batch_size: int = None, show_progress_bar: bool = None, **kwargs):
+        if kwargs:
+            return self.model.predict(pairs, batch_size=batch_size or self.max_batch, show_progress_bar=False, **kwargs)
+        return self.registry.batcher(self.kind, self.name, self.device, self.max_batch, self.max_wait_ms).submit(list(pairs)).result()
+
+    def __getattr__(self, name: str):
+        if name.startswith("__") or "registry" not in self.__dict__ or self.registry.is_remote(self.kind):
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+
+class ModelServer:
+    def __init__(self, address: str, registry: ModelRegistry = None, authkey: str = None):
+        """
+        Serves encode/predict calls of several processes on this host from one set of
+        models; requests from all clients share the registry's batchers
+        """
+        self.address = parse_address(address)
+        self.registry = registry or ModelRegistry()
+        self.authkey = resolve_authkey(authkey, create=True)
+        self.connections = 0
+        self._listener: Optional[Listener] = None
+
+    def start(self) -> "ModelServer":
+        """
+        Accept connections on a background thread
+        """
+        self._listener = Listener(self.address, authkey=self.authkey)
+        threading.Thread(target=self._accept, daemon=True, name="model-server").start()
+        print(f"🛰️  Model server listening on {self.address}")
+        return self
+
+    def serve_forever(self) -> None:
+        self.start()
+        threading.Event().wait()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                connection = self._listener.accept()
+            except Exception as e:
+                # Failed handshake (wrong authkey, dropped client): keep serving
+                print(f"⚠️  Rejected connection: {e}")
+                continue
+            self.connections += 1
+            threading.Thread(target=self._handle, args=(connection,), daemon=True).start()
+
+    def _handle(self, connection) -> None:
+        with connection:
+            while True:
+                try:
+                    op, args = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    connection.send(("ok", self._dispatch(op, args)))
+                except Exception as e:
+                    connection.send(("error", f"{type(e).__name__}: {e}"))
+
+    def _dispatch(self, op: str, args: tuple):
+        if op == "encode":
+            name, device, texts, options = args
+            return self.registry.batcher("sentence_transformer", name, device, **options).submit(texts).result()
+        if op == "predict":
+            name, device, pairs, options = args
+            return self.registry.batcher("cross_encoder", name, device, **options).submit(pairs).result()
+        if op == "load":
+            kind, name, device = args
+            self.registry.load(kind, name, device)
+            return True
+        if op == "metrics":
+            return {**self.registry.metrics(), "connections": self.connections}
+        raise ValueError(f"Unknown op: {op}")
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    """
+    Return the process-wide model registry
+
+    When MODEL_SERVER_ADDRESS is set ("host:port" or a socket path), embedding and
+    cross-encoder calls go to the model server started with
+    `python -m rag_core.model_registry --address ...`; both sides authenticate with
+    the key from resolve_authkey.
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry(os.getenv("MODEL_SERVER_ADDRESS") or None)
+    return _registry
+
+
+def get_chroma_client(path: str):
+    """
+    One chromadb.PersistentClient per path per process
+    """
+    return get_registry().load("chroma", os.path.abspath(path))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve embedding and cross-encoder models to local worker processes")
+    parser.add_argument("--address", default="127.0.0.1:8765", help="host:port or Unix socket path")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--embedder", action="append", default=[], help="SentenceTransformer to preload (repeatable)")
+    parser.add_argument("--cross-encoder", action="append", default=[], help="CrossEncoder to preload (repeatable)")
+    args = parser.parse_args()
+
+    server = ModelServer(args.address)
+    server.registry.warm_up(
+        [("sentence_transformer", name, args.device) for name in args.embedder]
+        + [("cross_encoder", name, args.device) for name in args.cross_encoder]
+    )
+    server.serve_forever()
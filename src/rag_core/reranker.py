@@ -0,0 +1,212 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag_core.embedding_cache import normalize_text
+from rag_core.index_manifest import text_hash
+from rag_core.model_registry import SharedModel, get_registry
+from rag_core.tracing import get_tracer
+
+FAST_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+ACCURATE_MODEL = "cross-encoder/ms-marco-MiniLM-L12-v2"
+DEFAULT_CASCADE = (FAST_MODEL, ACCURATE_MODEL)
+
+
+def load_cross_encoder(model_name: str, device: str = "cpu"):
+    """
+    One CrossEncoder per (model, device) per process (see ModelRegistry)
+    """
+    return get_registry().load("cross_encoder", model_name, device)
+
+
+class RerankService:
+    def __init__(
+        self,
+        models: Sequence[str] = DEFAULT_CASCADE,
+        device: str = "cpu",
+        max_passage_tokens: int = 256,
+        first_stage_keep: int = None,
+        cache_items: int = 50000,
+        batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+    ):
+        """
+        Cross-encoder reranking with a score cache, cross-request batching and an
+        optional cascade of models
+
+        Models come from the process-wide ModelRegistry: they start loading in the
+        background here, and every service using a model shares its batcher (and,
+        with MODEL_SERVER_ADDRESS, the model server's copy).
+
+        With several models, the first (cheap) model scores every candidate and only
+        the best `first_stage_keep` go on to the next model. The cascade only runs when
+        it cuts something; otherwise the last model scores all candidates directly.
+        Passages are cut to `max_passage_tokens` before scoring, and scores are cached
+        per (model, query, doc id, passage).
+
+        Args:
+            models: Model names from cheapest to most accurate
+            device: Torch device for the models
+            max_passage_tokens: Token budget per passage
+            first_stage_keep: Survivors of each earlier stage (default: max(2 * top_k, 10))
+            cache_items: Scores kept in the in-memory LRU cache
+            batch_size, max_wait_ms: See DynamicBatcher
+        """
+        self.models = list(models)
+        self.device = device
+        self.max_passage_tokens = max_passage_tokens
+        self.first_stage_keep = first_stage_keep
+        self.cache_items = cache_items
+        registry = get_registry()
+        registry.warm_up([("cross_encoder", name, device) for name in self.models])
+        self._batchers = {
+            name: registry.batcher("cross_encoder", name, device, batch_size, max_wait_ms) for name in self.models
+        }
+        self._scorer = SharedModel("cross_encoder", self.models[-1], device, registry=registry)
+        self._cache: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def rerank(
+        self,
+        query: str,
+        passages: List[str],
+        ids: Optional[List[str]] = None,
+        top_k: int = None,
+    ) -> Dict[str, Any]:
+        """
+        Rank passages for a query
+
+        Args:
+            query: User question
+            passages: Candidate texts
+            ids: Stable ids of the candidates (cache keys); defaults to the text
+            top_k: Number of results (None = all)
+
+        Returns:
+            Dict with "ranking" ([(passage index, score)], best first), "stages" (model,
+            candidates, cache_hits, seconds per stage) and "seconds"
+        """
+        started = time.perf_counter()
+        if not passages:
+            return {"ranking": [], "stages": [], "seconds": 0.0}
+
+        ids = ids or [""] * len(passages)
+        truncated = self._truncate(passages)
+        keep = self.first_stage_keep or max(2 * (top_k or 0), 10)
+        stages = self.models if top_k and len(passages) > keep else self.models[-1:]
+
+        candidates = list(range(len(passages)))
+        ranked: List[Tuple[int, float]] = []
+        timings = []
+        tracer = get_tracer()
+        for position, model_name in enumerate(stages):
+            t0 = time.perf_counter()
+            with tracer.span("rerank.stage", model=model_name, candidates=len(candidates)) as span:
+                scores, hits = self._score(model_name, query, [truncated[i] for i in candidates], [ids[i] for i in candidates])
+                span.set_attribute("cache_hits", hits)
+            ranked = sorted(zip(candidates, scores.tolist()), key=lambda item: item[1], reverse=True)
+            timings.append({
+                "model": model_name,
+                "candidates": len(candidates),
+                "cache_hits": hits,
+                "seconds": round(time.perf_counter() - t0, 4),
+            })
+            if position < len(stages) - 1:
+                candidates = [index for index, _ in ranked[:keep]]
+
+        return {
+            "ranking": ranked[:top_k] if top_k else ranked,
+            "stages": timings,
+            "seconds": round(time.perf_counter() - started, 4),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            stats = {
+                "cache_hits": self.hits,
+                "cache_misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "cached_scores": len(self._cache),
+            }
+        for name, batcher in self._batchers.items():
+            stats[name] = batcher.metrics()
+        return stats
+
+    def _truncate(self, passages: List[str]) -> List[str]:
+        """
+        Cut passages to the token budget at a token boundary, keeping the original text
+        """
+        # No tokenizer when the model runs on a model server
+        tokenizer = getattr(self._scorer, "tokenizer", None)
+        if tokenizer is None or not getattr(tokenizer, "is_fast", False):
+            # Rough budget of 4 characters per token
+            return [passage[:self.max_passage_tokens * 4] for passage in passages]
+
+        offsets = tokenizer(passages, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+        return [
+            passage[:spans[self.max_passage_tokens - 1][1]] if len(spans) > self.max_passage_tokens else passage
+            for passage, spans in zip(passages, offsets)
+        ]
+
+    def _score(self, model_name: str, query: str, passages: List[str], ids: List[str]) -> Tuple[np.ndarray, int]:
+        query_key = normalize_text(query)
+        keys = [
+            hashlib.sha1(f"{model_name}\0{query_key}\0{doc_id}\0{text_hash(passage)}".encode("utf-8")).hexdigest()
+            for passage, doc_id in zip(passages, ids)
+        ]
+
+        scores = np.zeros(len(passages), dtype=np.float32)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is None:
+                    missing.append(i)
+                else:
+                    self._cache.move_to_end(key)
+                    scores[i] = cached
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            computed = self._batchers[model_name].submit([(query, passages[i]) for i in missing]).result()
+            scores[missing] = computed
+            with self._lock:
+                for i, score in zip(missing, computed.tolist()):
+                    self._cache[keys[i]] = score
+                while len(self._cache) > self.cache_items:
+                    self._cache.popitem(last=False)
+
+        return scores, len(keys) - len(missing)
+
+
+_services: Dict[Tuple[Tuple[str, ...], str], RerankService] = {}
+_services_lock = threading.Lock()
+
+
+def get_reranker(models: Sequence[str] = DEFAULT_CASCADE, device: str = "cpu") -> RerankService:
+    """
+    Return the process-wide rerank service for a model cascade
+
+    Concurrent callers share its batchers and score cache; the passage budget and
+    cache size come from RERANK_MAX_PASSAGE_TOKENS and RERANK_CACHE_ITEMS.
+    """
+    key = (tuple(models), device)
+    if key not in _services:
+        with _services_lock:
+            if key not in _services:
+                _services[key] = RerankService(
+                    models,
+                    device=device,
+                    max_passage_tokens=int(os.getenv("RERANK_MAX_PASSAGE_TOKENS", "256")),
+                    cache_items=int(os.getenv("RERANK_CACHE_ITEMS", "50000"))
+                )
+    return _services[key]
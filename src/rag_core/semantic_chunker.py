@@ -0,0 +1,190 @@
+import re
+import warnings
+from collections import deque
+from typing import Callable, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+
+# Thai (U+0E00-0E7F) and Lao (U+0E80-0EFF) write sentences without punctuation and use
+# a space between sentences/phrases; latin-style terminators only count before whitespace
+_THAI_LAO = "\u0e00-\u0eff"
+_SENTENCE_BREAK = re.compile(
+    r"(?<=[.!?\u2026\u3002])\s+"                                # . ! ? … followed by whitespace (not 3.14)
+    r"|(?<=[\u0e5a\u0e5b])\s*"                                  # Thai angkhankhu / khomut end a passage
+    rf"|(?<=[{_THAI_LAO}])[ \t\u00a0\u200b]+(?=[{_THAI_LAO}])"  # space between Thai/Lao words
+    r"|\s*\n\s*"                                                # line breaks
+)
+
+
+def split_sentences(text: str, min_chars: int = 20) -> List[str]:
+    """
+    Split text into sentences, handling Lao/Thai as well as latin punctuation
+
+    Lao/Thai spaces separate phrases as well as sentences, so pieces shorter than
+    `min_chars` are merged into the following piece.
+    """
+    sentences = []
+    pending = ""
+    for piece in _SENTENCE_BREAK.split(text):
+        piece = piece.strip()
+        if not piece:
+            continue
+        pending = f"{pending} {piece}" if pending else piece
+        if len(pending) >= min_chars:
+            sentences.append(pending)
+            pending = ""
+    if pending:
+        if sentences and len(pending) < min_chars:
+            sentences[-1] = f"{sentences[-1]} {pending}"
+        else:
+            sentences.append(pending)
+    return sentences
+
+
+def adjacent_similarities(embeddings: np.ndarray, previous: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Cosine similarity of every row with the row before it, in one vectorised pass
+
+    The first entry compares against `previous` (the last row of the preceding
+    window), or is NaN when there is none.
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.maximum(norms, 1e-12)
+    if previous is not None:
+        vectors = np.vstack([previous[None, :], vectors])
+    similarities = np.einsum("ij,ij->i", vectors[1:], vectors[:-1])
+    if previous is None:
+        similarities = np.concatenate(([np.nan], similarities))
+    return similarities
+
+
+class SemanticChunker:
+    def __init__(
+        self,
+        embedder,
+        threshold: float = 0.6,
+        percentile: float = None,
+        window: int = None,
+        max_tokens: int = 512,
+        token_counter: Callable[[List[str]], List[int]] = None,
+        min_sentence_chars: int = 20,
+        batch_sentences: int = 256,
+    ):
+        """
+        Semantic chunking: start a new chunk where adjacent sentences stop being similar
+
+        Sentences are embedded `batch_sentences` at a time and all adjacent
+        similarities of a batch come from one NumPy operation. Only one batch of
+        embeddings is held at a time, so long documents can be streamed.
+
+        Args:
+            embedder: Anything with SentenceTransformer-style encode(list) -> ndarray
+            threshold: Fixed similarity below which a chunk is cut
+            percentile: Instead of `threshold`, cut where similarity falls below this
+                percentile (0-100) of the surrounding similarities
+            window: Number of recent similarities the percentile is taken over
+                (None: the current batch)
+            max_tokens: Hard token budget per chunk; a single longer sentence becomes its own chunk
+            token_counter: Token counts for a list of sentences (defaults to the embedder's tokenizer)
+            min_sentence_chars: Shorter Lao/Thai phrases are merged into the next one
+            batch_sentences: Sentences embedded per model call
+        """
+        self.embedder = embedder
+        self.threshold = threshold
+        self.percentile = percentile
+        self.window = window
+        self.max_tokens = max_tokens
+        self.token_counter = token_counter or self._default_token_counter(embedder)
+        self.min_sentence_chars = min_sentence_chars
+        self.batch_sentences = batch_sentences
+
+    def split(self, text: str) -> List[str]:
+        """
+        Chunk one text
+        """
+        return list(self.iter_chunks(text))
+
+    def iter_chunks(self, source: Union[str, Iterable[str]]) -> Iterator[str]:
+        """
+        Yield chunks from a text, or from an iterable of text blocks (pages, lines)
+        read lazily one after another
+        """
+        current: List[str] = []
+        current_tokens = 0
+        previous = None
+        history: deque = deque(maxlen=max(self.window - 1, 0) if self.window else 0)
+
+        for batch in self._sentence_batches(source):
+            embeddings = np.asarray(self.embedder.encode(batch), dtype=np.float32)
+            similarities = adjacent_similarities(embeddings, previous)
+            cuts = similarities < self._thresholds(similarities, history)
+            token_counts = self.token_counter(batch)
+
+            for sentence, cut, tokens in zip(batch, cuts, token_counts):
+                if current and (cut or current_tokens + tokens > self.max_tokens):
+                    yield " ".join(current)
+                    current, current_tokens = [], 0
+                current.append(sentence)
+                current_tokens += tokens
+
+            last = embeddings[-1]
+            previous = last / max(float(np.linalg.norm(last)), 1e-12)
+
+        if current:
+            yield " ".join(current)
+
+    def split_documents(self, docs):
+        """
+        Chunk LangChain Documents, keeping each document's metadata
+        """
+        from langchain.schema import Document
+
+        result = []
+        for doc in docs:
+            for i, chunk in enumerate(self.iter_chunks(doc.page_content)):
+                result.append(Document(page_content=chunk, metadata={**(doc.metadata or {}), "semantic_chunk": i}))
+        return result
+
+    def _sentence_batches(self, source: Union[str, Iterable[str]]) -> Iterator[List[str]]:
+        blocks = [source] if isinstance(source, str) else source
+        batch: List[str] = []
+        for block in blocks:
+            for sentence in split_sentences(block, self.min_sentence_chars):
+                batch.append(sentence)
+                if len(batch) >= self.batch_sentences:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def _thresholds(self, similarities: np.ndarray, history: deque) -> np.ndarray:
+        if self.percentile is None:
+            return np.full(len(similarities), self.threshold, dtype=np.float32)
+
+        if not self.window:
+            valid = similarities[~np.isnan(similarities)]
+            value = np.percentile(valid, self.percentile) if len(valid) else -np.inf
+            return np.full(len(similarities), value, dtype=np.float32)
+
+        # Rolling percentile: each position looks at the `window` similarities ending at it,
+        # including those carried over from the previous batch
+        carried = np.array(history, dtype=np.float32)
+        padded = np.concatenate((np.full(self.window - 1 - len(carried), np.nan), carried, similarities))
+        windows = np.lib.stride_tricks.sliding_window_view(padded, self.window)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN rows at the very start
+            thresholds = np.nanpercentile(windows, self.percentile, axis=1)
+        history.extend(similarities.tolist())
+        return np.nan_to_num(thresholds, nan=-np.inf)
+
+    @staticmethod
+    def _default_token_counter(embedder) -> Callable[[List[str]], List[int]]:
+        tokenizer = getattr(embedder, "tokenizer", None)
+        if tokenizer is not None:
+            def count(sentences: List[str]) -> List[int]:
+                return [len(ids) for ids in tokenizer(sentences, add_special_tokens=False)["input_ids"]]
+            return count
+
+        # No tokenizer: about 3 characters per token, a cautious estimate for Lao script
+        return lambda sentences: [max(1, len(sentence) // 3) for sentence in sentences]
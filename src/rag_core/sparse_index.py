@@ -0,0 +1,337 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from scipy import sparse
+
+from rag_core.index_manifest import metadata_hash, text_hash
+
+CREATE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS bm25_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bm25_docs (
+        row INTEGER PRIMARY KEY,
+        id TEXT NOT NULL UNIQUE,
+        text_hash TEXT NOT NULL,
+        metadata_hash TEXT NOT NULL,
+        length INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        metadata TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bm25_terms (
+        term_id INTEGER PRIMARY KEY,
+        term TEXT NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bm25_postings (
+        row INTEGER NOT NULL,
+        term_id INTEGER NOT NULL,
+        tf INTEGER NOT NULL,
+        PRIMARY KEY (row, term_id)
+    ) WITHOUT ROWID
+    """,
+]
+
+# Lao/Thai runs are matched first: their vowel and tone marks are not \w
+_TOKEN = re.compile(r"[\u0e00-\u0eff]+|\w+")
+_LAO_THAI = re.compile(r"[\u0e00-\u0eff]")
+
+
+def _dump(metadata: Optional[dict]) -> str:
+    return json.dumps(metadata or {}, ensure_ascii=False, default=str)
+
+
+def _clusters(run: str) -> List[str]:
+    """
+    Group each base letter with the vowel/tone marks written on it (one syllable part)
+    """
+    clusters: List[str] = []
+    for char in run:
+        if clusters and unicodedata.category(char).startswith("M"):
+            clusters[-1] += char
+        else:
+            clusters.append(char)
+    return clusters
+
+
+def tokenize(text: str, tokenizer: str = "bigram") -> List[str]:
+    """
+    BM25 terms for mixed Lao/Thai/latin text
+
+    Latin words and numbers are lower-cased words. Lao and Thai are written without
+    spaces between words, so their runs become overlapping bigrams of letter
+    clusters ("bigram"), or words from laonlp's dictionary segmenter ("laonlp").
+    """
+    text = unicodedata.normalize("NFC", text).lower()
+    if tokenizer == "laonlp":
+        from laonlp.tokenize import word_tokenize
+
+    terms: List[str] = []
+    for token in _TOKEN.findall(text):
+        if not _LAO_THAI.match(token):
+            terms.append(token)
+        elif tokenizer == "laonlp":
+            terms.extend(word.strip() for word in word_tokenize(token) if word.strip())
+        else:
+            clusters = _clusters(token)
+            if len(clusters) == 1:
+                terms.append(clusters[0])
+            else:
+                terms.extend(a + b for a, b in zip(clusters, clusters[1:]))
+    return terms
+
+
+class BM25Index:
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75, tokenizer: str = "bigram"):
+        """
+        Persistent BM25 inverted index in SQLite, kept next to a Chroma/FAISS store
+
+        Documents are added, replaced and deleted by id, so the index follows the
+        vector store incrementally (it has the same add/update_metadata/delete/persist
+        methods as the store writers and can be passed to IngestionPipeline). Searches
+        use a sparse document x term matrix of precomputed BM25 weights, rebuilt from
+        the postings only after the index changed.
+
+        Args:
+            path: SQLite file for the index
+            k1, b: BM25 parameters
+            tokenizer: "bigram" (no extra dependency) or "laonlp"; see tokenize()
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.tokenizer = tokenizer
+        self.config = json.dumps({"tokenizer": tokenizer}, sort_keys=True)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._matrix = None
+        self._rows = None
+        self._terms: Dict[str, int] = {}
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        for statement in CREATE_TABLES:
+            self._db.execute(statement)
+        self._db.commit()
+
+        row = self._db.execute("SELECT value FROM bm25_meta WHERE key = 'config'").fetchone()
+        if row is None or row[0] != self.config:
+            if row is not None:
+                print(f"⚠️  BM25 tokenizer changed; clearing {path}")
+            self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            for table in ("bm25_postings", "bm25_terms", "bm25_docs"):
+                self._db.execute(f"DELETE FROM {table}")
+            self._db.execute("INSERT OR REPLACE INTO bm25_meta (key, value) VALUES ('config', ?)", (self.config,))
+            self._db.commit()
+            self._matrix = None
+
+    def add(
+        self,
+        ids: List[str],
+        texts: List[str],
+        embeddings: Optional[List[List[float]]] = None,
+        metadatas: Optional[List[dict]] = None,
+    ) -> int:
+        """
+        Insert or replace documents by id (embeddings are accepted and ignored, to match
+        the store writers). Documents whose text and metadata are unchanged are skipped.
+
+        Returns:
+            Number of documents written
+        """
+        metadatas = metadatas or [{} for _ in ids]
+        with self._lock:
+            stored = {}
+            for i in range(0, len(ids), 500):
+                part = ids[i:i + 500]
+                stored.update((row[0], row[1:]) for row in self._db.execute(
+                    f"SELECT id, row, text_hash, metadata_hash FROM bm25_docs WHERE id IN ({','.join('?' * len(part))})",
+                    part
+                ))
+
+            written = 0
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                hashed_text, hashed_metadata = text_hash(text), metadata_hash(metadata or {})
+                previous = stored.get(doc_id)
+                if previous is not None:
+                    row, old_text, old_metadata = previous
+                    if old_text == hashed_text:
+                        if old_metadata != hashed_metadata:
+                            self._db.execute(
+                                "UPDATE bm25_docs SET metadata = ?, metadata_hash = ? WHERE row = ?",
+                                (_dump(metadata), hashed_metadata, row)
+                            )
+                        continue
+                    self._delete_rows([row])
+
+                terms = tokenize(text, self.tokenizer)
+                cursor = self._db.execute(
+                    "INSERT INTO bm25_docs (id, text_hash, metadata_hash, length, text, metadata) VALUES (?, ?, ?, ?, ?, ?)",
+                    (doc_id, hashed_text, hashed_metadata, len(terms), text, _dump(metadata))
+                )
+                stored[doc_id] = (cursor.lastrowid, hashed_text, hashed_metadata)
+                counts: Dict[str, int] = {}
+                for term in terms:
+                    counts[term] = counts.get(term, 0) + 1
+                self._db.executemany("INSERT OR IGNORE INTO bm25_terms (term) VALUES (?)", [(t,) for t in counts])
+                term_ids = self._term_ids(list(counts))
+                self._db.executemany(
+                    "INSERT INTO bm25_postings (row, term_id, tf) VALUES (?, ?, ?)",
+                    [(cursor.lastrowid, term_ids[term], tf) for term, tf in counts.items()]
+                )
+                written += 1
+
+            if written:
+                self._matrix = None
+        return written
+
+    def add_documents(self, documents, ids: Optional[List[str]] = None) -> int:
+        """
+        Add LangChain Documents; without ids, a document is identified by its text
+        """
+        ids = ids or [getattr(doc, "id", None) or text_hash(doc.page_content)[:24] for doc in documents]
+        return self.add(ids, [doc.page_content for doc in documents], metadatas=[doc.metadata for doc in documents])
+
+    def update_metadata(self, ids: List[str], metadatas: List[dict]) -> None:
+        with self._lock:
+            self._db.executemany(
+                "UPDATE bm25_docs SET metadata = ?, metadata_hash = ? WHERE id = ?",
+                [(_dump(metadata), metadata_hash(metadata or {}), doc_id)
+                 for doc_id, metadata in zip(ids, metadatas)]
+            )
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock:
+            rows = []
+            for i in range(0, len(ids), 500):
+                part = ids[i:i + 500]
+                rows.extend(row for (row,) in self._db.execute(
+                    f"SELECT row FROM bm25_docs WHERE id IN ({','.join('?' * len(part))})", part
+                ))
+            if rows:
+                self._delete_rows(rows)
+                self._matrix = None
+
+    def persist(self) -> None:
+        with self._lock:
+            self._db.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM bm25_docs").fetchone()[0]
+
+    def ids(self) -> set:
+        with self._lock:
+            return {row[0] for row in self._db.execute("SELECT id FROM bm25_docs")}
+
+    def search(self, query: str, k: int = 4) -> List[Dict[str, Any]]:
+        """
+        Top-k documents by BM25 score
+
+        Returns:
+            List of dicts with id, text, metadata and score, best first
+        """
+        with self._lock:
+            if self._matrix is None:
+                self._load()
+            matrix, rows = self._matrix, self._rows
+
+            counts: Dict[int, int] = {}
+            for term in tokenize(query, self.tokenizer):
+                term_id = self._terms.get(term)
+                if term_id is not None:
+                    counts[term_id] = counts.get(term_id, 0) + 1
+            if not counts or matrix.shape[0] == 0:
+                return []
+
+            # One sparse product: documents x query terms, times each term's count in the query
+            columns = np.fromiter(counts.keys(), dtype=np.int64)
+            weights = np.fromiter(counts.values(), dtype=np.float32)
+            scores = np.asarray(matrix[:, columns] @ weights).ravel()
+
+            k = min(k, int(np.count_nonzero(scores)))
+            if k == 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            found = {
+                row: (doc_id, text, metadata)
+                for row, doc_id, text, metadata in self._db.execute(
+                    f"SELECT row, id, text, metadata FROM bm25_docs WHERE row IN ({','.join('?' * k)})",
+                    [int(rows[i]) for i in top]
+                )
+            }
+        results = []
+        for i in top:
+            doc_id, text, metadata = found[int(rows[i])]
+            results.append({"id": doc_id, "text": text, "metadata": json.loads(metadata), "score": float(scores[i])})
+        return results
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+    def _term_ids(self, terms: List[str]) -> Dict[str, int]:
+        term_ids = {}
+        for i in range(0, len(terms), 500):
+            part = terms[i:i + 500]
+            term_ids.update(self._db.execute(
+                f"SELECT term, term_id FROM bm25_terms WHERE term IN ({','.join('?' * len(part))})", part
+            ))
+        return term_ids
+
+    def _delete_rows(self, rows: List[int]) -> None:
+        for i in range(0, len(rows), 500):
+            part = rows[i:i + 500]
+            marks = ",".join("?" * len(part))
+            self._db.execute(f"DELETE FROM bm25_postings WHERE row IN ({marks})", part)
+            self._db.execute(f"DELETE FROM bm25_docs WHERE row IN ({marks})", part)
+
+    def _load(self) -> None:
+        """
+        Build the CSC matrix of BM25 weights (rows: documents, columns: term ids)
+        """
+        docs = np.array(self._db.execute("SELECT row, length FROM bm25_docs ORDER BY row").fetchall(), dtype=np.int64)
+        self._terms = dict(self._db.execute("SELECT term, term_id FROM bm25_terms"))
+        n_terms = max(self._terms.values(), default=0) + 1
+        if len(docs) == 0:
+            self._rows = np.zeros(0, dtype=np.int64)
+            self._matrix = sparse.csc_matrix((0, n_terms), dtype=np.float32)
+            return
+
+        rows, lengths = docs[:, 0], docs[:, 1].astype(np.float32)
+        postings = np.array(self._db.execute("SELECT row, term_id, tf FROM bm25_postings").fetchall(), dtype=np.int64)
+        postings = postings.reshape(-1, 3)
+        positions = np.searchsorted(rows, postings[:, 0])
+        term_ids, tf = postings[:, 1], postings[:, 2].astype(np.float32)
+
+        n_docs = len(rows)
+        df = np.bincount(term_ids, minlength=n_terms).astype(np.float32)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+        average_length = max(float(lengths.mean()), 1.0)
+        norm = self.k1 * (1 - self.b + self.b * lengths[positions] / average_length)
+        weights = idf[term_ids] * tf * (self.k1 + 1) / (tf + norm)
+
+        self._rows = rows
+        self._matrix = sparse.csc_matrix((weights, (positions, term_ids)), shape=(n_docs, n_terms), dtype=np.float32)
@@ -0,0 +1,265 @@
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from rag_core.tracing import NOOP_SPAN, get_tracer
+
+
+def chunk_text(chunk: Any) -> str:
+    """
+    Text of one streamed chunk: a plain string (Anthropic text_stream), a LangChain
+    message chunk (str or content blocks) or an OpenAI-style chunk (Groq)
+    """
+    if chunk is None:
+        return ""
+    if isinstance(chunk, str):
+        return chunk
+    choices = getattr(chunk, "choices", None)
+    if choices:
+        return getattr(choices[0].delta, "content", None) or ""
+    content = getattr(chunk, "content", "")
+    if isinstance(content, list):
+        return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+    return content or ""
+
+
+class TokenTimer:
+    def __init__(self, model: str = "", span=NOOP_SPAN):
+        """
+        Time to first token and total time of one streamed LLM answer
+
+        The first non-empty chunk is observed in the llm_time_to_first_token_seconds
+        histogram (per model); finish() writes llm.ttft_ms / llm.stream_ms on the span.
+        checkpoint() records further milestones (e.g. when a JSON field closed).
+        """
+        self.model = model
+        self.span = span
+        self.started = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.chunks = 0
+        self.checkpoints: Dict[str, float] = {}
+
+    def mark(self, text: str) -> None:
+        if not text:
+            return
+        self.chunks += 1
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            tracer = getattr(self.span, "tracer", None) or get_tracer()
+            tracer.observe_ttft(self.first_token_at - self.started, self.model)
+
+    def checkpoint(self, name: str) -> None:
+        """
+        Milliseconds since the request started, reported as <name>_ms
+        """
+        self.checkpoints[name] = round((time.perf_counter() - self.started) * 1000, 1)
+        self.span.set_attribute(f"llm.{name}_ms", self.checkpoints[name])
+
+    def finish(self) -> Dict[str, Optional[float]]:
+        self.finished_at = time.perf_counter()
+        stats = self.stats()
+        self.span.set_attributes(**{"llm.ttft_ms": stats["ttft_ms"], "llm.stream_ms": stats["total_ms"],
+                                    "llm.chunks": self.chunks})
+        return stats
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """
+        {"ttft_ms", "total_ms", "<checkpoint>_ms"...} (ttft_ms is None when nothing arrived)
+        """
+        end = self.finished_at or time.perf_counter()
+        ttft = None if self.first_token_at is None else round((self.first_token_at - self.started) * 1000, 1)
+        stats = {"ttft_ms": ttft, "total_ms": round((end - self.started) * 1000, 1)}
+        stats.update((f"{name}_ms", value) for name, value in self.checkpoints.items())
+        return stats
+
+
+def timed_stream(chunks: Iterable[Any], timer: TokenTimer) -> Iterator[str]:
+    """
+    Text of each chunk, timed by `timer` (finished when the stream ends or is closed)
+    """
+    try:
+        for chunk in chunks:
+            text = chunk_text(chunk)
+            timer.mark(text)
+            if text:
+                yield text
+    finally:
+        timer.finish()
+
+
+async def atimed_stream(chunks: AsyncIterable[Any], timer: TokenTimer) -> AsyncIterator[str]:
+    """
+    Async variant of timed_stream
+    """
+    try:
+        async for chunk in chunks:
+            text = chunk_text(chunk)
+            timer.mark(text)
+            if text:
+                yield text
+    finally:
+        timer.finish()
+
+
+class JsonFieldStream:
+    _ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+    def __init__(self):
+        """
+        Incremental reader for the string fields of a streamed JSON object
+
+        Text before the first "{" (preamble, code fences) is skipped. Each feed()
+        returns the fields whose value grew, so a caller can act on a field as soon
+        as its closing quote arrives instead of waiting for the whole answer.
+        Non-string values are skipped; nested objects are not descended into.
+        """
+        self.values: Dict[str, str] = {}
+        self.complete: Dict[str, bool] = {}
+        self._state = "seek"
+        self._key: List[str] = []
+        self._value: List[str] = []
+        self._escape: Optional[str] = None
+        self._nesting = 0
+        self._in_string = False
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, text: str) -> List[Tuple[str, str, bool]]:
+        """
+        Consume a chunk
+
+        Returns:
+            [(field, value so far, complete)] for every string field that changed
+        """
+        changed: Dict[str, None] = {}
+        for char in text:
+            state = self._state
+            if state == "seek":
+                if char == "{":
+                    self._state = "key"
+            elif state == "key":
+                if char == '"':
+                    self._key = []
+                    self._state = "in_key"
+                elif char == "}":
+                    self._state = "done"
+            elif state == "in_key":
+                if self._escape is not None:
+                    decoded = self._decode_escape(char)
+                    if decoded is not None:
+                        self._key.append(decoded)
+                elif char == "\\":
+                    self._escape = ""
+                elif char == '"':
+                    self._state = "colon"
+                else:
+                    self._key.append(char)
+            elif state == "colon":
+                if char == ":":
+                    self._state = "value"
+            elif state == "value":
+                if char == '"':
+                    self._value = []
+                    self._state = "in_value"
+                    name = "".join(self._key)
+                    self.values[name] = ""
+                    self.complete[name] = False
+                elif not char.isspace():
+                    self._nesting = 1 if char in "{[" else 0
+                    self._in_string = False
+                    self._state = "other"
+                    if char == "}":
+                        self._state = "done"
+            elif state == "in_value":
+                name = "".join(self._key)
+                if self._escape is not None:
+                    decoded = self._decode_escape(char)
+                    if decoded is not None:
+                        self._value.append(decoded)
+                elif char == "\\":
+                    self._escape = ""
+                elif char == '"':
+                    self.values[name] = "".join(self._value)
+                    self.complete[name] = True
+                    self._state = "key"
+                else:
+                    self._value.append(char)
+                changed[name] = None
+            elif state == "other":
+                self._skip_other(char)
+        if self._state == "in_value":
+            self.values["".join(self._key)] = "".join(self._value)
+        return [(name, self.values[name], self.complete[name]) for name in changed]
+
+    def _decode_escape(self, char: str) -> Optional[str]:
+        """
+        Next character of an escape sequence; the decoded text once it is complete
+        """
+        self._escape += char
+        if self._escape[0] == "u":
+            if len(self._escape) < 5:
+                return None
+            code, self._escape = self._escape[1:], None
+            try:
+                return chr(int(code, 16))
+            except ValueError:
+                return ""
+        escape, self._escape = self._escape, None
+        return self._ESCAPES.get(escape, escape)
+
+    def _skip_other(self, char: str) -> None:
+        # Numbers, literals, arrays and objects: skipped up to the next top-level , or }
+        if self._in_string:
+            if self._escape is not None:
+                self._escape = None
+            elif char == "\\":
+                self._escape = ""
+            elif char == '"':
+                self._in_string = False
+        elif char == '"':
+            self._in_string = True
+        elif char in "{[":
+            self._nesting += 1
+        elif char in "}]" and self._nesting:
+            self._nesting -= 1
+        elif char == "," and not self._nesting:
+            self._state = "key"
+        elif char == "}" and not self._nesting:
+            self._state = "done"
+
+
+class MarkdownStream:
+    def __init__(self, interval: float = 0.1, cursor: str = " ▌"):
+        """
+        Progressive rendering of a streamed answer in a notebook: one display handle,
+        updated at most every `interval` seconds so long answers do not flood the frontend
+
+            view = MarkdownStream()
+            for text in stream: view.append(text)
+            view.finish()
+        """
+        from IPython.display import Markdown, display
+
+        self._markdown = Markdown
+        self.text = ""
+        self.interval = interval
+        self.cursor = cursor
+        self._last_update = 0.0
+        self._handle = display(Markdown("⏳"), display_id=True)
+
+    def append(self, text: str) -> None:
+        self.text += text
+        now = time.perf_counter()
+        if now - self._last_update >= self.interval:
+            self._last_update = now
+            self._handle.update(self._markdown(self.text + self.cursor))
+
+    def finish(self, text: str = None) -> None:
+        """
+        Final render without the cursor (optionally replacing the text, e.g. with an error message)
+        """
+        if text is not None:
+            self.text = text
+        self._handle.update(self._markdown(self.text))
@@ -0,0 +1,574 @@
+import asyncio
+import functools
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds; covers a cache hit up to a slow LLM answer
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("rag_current_span", default=None)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        """
+        Prometheus-style counter with a fixed set of label names
+        """
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1.0, **labels) -> None:
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            return [(self.name, dict(zip(self.labels, key)), value) for key, value in self._values.items()]
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """
+        Prometheus-style histogram (cumulative buckets, _sum and _count per label set)
+        """
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], List[float]] = {}  # bucket counts..., +Inf count, sum
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += 1
+            row[-1] += value
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            rows = {key: list(row) for key, row in self._values.items()}
+        samples = []
+        for key, row in rows.items():
+            labels = dict(zip(self.labels, key))
+            for bound, count in zip(self.buckets, row):
+                samples.append((f"{self.name}_bucket", {**labels, "le": repr(float(bound))}, count))
+            samples.append((f"{self.name}_bucket", {**labels, "le": "+Inf"}, row[-2]))
+            samples.append((f"{self.name}_count", labels, row[-2]))
+            samples.append((f"{self.name}_sum", labels, row[-1]))
+        return samples
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Count, total and mean seconds per label set (label values joined with "/")
+        """
+        with self._lock:
+            return {
+                "/".join(key): {"count": int(row[-2]), "total": row[-1], "mean": row[-1] / row[-2] if row[-2] else 0.0}
+                for key, row in self._values.items()
+            }
+
+
+class MetricsRegistry:
+    def __init__(self, namespace: str = "rag"):
+        """
+        Counters and histograms rendered in the Prometheus text exposition format
+        """
+        self.namespace = namespace
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._get(name, lambda full: Counter(full, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(name, lambda full: Histogram(full, help_text, labels, buckets))
+
+    def _get(self, name: str, create: Callable[[str], Any]):
+        full = f"{self.namespace}_{name}" if self.namespace else name
+        with self._lock:
+            if full not in self._metrics:
+                self._metrics[full] = create(full)
+            return self._metrics[full]
+
+    def render(self) -> str:
+        """
+        All metrics as Prometheus text (the body of a /metrics response)
+        """
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            kind = "counter" if isinstance(metric, Counter) else "histogram"
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {kind}")
+            for name, labels, value in metric.samples():
+                label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                number = int(value) if float(value).is_integer() else value
+                lines.append(f"{name}{{{label_text}}} {number}" if label_text else f"{name} {number}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """
+        Serve GET /metrics for a Prometheus scraper on a daemon thread
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"📈 Metrics at http://{host}:{port}/metrics")
+        return server
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Span:
+    __slots__ = ("tracer", "name", "parent", "depth", "trace_id", "span_id", "attributes", "events",
+                 "start_ns", "end_ns", "status", "error", "_token", "_otel")
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict[str, Any], parent: Optional["Span"]):
+        self.tracer = tracer
+        self.name = name
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent else 0
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.attributes = attributes
+        self.events: List[Dict[str, Any]] = []
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = "OK"
+        self.error = None
+        self._token = None
+        self._otel = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, **attributes) -> None:
+        self.events.append({"name": name, "timeUnixNano": time.time_ns(), "attributes": attributes})
+
+    def record_error(self, error: BaseException) -> None:
+        """
+        Mark the span failed for an exception the code handles itself (not re-raised)
+        """
+        self.status = "ERROR"
+        self.error = f"{type(error).__name__}: {error}"
+
+    def record_usage(self, usage: Any, model: str = None) -> Dict[str, int]:
+        """
+        Token counts of an LLM call as span attributes and counters; accepts an
+        Anthropic/Groq/OpenAI response or its usage, or a LangChain AIMessage
+
+        Returns:
+            {"input_tokens": ..., "output_tokens": ...} (empty when no usage was found)
+        """
+        tokens = token_usage(usage)
+        model = model or self.attributes.get("llm.model", "")
+        if tokens:
+            # Summed, so one span can cover a batch of calls
+            self.attributes["llm.input_tokens"] = self.attributes.get("llm.input_tokens", 0) + tokens["input_tokens"]
+            self.attributes["llm.output_tokens"] = self.attributes.get("llm.output_tokens", 0) + tokens["output_tokens"]
+            self.tracer.llm_tokens.inc(tokens["input_tokens"], model=model, type="input")
+            self.tracer.llm_tokens.inc(tokens["output_tokens"], model=model, type="output")
+        return tokens
+
+    @property
+    def duration(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc is not None:
+            self.status = "ERROR"
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self.tracer._end(self)
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        The span with OTLP/JSON field names (one JSONL line)
+        """
+        status = {"code": "STATUS_CODE_ERROR", "message": self.error} if self.status == "ERROR" else {"code": "STATUS_CODE_OK"}
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent.span_id if self.parent else "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "events": self.events,
+            "status": status,
+            "resource": {"service.name": self.tracer.service_name},
+        }
+
+
+class _NoopSpan:
+    """
+    Returned by a disabled tracer: every method does nothing, so instrumented code
+    costs one attribute check and a no-op context manager
+    """
+    attributes: Dict[str, Any] = {}
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, **attributes):
+        pass
+
+    def add_event(self, name, **attributes):
+        pass
+
+    def record_error(self, error):
+        pass
+
+    def record_usage(self, usage, model=None):
+        return {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def current_span():
+    """
+    The innermost open span of this thread/task, or NOOP_SPAN
+    """
+    return _current_span.get() or NOOP_SPAN
+
+
+@contextmanager
+def activate(span):
+    """
+    Make a span the parent of spans opened inside the block (for work handed to another
+    thread or event loop, where the context is not carried over)
+    """
+    if not isinstance(span, Span):
+        yield span
+        return
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        _current_span.reset(token)
+
+
+def token_usage(response: Any) -> Dict[str, int]:
+    """
+    {"input_tokens", "output_tokens"} from the usage shapes of the clients used here
+    """
+    usage = getattr(response, "usage_metadata", None)  # LangChain AIMessage
+    if usage is None:
+        usage = getattr(response, "usage", response)  # Anthropic / Groq / OpenAI response
+    if usage is None:
+        return {}
+    if isinstance(usage, dict):
+        get = usage.get
+    else:
+        get = lambda key: getattr(usage, key, None)
+    input_tokens = get("input_tokens") if get("input_tokens") is not None else get("prompt_tokens")
+    output_tokens = get("output_tokens") if get("output_tokens") is not None else get("completion_tokens")
+    if input_tokens is None and output_tokens is None:
+        return {}
+    return {"input_tokens": int(input_tokens or 0), "output_tokens": int(output_tokens or 0)}
+
+
+class JsonlExporter:
+    def __init__(self, path: str):
+        """
+        Appends one OTLP-shaped JSON span per line
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def on_start(self, span: Span) -> None:
+        pass
+
+    def on_end(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+
+class ConsoleExporter:
+    """
+    One line per finished span, indented by depth (the readable replacement for debug prints)
+    """
+
+    def on_start(self, span: Span) -> None:
+        pass
+
+    def on_end(self, span: Span) -> None:
+        attributes = " ".join(f"{key}={value}" for key, value in span.attributes.items() if not isinstance(value, (list, dict)))
+        mark = "❌" if span.status == "ERROR" else "⏱️ "
+        error = f" {span.error}" if span.error else ""
+        print(f"{'  ' * span.depth}{mark} {span.name} {span.duration * 1000:.1f} ms {attributes}{error}")
+
+
+class OTelExporter:
+    def __init__(self):
+        """
+        Mirrors spans into the OpenTelemetry SDK configured in the process
+        (opentelemetry-api must be installed; export goes wherever its provider sends it)
+        """
+        from opentelemetry import trace
+        self._trace = trace
+        self._tracer = trace.get_tracer("rag_core")
+
+    def on_start(self, span: Span) -> None:
+        context = None
+        if span.parent is not None and span.parent._otel is not None:
+            context = self._trace.set_span_in_context(span.parent._otel)
+        span._otel = self._tracer.start_span(span.name, context=context, start_time=span.start_ns)
+
+    def on_end(self, span: Span) -> None:
+        otel_span = span._otel
+        if otel_span is None:
+            return
+        for key, value in span.attributes.items():
+            otel_span.set_attribute(key, value if isinstance(value, (str, bool, int, float)) else str(value))
+        for event in span.events:
+            otel_span.add_event(event["name"], {key: str(value) for key, value in event["attributes"].items()},
+                                timestamp=event["timeUnixNano"])
+        if span.status == "ERROR":
+            from opentelemetry.trace import Status, StatusCode
+            otel_span.set_status(Status(StatusCode.ERROR, span.error))
+        otel_span.end(end_time=span.end_ns)
+
+
+class Tracer:
+    def __init__(self, exporters: Sequence[Any] = (), metrics: MetricsRegistry = None,
+                 service_name: str = "rag", record_metrics: bool = None):
+        """
+        Spans for pipeline stages, exported on completion, with duration/error/token metrics
+
+        When there are no exporters and metrics are off, span() returns NOOP_SPAN and
+        traced() wrappers call straight through, so instrumentation is nearly free.
+
+        Args:
+            exporters: Objects with on_start(span) / on_end(span) (JsonlExporter,
+                ConsoleExporter, OTelExporter)
+            metrics: Registry for the counters and histograms (a new one by default)
+            service_name: resource service.name written with each span
+            record_metrics: Update metrics for spans (default: on when there are exporters)
+        """
+        self.metrics = metrics or MetricsRegistry()
+        self.service_name = service_name
+        self.configure(exporters, record_metrics)
+
+        self.stage_seconds = self.metrics.histogram("stage_duration_seconds", "Duration of pipeline stages", ("stage",))
+        self.stage_errors = self.metrics.counter("stage_errors_total", "Pipeline stages that raised", ("stage",))
+        self.llm_tokens = self.metrics.counter("llm_tokens_total", "LLM tokens by model and direction", ("model", "type"))
+        self.llm_ttft_seconds = self.metrics.histogram(
+            "llm_time_to_first_token_seconds", "Time from request to first streamed token", ("model",))
+
+    def configure(self, exporters: Sequence[Any] = (), record_metrics: bool = None) -> None:
+        """
+        Swap exporters at runtime; pipelines holding this tracer pick the change up
+        """
+        self.exporters = list(exporters)
+        self.record_metrics = bool(self.exporters) if record_metrics is None else record_metrics
+        self.enabled = bool(self.exporters) or self.record_metrics
+
+    def span(self, name: str, **attributes):
+        """
+        Context manager timing a stage; nested spans share the trace and link to their parent
+
+            with tracer.span("rag.rerank", candidates=len(docs)) as span:
+                ...
+                span.set_attribute("kept", len(result))
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        span = Span(self, name, attributes, _current_span.get())
+        for exporter in self.exporters:
+            exporter.on_start(span)
+        return span
+
+    def traced(self, name: str = None, **attributes):
+        """
+        Decorator running a function (sync or async) inside a span; the tracer is
+        checked per call, so functions decorated before tracing is configured still report
+        """
+        def decorate(fn):
+            span_name = name or fn.__qualname__
+
+            if asyncio.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return await fn(*args, **kwargs)
+                    with self.span(span_name, **attributes):
+                        return await fn(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with self.span(span_name, **attributes):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def _end(self, span: Span) -> None:
+        span.end_ns = time.time_ns()
+        if self.record_metrics:
+            self.stage_seconds.observe(span.duration, stage=span.name)
+            if span.status == "ERROR":
+                self.stage_errors.inc(stage=span.name)
+        for exporter in self.exporters:
+            try:
+                exporter.on_end(span)
+            except Exception as e:
+                print(f"⚠️  Span export failed ({type(exporter).__name__}): {e}")
+
+    def observe_ttft(self, seconds: float, model: str = None) -> None:
+        """
+        Time to first token of a streamed LLM answer (rag_core.streaming.TokenTimer)
+        """
+        if self.record_metrics:
+            self.llm_ttft_seconds.observe(seconds, model=model or "unknown")
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Count, total and mean seconds per stage since the process started
+        """
+        return self.stage_seconds.summary()
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+_metrics_servers: Dict[int, ThreadingHTTPServer] = {}
+
+
+def get_tracer() -> Tracer:
+    """
+    Process-wide tracer, configured from the environment on first use:
+
+    - RAG_TRACE: comma-separated exporters, any of "jsonl", "console", "otel" (empty: tracing off)
+    - RAG_TRACE_FILE: JSONL path for the "jsonl" exporter (default ./traces/spans.jsonl)
+    - RAG_METRICS: "1" records metrics even without exporters
+    - RAG_METRICS_PORT: serve /metrics on this port (implies RAG_METRICS)
+    - RAG_SERVICE_NAME: service.name of the spans (default "rag")
+    """
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                port = os.getenv("RAG_METRICS_PORT")
+                tracer = Tracer(service_name=os.getenv("RAG_SERVICE_NAME", "rag"))
+                _configure(
+                    tracer,
+                    exporters=[name.strip() for name in os.getenv("RAG_TRACE", "").split(",") if name.strip()],
+                    trace_file=os.getenv("RAG_TRACE_FILE", "./traces/spans.jsonl"),
+                    metrics=os.getenv("RAG_METRICS") == "1" or bool(port),
+                    metrics_port=int(port) if port else None,
+                )
+                _tracer = tracer
+    return _tracer
+
+
+def configure_tracing(
+    exporters: Sequence[str] = ("console",),
+    trace_file: str = "./traces/spans.jsonl",
+    metrics: bool = True,
+    metrics_port: int = None,
+) -> Tracer:
+    """
+    Reconfigure the process tracer at runtime (e.g. from a notebook cell)
+
+    Args:
+        exporters: Any of "jsonl", "console", "otel"; empty turns tracing off
+        trace_file: JSONL path for the "jsonl" exporter
+        metrics: Record counters and histograms
+        metrics_port: Serve /metrics on this port
+    """
+    tracer = get_tracer()
+    _configure(tracer, exporters, trace_file, metrics, metrics_port)
+    return tracer
+
+
+def _configure(tracer: Tracer, exporters: Sequence[str], trace_file: str, metrics: bool, metrics_port: int) -> None:
+    built = []
+    for name in exporters:
+        if name == "jsonl":
+            built.append(JsonlExporter(trace_file))
+        elif name == "console":
+            built.append(ConsoleExporter())
+        elif name == "otel":
+            try:
+                built.append(OTelExporter())
+            except ImportError:
+                print("⚠️  opentelemetry is not installed, skipping the otel exporter")
+        else:
+            print(f"⚠️  Unknown trace exporter: {name}")
+
+    tracer.configure(built, record_metrics=metrics or bool(built))
+    if metrics_port and metrics_port not in _metrics_servers:
+        _metrics_servers[metrics_port] = tracer.metrics.serve(metrics_port)
+
+
+def span(name: str, **attributes):
+    """
+    get_tracer().span(...)
+    """
+    return get_tracer().span(name, **attributes)
+
+
+def traced(name: str = None, **attributes):
+    """
+    get_tracer().traced(...)
+    """
+    return get_tracer().traced(name, **attributes)